@@ -1,24 +1,31 @@
 # standard libraries
+from multiprocessing import freeze_support
 import os
 import sys
 
-# dependencies
-from PyQt5.QtWidgets import QApplication
-from PyQt5.QtCore import Qt
 
-# local modules
-import home
-import constants as const
-import signals
+if __name__ == '__main__': # the scanner's worker processes import this module again (see scanner.py)
+    freeze_support()
 
+    # the window is only imported in here, so the workers don't import every panel along with it
+    # dependencies
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import Qt
 
-QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
-QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
-app = QApplication(sys.argv)
+    # local modules
+    import home
+    import constants as const
+    import signals
 
-sigs = signals.Signals()
+    QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
+    QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
+    app = QApplication(sys.argv)
 
-home_window = home.Home(sigs, const.directory)
-home_window.showMaximized()
+    sigs = signals.Signals()
 
-sys.exit(app.exec())
\ No newline at end of file
+    home_window = home.Home(sigs, const.directory)
+    home_window.showMaximized()
+    app.aboutToQuit.connect(home_window.db.flush_writes)
+    app.aboutToQuit.connect(home_window.db_worker.shutdown)
+
+    sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,315 @@
+# standard libraries
+from functools import partial
+from functools import reduce
+from itertools import compress
+from operator import lshift
+from operator import or_
+import threading
+
+# local modules
+import constants as const
+
+
+
+LINK_TABLES = {
+    'artists': ('books_artists', 'artistID'),
+    'genres': ('books_genres', 'genreID'),
+    'tags': ('books_tags', 'tagID')
+}
+BIT_FLAGS = bytes.maketrans(b'01', b'\x00\x01')
+SPARSE_LIMIT = 16 # below this many ids, a bitset is quicker to build by shifting than by setting bytes
+
+
+
+def bits_to_ids(bits: int):
+    """Converts a bitset into the list of ids whose bits are set
+
+    Args:
+        bits (int)
+
+    Returns:
+        [int]
+    """
+    flags = bin(bits)[:1:-1].encode().translate(BIT_FLAGS) # one byte per bit, lowest bit first
+    return list(compress(range(len(flags)), flags))
+
+
+
+def ids_to_bits(ids):
+    """Builds the bitset with the bits of every id set in one go, instead of making a new int for each id
+
+    Args:
+        ids ([int])
+
+    Returns:
+        int
+    """
+    if not ids:
+        return 0
+    if len(ids) < SPARSE_LIMIT:
+        return reduce(or_, map(partial(lshift, 1), ids))
+    data = bytearray((max(ids) >> 3) + 1)
+    for id_ in ids:
+        data[id_ >> 3] |= 1 << (id_ & 7)
+    return int.from_bytes(data, 'little')
+
+
+
+class BitmapIndex:
+    """In-memory bitsets used to answer the artist, genre, tag, and character filters without touching sqlite
+
+    Every metadata id gets one bitset with a bit set for each book that it's linked to (bit n is book id n).
+    Traits work the same way except the bits are character ids, which then get mapped back to their books.
+    Bitsets are plain python ints so AND / OR / ANDNOT are all done in C.
+
+    The index is shared with the DBWorker threads, so match() and everything that changes the index take the same lock.
+    build() reads the db without the lock and swaps the new bitsets in at the end, so searches only wait for the swap.
+
+    Args:
+        conn (sqlite3.Connection): only used to read the link tables
+
+    Attributes:
+        all_books (int): one bit for every book in the db
+        links ({str: {int: int}}): keys are 'artists', 'genres', and 'tags'. maps metadata id to its bitset of books
+        linked ({str: int}): books that have at least one entry in that field. used for null searches
+        traits ({int: int}): maps trait id to its bitset of characters
+        character_books ({int: int}): maps character id to the id of the book it belongs to
+        all_characters (int): one bit for every character in the db
+        books_with_characters (int): books that have at least one character. used for null searches
+        lock (threading.RLock)
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.all_books = 0
+        self.links = {field: {} for field in LINK_TABLES}
+        self.linked = {field: 0 for field in LINK_TABLES}
+        self.traits = {}
+        self.character_books = {}
+        self.all_characters = 0
+        self.books_with_characters = 0
+        self.lock = threading.RLock()
+
+
+
+    def build(self):
+        """(Re)builds every bitset from the database
+        """
+        all_books = ids_to_bits([book_id for (book_id,) in self.conn.execute('SELECT id FROM books')])
+        links = {}
+        linked = {}
+        for field, (linking_table, column) in LINK_TABLES.items():
+            links[field], linked[field] = self.read_links(f'SELECT {column}, group_concat(bookID) FROM {linking_table} GROUP BY {column}')
+        characters = self.read_characters()
+        with self.lock:
+            self.all_books = all_books
+            self.links = links
+            self.linked = linked
+            self.traits, self.character_books, self.all_characters, self.books_with_characters = characters
+
+
+
+    def build_characters(self):
+        """(Re)builds the character and trait bitsets from the database
+        """
+        characters = self.read_characters()
+        with self.lock:
+            self.traits, self.character_books, self.all_characters, self.books_with_characters = characters
+
+
+
+    def read_links(self, query: str):
+        """
+        Args:
+            query (str): selects each key and a comma separated list of its ids
+
+        Returns:
+            ({int: int}, int): maps each key to the bitset of its ids, and the bitset of every id that has a key
+        """
+        bitsets = {key: ids_to_bits(list(map(int, ids.split(',')))) for key, ids in self.conn.execute(query)}
+        return bitsets, reduce(or_, bitsets.values(), 0)
+
+
+
+    def read_characters(self):
+        """
+        Returns:
+            tuple: new values for traits, character_books, all_characters, and books_with_characters
+        """
+        character_books = dict(self.conn.execute('SELECT id, bookID FROM characters'))
+        traits, _ = self.read_links('SELECT traitID, group_concat(characterID) FROM characters_traits GROUP BY traitID')
+        return traits, character_books, ids_to_bits(list(character_books)), ids_to_bits(list(set(character_books.values())))
+
+
+
+    def add_book(self, book_id: int):
+        with self.lock:
+            self.all_books |= 1 << book_id
+
+
+
+    def remove_book(self, book_id: int):
+        """Clears a book out of every bitset
+
+        Args:
+            book_id (int)
+        """
+        with self.lock:
+            mask = ~(1 << book_id)
+            self.all_books &= mask
+            self.books_with_characters &= mask
+            for field in LINK_TABLES:
+                self.linked[field] &= mask
+                for metadata_id in list(self.links[field]):
+                    if self.links[field][metadata_id] >> book_id & 1:
+                        self.links[field][metadata_id] &= mask
+            for character_id in [c for c, b in self.character_books.items() if b == book_id]:
+                self.remove_character(character_id)
+
+
+
+    def remove_character(self, character_id: int):
+        with self.lock:
+            mask = ~(1 << character_id)
+            self.all_characters &= mask
+            self.character_books.pop(character_id, None)
+            for trait_id in self.traits:
+                self.traits[trait_id] &= mask
+
+
+
+    def reload_book(self, book_id: int):
+        """Re-reads all the links of a single book after it was updated
+
+        Args:
+            book_id (int)
+        """
+        with self.lock:
+            self.remove_book(book_id)
+            self.all_books |= 1 << book_id
+            bit = 1 << book_id
+            for field, (linking_table, column) in LINK_TABLES.items():
+                for (metadata_id,) in self.conn.execute(f'SELECT {column} FROM {linking_table} WHERE bookID=?', (book_id,)):
+                    self.links[field][metadata_id] = self.links[field].get(metadata_id, 0) | bit
+                    self.linked[field] |= bit
+
+            for character_id, trait_id in self.conn.execute('SELECT id, traitID FROM characters LEFT JOIN characters_traits ON id=characterID WHERE bookID=?', (book_id,)):
+                self.character_books[character_id] = book_id
+                self.all_characters |= 1 << character_id
+                self.books_with_characters |= bit
+                if trait_id is not None:
+                    self.traits[trait_id] = self.traits.get(trait_id, 0) | 1 << character_id
+
+
+
+    def update_links(self, field: str, book_id: int, added: set[int], removed: set[int]):
+        """Applies the changes DBHandler.update_book() made to one link table
+
+        Args:
+            field (str): one of ['artists', 'genres', 'tags']
+            book_id (int)
+            added (set[int]): metadata ids that were linked to the book
+            removed (set[int]): metadata ids that were unlinked from the book
+        """
+        with self.lock:
+            bit = 1 << book_id
+            bitsets = self.links[field]
+            for id_ in added:
+                bitsets[id_] = bitsets.get(id_, 0) | bit
+            for id_ in removed:
+                if id_ in bitsets:
+                    bitsets[id_] &= ~bit
+            if added:
+                self.linked[field] |= bit
+            elif not any(bits & bit for bits in bitsets.values()):
+                self.linked[field] &= ~bit
+
+
+
+    def update_characters(self, book_id: int, removed: list[int], added: dict[int, set[int]]):
+        """Applies the changes DBHandler.update_book() made to a book's characters
+
+        Args:
+            book_id (int)
+            removed ([int]): ids of the characters that were deleted
+            added ({int: set[int]}): maps the id of each new character to its traits
+        """
+        with self.lock:
+            for character_id in removed:
+                self.remove_character(character_id)
+            for character_id, traits in added.items():
+                self.character_books[character_id] = book_id
+                self.all_characters |= 1 << character_id
+                for trait_id in traits:
+                    self.traits[trait_id] = self.traits.get(trait_id, 0) | 1 << character_id
+            if book_id in self.character_books.values():
+                self.books_with_characters |= 1 << book_id
+            else:
+                self.books_with_characters &= ~(1 << book_id)
+
+
+
+    def remove_metadata(self, table: str, id_: int):
+        """Drops the bitset of a deleted metadata entry
+
+        Args:
+            table (str): one of ['artists', 'genres', 'tags', 'traits']
+            id_ (int)
+        """
+        if table == 'traits':
+            self.build_characters() # deleting a trait can also delete characters
+        elif table in LINK_TABLES:
+            with self.lock:
+                self.links[table].pop(id_, None)
+                linked = 0
+                for bits in self.links[table].values():
+                    linked |= bits
+                self.linked[table] = linked
+
+
+
+    def match(self, filters: dict):
+        """Evaluates the artist, genre, tag, and character filters
+
+        Args:
+            filters (dict): filters to filter by from search panel
+
+        Returns:
+            int: bitset of every book that satisfies those filters
+        """
+        with self.lock:
+            result = self.all_books
+            for field in LINK_TABLES:
+                if field not in filters: # null search
+                    result &= ~self.linked[field]
+                    continue
+                bitsets = self.links[field]
+                for id_ in filters[field].data[const.Filters.AND]:
+                    result &= bitsets.get(id_, 0)
+                if filters[field].has(const.Filters.OR):
+                    union = 0
+                    for id_ in filters[field].data[const.Filters.OR]:
+                        union |= bitsets.get(id_, 0)
+                    result &= union
+                for id_ in filters[field].data[const.Filters.NOT]:
+                    result &= ~bitsets.get(id_, 0)
+                if not result:
+                    return 0
+
+            if 'characters' not in filters: # null search
+                return result & ~self.books_with_characters
+
+            for character in filters['characters']:
+                if not any(character.data.values()): # a card without any traits matches every book
+                    continue
+                characters = self.all_characters
+                for id_ in character.data[const.Filters.AND]:
+                    characters &= self.traits.get(id_, 0)
+                if character.has(const.Filters.OR):
+                    union = 0
+                    for id_ in character.data[const.Filters.OR]:
+                        union |= self.traits.get(id_, 0)
+                    characters &= union
+                for id_ in character.data[const.Filters.NOT]:
+                    characters &= ~self.traits.get(id_, 0)
+                result &= ids_to_bits([self.character_books[character_id] for character_id in bits_to_ids(characters)])
+            return result
@@ -0,0 +1,230 @@
+'''
+Where the pages of a book are read from
+
+A book is either a folder of images or a .cbz / .zip archive of them. Everything that reads pages goes through open_source(),
+so the rest of the app doesn't have to care which one a book is.
+'''
+
+# standard libraries
+from collections import OrderedDict
+from os import remove
+from os import scandir
+from os import stat
+from os.path import isfile
+from shutil import rmtree
+from threading import Lock
+from zipfile import ZipFile
+import re
+
+# dependencies
+from PyQt5.QtCore import QBuffer
+from PyQt5.QtCore import QByteArray
+from PyQt5.QtGui import QImageReader
+
+
+
+PAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+ARCHIVE_EXTENSIONS = ('.cbz', '.zip')
+ARCHIVE_CACHE_SIZE = 16 # archives kept open at a time
+HEADER_BYTES = 64 * 1024 # read from an archived page to get its dimensions. enough for the headers of nearly every image
+
+
+
+def natural_key(file: str):
+    """Sort key that orders numbers in file names by value, so 'page2' comes before 'page10'
+    """
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', file)]
+
+
+
+def is_page(file: str) -> bool:
+    return file[file.rfind('.'):].lower() in PAGE_EXTENSIONS
+
+
+
+def is_book(entry) -> bool:
+    """
+    Args:
+        entry (os.DirEntry): something in the manga directory
+
+    Returns:
+        bool: whether it's a folder or an archive
+    """
+    return entry.is_dir() or (entry.is_file() and entry.name.lower().endswith(ARCHIVE_EXTENSIONS))
+
+
+
+def book_name(directory: str) -> str:
+    """The name a new book gets: its folder's name, or its archive's name without the extension
+    """
+    return directory[:directory.rfind('.')] if directory.lower().endswith(ARCHIVE_EXTENSIONS) else directory
+
+
+
+def open_source(path: str):
+    """
+    Args:
+        path (str): the book's folder or archive
+
+    Returns:
+        FolderSource or ZipSource
+    """
+    if path.lower().endswith(ARCHIVE_EXTENSIONS) and isfile(path):
+        return ZipSource(path)
+    return FolderSource(path)
+
+
+
+class FolderSource:
+    """A book that's a folder of images
+
+    Args:
+        path (str)
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+
+
+    def files(self) -> list[str]:
+        """Lists the file names of the book's images in reading order, without opening any of them
+        """
+        with scandir(self.path) as entries:
+            return sorted((entry.name for entry in entries if entry.is_file() and is_page(entry.name)), key=natural_key)
+
+
+
+    def stat(self, file: str):
+        """
+        Returns:
+            (int, int): the page's mtime in nanoseconds and size in bytes
+        """
+        file_stat = stat(f'{self.path}/{file}')
+        return file_stat.st_mtime_ns, file_stat.st_size
+
+
+
+    def image_reader(self, file: str, header_only=False):
+        """
+        Args:
+            file (str)
+            header_only (bool): whether only the image's size and format are needed. nothing past the header is read either way for folders
+
+        Returns:
+            QImageReader
+        """
+        return QImageReader(f'{self.path}/{file}')
+
+
+
+    def delete(self):
+        """Deletes the book from disk
+        """
+        rmtree(self.path)
+
+
+
+class ZipSource:
+    """A book that's a .cbz / .zip archive of images. Pages are read straight out of the archive, nothing is extracted
+
+    The archive's central directory is read once and the archive is kept open (see ARCHIVE_CACHE_SIZE),
+    so turning pages only reads the page that's needed.
+
+    Args:
+        path (str)
+    """
+    archives = OrderedDict() # maps (path, mtime) to an open ZipFile, least recently used first
+    lock = Lock()
+
+    def __init__(self, path: str):
+        self.path = path
+        self.archive = self.open(path)
+
+
+
+    @classmethod
+    def open(cls, path: str):
+        """Gets an archive out of the cache, opening it if it isn't there (or was changed since it was opened)
+
+        Archives that fall out of the cache close once nothing is reading from them anymore.
+
+        Returns:
+            ZipFile
+        """
+        key = (path, stat(path).st_mtime_ns)
+        with cls.lock:
+            if (archive := cls.archives.get(key)) is not None:
+                cls.archives.move_to_end(key)
+                return archive
+        archive = ZipFile(path)
+        with cls.lock:
+            cls.archives[key] = archive
+            if len(cls.archives) > ARCHIVE_CACHE_SIZE:
+                cls.archives.popitem(last=False)
+        return archive
+
+
+
+    @classmethod
+    def forget(cls, path: str):
+        """Drops an archive from the cache so it isn't held open anymore
+        """
+        with cls.lock:
+            for key in [key for key in cls.archives if key[0] == path]:
+                del cls.archives[key]
+
+
+
+    def files(self) -> list[str]:
+        """Lists the file names of the book's images in reading order. Only the central directory is looked at
+        """
+        return sorted((file for file in self.archive.namelist() if not file.endswith('/') and is_page(file)), key=natural_key)
+
+
+
+    def stat(self, file: str):
+        """
+        Returns:
+            (int, int): the archive's mtime in nanoseconds and the page's (uncompressed) size in bytes
+        """
+        return stat(self.path).st_mtime_ns, self.archive.getinfo(file).file_size
+
+
+
+    def image_reader(self, file: str, header_only=False):
+        """Reads a page out of the archive without touching any of the others
+
+        Args:
+            file (str)
+            header_only (bool): whether only the image's size and format are needed. if so, only the start of the page is read
+
+        Returns:
+            QImageReader
+        """
+        with self.archive.open(file) as member:
+            data = member.read(HEADER_BYTES if header_only else -1)
+        if header_only and not self.reader(data).size().isValid() and len(data) == HEADER_BYTES: # headers that didn't fit
+            return self.image_reader(file)
+        return self.reader(data)
+
+
+
+    def reader(self, data: bytes):
+        buffer = QBuffer()
+        buffer.setData(QByteArray(data))
+        buffer.open(QBuffer.ReadOnly)
+        reader = QImageReader(buffer)
+        reader.buffer = buffer # the reader doesn't keep its device alive
+        return reader
+
+
+
+    def delete(self):
+        """Deletes the book from disk
+
+        The archive is only dropped from the cache, not closed. Other sources of the same book share it and may still be reading a page out of it.
+        It closes once the last of them lets go of it.
+        """
+        self.forget(self.path)
+        self.archive = None
+        remove(self.path)
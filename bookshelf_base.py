@@ -0,0 +1,334 @@
+# standard libraries
+from math import ceil
+from os import listdir
+from os.path import relpath
+
+# dependencies
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QFrame
+from PyQt5.QtWidgets import QMenu
+from PyQt5.QtWidgets import QMessageBox
+
+# local modules
+import constants as const
+from book_source import open_source
+from database import PAGE_SIZE
+from ui.bookshelf_frame import Ui_bookshelf_panel
+from title_index import TitleIndex
+
+
+
+class BookshelfBase(QFrame, Ui_bookshelf_panel):
+    """What bookshelf_panel.BookshelfPanel and virtual_bookshelf_panel.VirtualBookshelfPanel have in common: searching, paging, and deleting books
+
+    Books are fetched a page at a time (see DBHandler.get_books_page()). The first page is shown right away and the next one is fetched
+    whenever the gallery is scrolled near the bottom.
+
+    How the books are held and laid out is up to each panel, which has to implement:
+        set_books(books), extend_books(books): replace the books in the gallery, or add books to the end of it. books are rows from the db
+        remove_books(book_ids): take books out of the gallery
+        sort_books(sort): re-order the books without laying them out again
+        titles(): {book id: (title, alt title)} of every book in the gallery
+        hide_books(matches): hide the books that aren't in matches (None to show every book). returns whether any book was hidden or shown
+        populate(): lay the books out again after they were hidden, shown, sorted, or added, keeping the selection on its book
+        reset_selected(): deselect the selected book
+        scroll_area(): the QAbstractScrollArea the books are in
+        grid(): (columns, row height) of the gallery
+
+    Attributes:
+        filters (dict): the search filters the bookshelf is showing. None if it's showing every book
+        cursor (tuple): where the next page of books starts. None if every book has been fetched
+        loading_more (int): the limit of the page that's being fetched (-1 for every book that's left). None if no page is being fetched
+        resize_timer (QTimer): re-loads the covers at the new size once the window stops being resized
+        search_timer (QTimer): filters the bookshelf once typing in the search bar stops
+        title_index (TitleIndex): titles of the books in the bookshelf, for basic_search()
+        books_on_disk (set[str]): the folders in the manga directory. listed once per search, and again after the library watcher changed the db
+        not_found ([dict]): books of this search that couldn't be found on disk. see show_not_found()
+        not_found_popup (QMessageBox): lists not_found. None until a book of a search couldn't be found
+    """
+    def __init__(self, db, db_worker, signals):
+        super().__init__()
+        self.db = db
+        self.db_worker = db_worker
+        self.signals = signals
+        self.selected = None
+        self.filters = None
+        self.cursor = None
+        self.loading_more = None
+        self.resize_timer = QTimer()
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(const.Timers.RESIZE)
+        self.search_timer = QTimer()
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(const.Timers.QUICK_FILTER)
+        self.title_index = TitleIndex()
+        self.books_on_disk = None
+        self.not_found = []
+        self.not_found_popup = None
+        self.setupUi(self)
+
+
+
+    def connect_events(self):
+        """Connects each signal to their respective functions
+        """
+        # dropdowns
+        self.sort_by.currentIndexChanged.connect(self.sort)
+
+        # basic search
+        self.search_bar.textChanged.connect(self.search_timer.start) # restarting the timer is what debounces typing
+        self.search_timer.timeout.connect(lambda: self.basic_search(self.search_bar.text()))
+
+        # buttons
+        self.random_button.clicked.connect(self.random_select)
+
+        # bookshelf
+        self.scroll_area().verticalScrollBar().valueChanged.connect(lambda: self.load_more())
+        self.scroll_area().verticalScrollBar().rangeChanged.connect(lambda: self.load_more()) # a page was laid out
+
+        # signals
+        self.signals.update_spine.connect(self.update_spine)
+        self.signals.search_advanced.connect(self.generate_books)
+        self.signals.books_added.connect(self.add_books)
+        self.signals.books_removed.connect(self.remove_books)
+        self.signals.books_changed.connect(self.update_spines)
+
+
+
+    def generate_books(self, filters=None):
+        """Searches for the books in the background and then populates the gallery with the first page of them (see show_books())
+
+        If another search is started before this one finishes, this one is cancelled.
+
+        Args:
+            filters (dict, optional): filters to filter by from search panel
+        """
+        self.filters = filters
+        self.cursor = None
+        self.loading_more = None
+        self.books_on_disk = None
+        self.not_found = []
+        self.db_worker.get_books_page(filters, self.sort_by.currentIndex(), None, PAGE_SIZE, self.show_books)
+        self.update_total()
+
+
+
+    def show_books(self, page):
+        """Populates the gallery with the first page of books that were found
+
+        Args:
+            page (([dict], tuple)): from DBHandler.get_books_page()
+        """
+        results, self.cursor = page
+        self.set_books(self.found_on_disk(results))
+        self.filter_books(self.search_bar.text())
+        self.populate()
+        self.load_more()
+
+
+
+    def append_books(self, page):
+        """Adds the next page of books to the end of the gallery. See load_more()
+
+        Args:
+            page (([dict], tuple)): from DBHandler.get_books_page()
+        """
+        results, self.cursor = page
+        self.loading_more = None
+        self.extend_books(self.found_on_disk(results))
+        self.filter_books(self.search_bar.text())
+        self.populate()
+        self.load_more()
+
+
+
+    def load_more(self, everything=False):
+        """Fetches the next page of books in the background if the gallery is scrolled near the bottom. See append_books()
+
+        Args:
+            everything (bool): fetch every book that's left, wherever the gallery is scrolled to
+        """
+        if self.cursor is None or self.loading_more == -1:
+            return
+        if not everything and (self.loading_more or not self.near_bottom()):
+            return
+        self.loading_more = -1 if everything else PAGE_SIZE
+        self.db_worker.get_books_page(self.filters, self.sort_by.currentIndex(), self.cursor, self.loading_more, self.append_books)
+
+
+
+    def near_bottom(self):
+        """Worked out from how many books there are instead of the scroll bar, which lags behind until the new books have been laid out
+
+        Returns:
+            bool: whether the books fetched so far end less than a screen below what's scrolled to
+        """
+        if not self.books:
+            return True
+        columns, row_height = self.grid()
+        viewport = self.scroll_area().viewport().height()
+        return ceil(len(self.books) / columns) * row_height < self.scroll_area().verticalScrollBar().value() + viewport * 2
+
+
+
+    def update_total(self):
+        """Counts the books that satisfy the search filters in the background and shows the count in the search bar
+        """
+        self.db_worker.count_books(self.filters, lambda total: self.search_bar.setPlaceholderText(f'Search {total} books'))
+
+
+
+    def found_on_disk(self, results):
+        """Leaves out the books that can't be found on disk and lets the user know about them
+
+        The manga directory is only listed for the first page of a search, not for every page.
+
+        Args:
+            results ([dict]): from DBHandler.get_books_page()
+
+        Returns:
+            [dict]
+        """
+        if self.books_on_disk is None:
+            self.books_on_disk = set(listdir(const.directory))
+        if (books_not_found := [book for book in results if book['directory'] not in self.books_on_disk]): # avoid errors where it can't find the book on disk
+            self.show_not_found(books_not_found)
+        return [book for book in results if book['directory'] in self.books_on_disk]
+
+
+
+    def show_not_found(self, books: list[dict]):
+        """Lists books that couldn't be found on disk in a popup that doesn't block the bookshelf
+
+        While the popup is open, the books of later pages are added to it instead of opening another popup for every page.
+
+        Args:
+            books ([dict])
+        """
+        if self.not_found_popup is None or not self.not_found_popup.isVisible():
+            self.not_found = []
+            self.not_found_popup = QMessageBox()
+            self.not_found_popup.setIcon(QMessageBox.Critical)
+            self.not_found_popup.setWindowTitle('Error')
+            self.not_found_popup.setText('Unable to find the following books:\n')
+            self.not_found_popup.setStandardButtons(QMessageBox.Close)
+        self.not_found += books
+        self.not_found_popup.setInformativeText('\n'.join([book['name'] for book in self.not_found]))
+        self.not_found_popup.show()
+
+
+
+    def basic_search(self, search_term: str):
+        '''Basic search
+
+        Only searches titles and alt_titles of what's in the gallery. So if there's already a filter applied, it won't show books beyond the filter.
+        Books of the gallery that haven't been fetched yet are fetched, and filtered once they arrive (see append_books()).
+        The gallery is only populated again if a book was hidden or shown.
+        '''
+        if search_term:
+            self.load_more(everything=True)
+        if self.filter_books(search_term):
+            self.populate()
+
+
+
+    def filter_books(self, search_term: str):
+        """Hides the books whose titles don't contain search_term. Titles are looked up in self.title_index, ignoring case and accents.
+        Only new and renamed books are indexed again
+
+        Returns:
+            bool: whether any book was hidden or shown
+        """
+        self.title_index.set_titles(self.titles())
+        return self.hide_books(self.title_index.search(search_term))
+
+
+
+    def sort(self, sort: int):
+        """Re-sorts the books in the gallery when self.sort_by is changed
+
+        If not every book has been fetched yet, the search is run again in the new order instead.
+        """
+        if self.cursor is not None:
+            self.generate_books(self.filters)
+            return
+        self.sort_books(sort)
+        self.filter_books(self.search_bar.text()) # hidden rows of the virtual bookshelf don't follow their books when they move
+        self.populate()
+
+
+
+    def update_spines(self, book_ids: list[int]):
+        """Updates books whose folders were renamed or whose pages changed. See library_watcher.LibraryWatcher
+        """
+        self.books_on_disk = None # renamed folders would be missing from it
+        for book_id in book_ids:
+            self.update_spine(book_id)
+
+
+
+    def add_books(self, book_ids: list[int]):
+        """Adds books that were just added to the db, if they satisfy the search filters that are applied. See library_watcher.LibraryWatcher
+
+        Books that come after the pages that have been fetched so far are left for the page they're in.
+        """
+        self.update_total()
+        self.books_on_disk = None # the pages they're in would find them missing
+        if not (books := self.db.get_books_in(book_ids, self.filters, self.sort_by.currentIndex(), self.cursor)):
+            return
+        self.extend_books(books)
+        if self.sort_by.currentIndex() != const.Sort.RANDOM: # a random order doesn't need to be shuffled again
+            self.sort_books(self.sort_by.currentIndex())
+        self.filter_books(self.search_bar.text())
+        self.populate()
+
+
+
+    def delete_book_db(self, book_id: int, title: str):
+        popup = QMessageBox()
+        popup.setIcon(QMessageBox.Warning)
+        popup.setWindowTitle('Confirm')
+        popup.setText(f'Are you sure you want to delete {title} from the database?')
+        popup.setInformativeText('Note: this will not delete the files from disk.')
+        popup.setStandardButtons(QMessageBox.Ok | QMessageBox.Cancel)
+        selection = popup.exec_()
+        if selection == QMessageBox.Ok:
+            self.db.delete_book(book_id)
+            self.reset_selected()
+            self.remove_books([book_id])
+
+
+
+    def delete_book_disk(self, book_id: int, title: str, folder: str):
+        popup = QMessageBox()
+        popup.setIcon(QMessageBox.Warning)
+        popup.setWindowTitle('Confirm')
+        popup.setText(f'Are you sure you want to delete {title} from both the DB and disk?')
+        popup.setInformativeText('Note: THIS CANNOT BE UNDONE. FILES CANNOT BE RECOVERED')
+        popup.setStandardButtons(QMessageBox.Ok | QMessageBox.Cancel)
+        selection = popup.exec_()
+        if selection == QMessageBox.Ok:
+            self.db.delete_book(book_id)
+            self.reset_selected()
+            self.remove_books([book_id])
+            open_source(relpath(f'{const.directory}/{folder}')).delete()
+
+
+
+    def context_menu(self, event):
+        """Opens a context menu for the bookshelf.
+
+        "Clear Filter": removes all filters from the search_panel to show all books
+        "Clear Selected": deselects the currently selected book
+
+        Args:
+            event (QMouseEvent): The event that was emitted. Unused, but required by PyQt5
+        """
+        menu = QMenu()
+        clear_filter = menu.addAction('Clear Filter')
+        clear_selected = menu.addAction('Clear Selected')
+        if (selection := menu.exec_(event.globalPos())):
+            if selection == clear_filter:
+                self.signals.clear_filter.emit()
+            if selection == clear_selected:
+                self.reset_selected()
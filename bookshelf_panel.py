@@ -1,31 +1,46 @@
 # standard libraries
+from collections import OrderedDict
 from functools import partial
-from os import listdir
-from os.path import relpath
-from shutil import rmtree
 import random
 
-# dependencies
-from PyQt5.QtWidgets import QFrame
-from PyQt5.QtWidgets import QMenu
-from PyQt5.QtWidgets import QMessageBox
-
 # local modules
 import constants as const
-from ui.bookshelf_frame import Ui_bookshelf_panel
+from bookshelf_base import BookshelfBase
+from cover_loader import CoverLoader
+from query_compiler import KEYSET_COLUMNS
+from query_compiler import keyset_key
 import reader
 import spines
 
 
 
-class BookshelfPanel(QFrame, Ui_bookshelf_panel):
-    def __init__(self, db, signals):
-        super().__init__()
-        self.db = db
-        self.signals = signals
+COLUMNS = 5 # spines per row of the gallery
+
+
+
+class BookshelfPanel(BookshelfBase):
+    """The bookshelf, with one spines.BookSpine per book. Searching and paging are done by BookshelfBase
+
+    Spines are kept in a pool by book id, so searching again reuses the spines (and covers) of books that were already shown
+    instead of building them all over again. Spines of books that dropped out of the bookshelf are kept until their covers
+    go over const.spine_pool_mb, least recently shown first.
+
+    Attributes:
+        books ([spines.BookSpine]): the spines in the bookshelf, in order
+        selected (spines.BookSpine): the selected spine. None if nothing is selected
+        spines (OrderedDict): maps book id to its spine, least recently shown first. has every spine in books, and then some
+        placed ([QFrame]): the spines (and blank spines) in the grid, in order. see populate()
+        blanks ([spines.BlankSpine]): every blank spine made so far. they're reused
+        window_width (int): the width the spines were last resized to. None if the window hasn't been resized yet
+    """
+    def __init__(self, db, db_worker, signals):
+        super().__init__(db, db_worker, signals)
+        self.cover_loader = CoverLoader()
         self.books = []
-        self.selected = None
-        self.setupUi(self)
+        self.spines = OrderedDict()
+        self.placed = []
+        self.blanks = []
+        self.window_width = None
         self.connect_events()
         self.generate_books()
 
@@ -34,190 +49,296 @@ class BookshelfPanel(QFrame, Ui_bookshelf_panel):
     def connect_events(self):
         """Connects each signal to their respective functions
         """
-        # dropdowns
-        self.sort_by.currentIndexChanged.connect(self.sort)
-
-        # basic search
-        self.search_bar.textChanged.connect(self.basic_search)
-
-        # buttons
-        self.random_button.clicked.connect(self.random_select)
+        super().connect_events()
 
         # bookshelf
         self.bookshelf_scroll_area.contextMenuEvent = self.context_menu
         self.bookshelf_scroll_area.mousePressEvent = self.reset_selected
+        self.bookshelf_scroll_area.verticalScrollBar().valueChanged.connect(self.prioritize_visible)
+        self.resize_timer.timeout.connect(self.refresh_covers)
 
         # signals
-        self.signals.update_spine.connect(self.update_spine)
-        self.signals.search_advanced.connect(self.generate_books)
-        self.signals.delete_book_db.connect(self.delete_book_db) # from spines context menu
-        self.signals.delete_book_disk.connect(self.delete_book_disk) # from spines context menu
+        self.signals.delete_book_db.connect(lambda spine: self.delete_book_db(spine.id_, spine.title)) # from spines context menu
+        self.signals.delete_book_disk.connect(lambda spine: self.delete_book_disk(spine.id_, spine.title, spine.folder)) # from spines context menu
         self.signals.select_book.connect(self.select)
 
 
 
+    def scroll_area(self):
+        return self.bookshelf_scroll_area
+
+
+
+    def grid(self):
+        """
+        Returns:
+            (int, int): how many spines there are per row, and how far apart the rows are
+        """
+        return COLUMNS, self.books[0].height() + self.bookshelf_layout.verticalSpacing()
+
+
+
     def generate_books(self, filters=None):
-        """Creates objects for the books based on certain search parameters and then populates the gallery
+        """Same as BookshelfBase.generate_books(), and cancels the covers that are still loading
+        """
+        self.cover_loader.cancel()
+        super().generate_books(filters)
+
+
+
+    def show_books(self, page):
+        """Same as BookshelfBase.show_books(), and then lets go of the spines that went over the pool's size
+        """
+        super().show_books(page)
+        self.trim_spines()
+
+
+
+    def set_books(self, books: list[dict]):
+        """Gets the spines for the first page of books that were found
+
+        Spines that are already in the pool are reused. They're only given the book's data again if it changed in the db since.
+        """
+        self.books = [self.get_spine(book) for book in books]
+
+
+
+    def extend_books(self, books: list[dict]):
+        self.books += [self.get_spine(book) for book in books]
+
+
+
+    def get_spine(self, book: dict):
+        """Takes a book's spine out of the pool, or creates it if it isn't there
 
         Args:
-            filters (dict, optional): filters to filter by from search panel
+            book (dict): from DBHandler.get_books()
+
+        Returns:
+            spines.BookSpine
         """
-        self.books = []
-        books_on_disk = listdir(const.directory)
-        books_not_found = []
-        for book in self.db.get_books(filters, self.sort_by.currentIndex()):
-            if book['directory'] not in books_on_disk: # avoid errors where it can't find the book on disk
-                books_not_found.append(book)
+        if (spine := self.spines.pop(book['id'], None)) is None:
+            spine = self.create_spine(book)
+        else:
+            if spine.db_data != tuple(book.values()):
+                spine.set_db_data(*book.values())
+            if self.window_width and spine.scale != self.window_width / 1920: # resized while it wasn't in the bookshelf
+                spine.resize(self.window_width)
+            spine.hide_ = False
+        self.spines[book['id']] = spine
+        return spine
+
+
+
+    def trim_spines(self):
+        """Deletes the least recently shown spines that aren't in the bookshelf until the pool is within const.spine_pool_mb
+        """
+        shown = {book.id_ for book in self.books}
+        used = sum(spine.size_in_bytes() for spine in self.spines.values())
+        for book_id in list(self.spines):
+            if used <= const.spine_pool_mb * 1024 * 1024:
+                break
+            if book_id in shown:
                 continue
+            spine = self.spines.pop(book_id)
+            used -= spine.size_in_bytes()
+            self.forget_spine(spine)
+
 
-            # set up frame
-            spine = spines.BookSpine(self.signals, *book.values())
 
-            # add the new frames to the list
-            self.books.append(spine)
+    def forget_spine(self, spine: spines.BookSpine):
+        """Frees a spine that isn't going to be shown again
+        """
+        self.spines.pop(spine.id_, None)
+        self.cover_loader.forget(spine.set_cover) # a cover arriving after the spine is deleted would be set on a deleted label
+        spine.clear_mem()
+        spine.deleteLater()
 
-            # connect events
-            spine.mousePressEvent = partial(self.select, self.books[-1])
-            spine.mouseDoubleClickEvent = partial(self.open_book, self.books[-1])
-            spine.enterEvent = partial(self.highlight, self.books[-1])
-            spine.leaveEvent = partial(self.unhighlight, self.books[-1])
 
-        if books_not_found:
-            popup = QMessageBox()
-            popup.setIcon(QMessageBox.Critical)
-            popup.setWindowTitle('Error')
-            popup.setText('Unable to find the following books:\n')
-            popup.setInformativeText('\n'.join([book['name'] for book in books_not_found]))
-            popup.setStandardButtons(QMessageBox.Close)
-            popup.exec_()
 
-        self.clear_mem()
-        self.populate()
+    def create_spine(self, book: dict):
+        """Creates the spine for a book and connects its events
+
+        Args:
+            book (dict): from DBHandler.get_books()
+
+        Returns:
+            spines.BookSpine
+        """
+        spine = spines.BookSpine(self.signals, *book.values(), cover_loader=self.cover_loader)
+        spine.mousePressEvent = partial(self.select, spine)
+        spine.mouseDoubleClickEvent = partial(self.open_book, spine)
+        spine.enterEvent = partial(self.highlight, spine)
+        spine.leaveEvent = partial(self.unhighlight, spine)
+        return spine
 
 
 
     def populate(self):
         """Populates the gallery with books that MUST FIRST be generated with self.generate_books()
-        """
-        self.clear()
 
-        col_pos = 0
-        row_pos = 0
-        for book in self.books:
-            if book.hide_:
+        The grid isn't rebuilt. Only the spines whose cell changed are moved, the ones that are hidden now are taken out,
+        and the rest aren't touched. So deleting a book only moves the spines after it.
+        """
+        placed = [book for book in self.books if not book.hide_]
+        # if there's only a few books, place invisible frames to shove things into the top left corner
+        # this avoids books showing up in the middle and messing up the look of the gallery
+        placed += self.blank_spines(COLUMNS * 2 - len(placed))
+        staying = {id(widget) for widget in placed} # spines can't be hashed
+
+        contents = self.bookshelf_scroll_area.widget()
+        contents.setUpdatesEnabled(False)
+        for widget in self.placed:
+            if id(widget) not in staying:
+                self.bookshelf_layout.removeWidget(widget)
+                widget.hide() # stays a child of the gallery instead of becoming a window of its own
+                widget.cell = None
+        for position, widget in enumerate(placed):
+            if (cell := divmod(position, COLUMNS)) == widget.cell:
                 continue
-            book.row = row_pos
-            self.bookshelf_layout.addWidget(book, row_pos, col_pos)
-
-            # calculate next position
-            col_pos += 1
-            if col_pos > 4: # max 5 columns. aka 5 slots per row
-                col_pos = 0
-                row_pos += 1
-
-        while row_pos <= 1:
-            # if there's only a few books, place invisible frames to shove things into the top left corner
-            # this avoids books showing up in the middle and messing up the look of the gallery
-            blank = spines.BlankSpine()
-            self.bookshelf_layout.addWidget(blank, row_pos, col_pos)
-
-            # calculate next position
-            col_pos += 1
-            if col_pos > 4: # max 5 columns. aka 5 slots per row
-                col_pos = 0
-                row_pos += 1
+            if widget.cell is not None:
+                self.bookshelf_layout.removeWidget(widget)
+            self.bookshelf_layout.addWidget(widget, *cell)
+            widget.show()
+            widget.cell = cell
+            widget.row = cell[0]
+        self.placed = placed
+        contents.setUpdatesEnabled(True)
 
         if (new_select := next((x for x in self.books if x == self.selected), None)):
             self.select(new_select)
         else:
             self.reset_selected()
+        self.prioritize_visible()
 
 
 
-    def basic_search(self, search_term: str):
-        '''Basic search
+    def blank_spines(self, count: int):
+        """
+        Returns:
+            [spines.BlankSpine]: count blank spines. made as they're needed and reused after that
+        """
+        while len(self.blanks) < count:
+            self.blanks.append(spines.BlankSpine())
+        return self.blanks[:max(count, 0)]
 
-        Only searches titles and alt_titles of what's in the gallery. So if there's already a filter applied, it won't show books beyond the filter.
-        '''
-        for book in self.books:
-            if search_term.lower() in book.title.lower():
-                book.hide_ = False
-            elif book.alt_title and search_term.lower() in book.alt_title.lower():
-                book.hide_ = False
-            else:
-                book.hide_ = True
-        self.populate()
 
 
+    def visible_books(self):
+        """
+        Returns:
+            [spines.BookSpine]: the spines that are on screen
+        """
+        if not (shown := [book for book in self.books if not book.hide_]):
+            return []
+        row_height = shown[0].height() + self.bookshelf_layout.verticalSpacing()
+        top = self.bookshelf_scroll_area.verticalScrollBar().value() // row_height
+        bottom = (self.bookshelf_scroll_area.verticalScrollBar().value() + self.bookshelf_scroll_area.viewport().height()) // row_height
+        return [book for book in shown if top <= book.row <= bottom]
+
 
-    def sort(self, sort: int):
-        """Re-sorts the books in the gallery when self.sort_by is changed
+
+    def prioritize_visible(self):
+        """Moves the covers of the spines that are on screen to the front of the cover loader's queue
+
+        Spines that were resized while they were off screen have their covers loaded at the new size.
         """
-        if not self.books: # sorting books when there are no books causes a crash
-            return
-        if sort == const.Sort.ALPHA_ASC:
-            self.books = sorted(self.books, key=lambda spine: spine.title)
-        elif sort == const.Sort.ALPHA_DESC:
-            self.books = sorted(self.books, key=lambda spine: spine.title, reverse=True)
-        elif sort == const.Sort.RATING_ASC:
-            self.books = sorted(self.books, key=lambda spine: spine.rating or -1)
-        elif sort == const.Sort.RATING_DESC:
-            self.books = sorted(self.books, key=lambda spine: spine.rating or -1, reverse=True)
-        elif sort == const.Sort.PAGES_ASC:
-            self.books = sorted(self.books, key=lambda spine: spine.pages)
-        elif sort == const.Sort.PAGES_DESC:
-            self.books = sorted(self.books, key=lambda spine: spine.pages, reverse=True)
-        elif sort == const.Sort.DATE_ASC:
-            self.books = sorted(self.books, key=lambda spine: spine.date_added)
-        elif sort == const.Sort.DATE_DESC:
-            self.books = sorted(self.books, key=lambda spine: spine.date_added, reverse=True)
-        elif sort == const.Sort.RANDOM:
-            random.shuffle(self.books)
-        self.populate()
+        visible = self.visible_books()
+        if not self.resize_timer.isActive():
+            for book in visible:
+                book.refresh_cover()
+        self.cover_loader.prioritize(book.id_ for book in visible)
+
 
 
+    def titles(self):
+        return {book.id_: (book.title, book.alt_title) for book in self.books}
 
-    def clear(self):
-        """Clears the gallery of all books
+
+
+    def hide_books(self, matches):
+        """
+        Args:
+            matches (set[int]): ids of the books to show. None to show every book
+
+        Returns:
+            bool: whether any book was hidden or shown
         """
-        for i in reversed(range(self.bookshelf_layout.count())):
-            self.bookshelf_layout.itemAt(i).widget().setParent(None)
+        changed = False
+        for book in self.books:
+            if (hide := matches is not None and book.id_ not in matches) != book.hide_:
+                book.hide_ = hide
+                changed = True
+        return changed
 
 
 
-    def clear_mem(self):
-        for i in reversed(range(self.bookshelf_layout.count())):
-            self.bookshelf_layout.itemAt(i).widget().clear_mem() # fixes memory leak
+    def sort_books(self, sort: int):
+        """Sorts the books that have been fetched without populating the gallery again. In the same order sqlite puts them in (see keyset_key())
+        """
+        if sort == const.Sort.RANDOM:
+            random.shuffle(self.books)
+            return
+        column = {'name': 'title'}.get(KEYSET_COLUMNS[sort], KEYSET_COLUMNS[sort]) # the spine's attribute the column is kept in
+        key, reverse = keyset_key(sort)
+        self.books.sort(key=lambda spine: key(getattr(spine, column), spine.id_), reverse=reverse)
 
 
 
     def update_spine(self, book_id):
         """Updates a spine that was changed in the details panel
         """
+        if (data := self.db.get_book(book_id)) is None: # deleted since it was changed
+            return
         for book in self.books:
             if book.id_ == book_id:
-                book.set_db_data(*self.db.get_book(book_id).values())
+                book.set_db_data(*data.values())
                 break
 
 
 
+    def remove_books(self, book_ids: list[int]):
+        """Removes the spines of books that were deleted from the db. See library_watcher.LibraryWatcher
+        """
+        self.update_total()
+        if self.selected and self.selected.id_ in book_ids:
+            self.reset_selected()
+        removed = [spine for book_id, spine in self.spines.items() if book_id in book_ids]
+        self.books = [book for book in self.books if book.id_ not in book_ids]
+        self.populate()
+        for book in removed:
+            self.forget_spine(book)
+
+
+
     def resizeEvent(self, event):
         if event.size().width() < 1100: # i don't know why but this is called on startup with a small size
             return
-        self.resize_spines(event.size().width())
+        self.window_width = event.size().width()
+        self.resize_spines(self.window_width)
+        self.resize_timer.start()
 
 
 
     def resize_spines(self, window_width: int):
         """Resizes all the spines in the gallery when the window is resized.
         Mainly because I can't figure out how to get it to do this automatically with highdpiscaling
+
+        Covers are only stretched here. The ones on screen are loaded at the new size once resizing stops (see refresh_covers())
         """
-        for i in reversed(range(self.bookshelf_layout.count())):
-            spine = self.bookshelf_layout.itemAt(i).widget()
+        for spine in self.placed + [blank for blank in self.blanks if blank.cell is None]: # blanks that aren't in the grid are about to be again
             spine.resize(window_width)
 
 
 
+    def refresh_covers(self):
+        """Loads the covers on screen at the size their spines are now. The rest are loaded when they're scrolled to
+        """
+        for book in self.visible_books():
+            book.refresh_cover()
+
+
+
     def select(self, source, event=None):
         """Selects one of the books only.
 
@@ -291,56 +412,3 @@ class BookshelfPanel(QFrame, Ui_bookshelf_panel):
         self.select(random.choice(self.books))
         row_height = self.books[0].height() + self.bookshelf_layout.verticalSpacing()
         self.bookshelf_scroll_area.verticalScrollBar().setValue(self.selected.row * row_height)
-
-
-
-    def delete_book_db(self, book: spines.BookSpine):
-        popup = QMessageBox()
-        popup.setIcon(QMessageBox.Warning)
-        popup.setWindowTitle('Confirm')
-        popup.setText(f'Are you sure you want to delete {book.title} from the database?')
-        popup.setInformativeText('Note: this will not delete the files from disk.')
-        popup.setStandardButtons(QMessageBox.Ok | QMessageBox.Cancel)
-        selection = popup.exec_()
-        if selection == QMessageBox.Ok:
-            self.db.delete_book(book.id_)
-            self.reset_selected()
-            self.books.remove(book)
-            self.populate()
-
-
-
-    def delete_book_disk(self, book: spines.BookSpine):
-        popup = QMessageBox()
-        popup.setIcon(QMessageBox.Warning)
-        popup.setWindowTitle('Confirm')
-        popup.setText(f'Are you sure you want to delete {book.title} from both the DB and disk?')
-        popup.setInformativeText('Note: THIS CANNOT BE UNDONE. FILES CANNOT BE RECOVERED')
-        popup.setStandardButtons(QMessageBox.Ok | QMessageBox.Cancel)
-        selection = popup.exec_()
-        if selection == QMessageBox.Ok:
-            self.db.delete_book(book.id_)
-            self.reset_selected()
-            self.books.remove(book)
-            rmtree(relpath(f'{const.directory}/{book.folder}'))
-            self.populate()
-
-
-
-    def context_menu(self, event):
-        """Opens a context menu for the books.
-
-        "Clear Filter": removes all filters from the search_panel to show all books
-        "Clear Selected": deselects the currently selected book
-
-        Args:
-            event (QMouseEvent): The event that was emitted. Unused, but required by PyQt5
-        """
-        menu = QMenu()
-        clear_filter = menu.addAction('Clear Filter')
-        clear_selected = menu.addAction('Clear Selected')
-        if (selection := menu.exec_(event.globalPos())):
-            if selection == clear_filter:
-                self.signals.clear_filter.emit()
-            if selection == clear_selected:
-                self.reset_selected()
\ No newline at end of file
@@ -4,9 +4,27 @@ from json import load
 
 
 directory = ''
+bitmap_index = True # answer the artist / genre / tag / character filters from memory instead of sqlite
+thumbnail_directory = 'thumbnails' # cache of scaled spine covers
+thumbnail_cache_mb = 256
+virtual_bookshelf = True # only lay out and paint the books that are on screen (see virtual_bookshelf_panel)
+page_prefetch = 3 # pages to decode ahead of and behind the one being read
+page_cache_mb = 256 # memory the reader may use for decoded pages
+library_watcher = True # keep the db in sync with the manga directory without having to scan (see library_watcher)
+spine_pool_mb = 64 # covers of spines kept around for books that dropped out of the bookshelf, so searching again doesn't rebuild them
+cover_cache_mb = 64 # covers the virtual bookshelf keeps in memory. has to fit at least a screen of them
 with open('config.json', 'r') as file:
     data = load(file)
     directory = data['directory']
+    bitmap_index = data.get('bitmap_index', bitmap_index)
+    thumbnail_directory = data.get('thumbnail_directory', thumbnail_directory)
+    thumbnail_cache_mb = data.get('thumbnail_cache_mb', thumbnail_cache_mb)
+    virtual_bookshelf = data.get('virtual_bookshelf', virtual_bookshelf)
+    page_prefetch = data.get('page_prefetch', page_prefetch)
+    page_cache_mb = data.get('page_cache_mb', page_cache_mb)
+    library_watcher = data.get('library_watcher', library_watcher)
+    spine_pool_mb = data.get('spine_pool_mb', spine_pool_mb)
+    cover_cache_mb = data.get('cover_cache_mb', cover_cache_mb)
 
 
 
@@ -69,4 +87,13 @@ class Sort():
     PAGES_DESC = 5
     DATE_ASC = 6
     DATE_DESC = 7
-    RANDOM = 8
\ No newline at end of file
+    RANDOM = 8
+
+
+
+class Timers():
+    WRITE_BEHIND = 2000 # ms to wait before writing queued bookmark / zoom changes to the db
+    LIBRARY_BATCH = 1000 # ms of quiet to wait for before applying changes in the manga directory
+    LIBRARY_POLL = 10000 # ms between checks of a manga directory that can't be watched
+    RESIZE = 200 # ms of no resizing to wait for before covers are re-loaded at the new size
+    QUICK_FILTER = 150 # ms of no typing to wait for before the search bar filters the bookshelf
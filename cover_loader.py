@@ -0,0 +1,188 @@
+# standard libraries
+import heapq
+from itertools import count
+import sqlite3
+from threading import Lock
+from zipfile import BadZipFile
+import zlib
+
+# dependencies
+from PyQt5.QtCore import QObject
+from PyQt5.QtCore import QRunnable
+from PyQt5.QtCore import QThreadPool
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtGui import QImage
+from PyQt5.QtGui import QPixmap
+
+# local modules
+import constants as const
+from thumbnails import thumbnail_cache
+
+
+
+def placeholder(width: int, height: int):
+    """Blank cover shown until the real one has been loaded
+
+    Returns:
+        QPixmap
+    """
+    pixmap = QPixmap(width, height)
+    pixmap.fill(const.Colors.BACKGROUND)
+    return pixmap
+
+
+
+class CoverTask(QRunnable):
+    """Loads whichever queued cover is most wanted when it gets a thread. See CoverLoader
+    """
+    def __init__(self, loader):
+        super().__init__()
+        self.loader = loader
+
+
+
+    def run(self):
+        if (request := self.loader.next_request()) is None: # cancelled
+            return
+        key, generation = request
+        _, folder, width, height, page = key
+        try:
+            if page is None:
+                image = thumbnail_cache.cover(folder, width, height)
+            else:
+                image = thumbnail_cache.page(folder, page, width, height)
+        except (OSError, BadZipFile, zlib.error, sqlite3.Error): # the book was moved or deleted, or it's a broken archive
+            image = QImage() # still handed over, so the callbacks aren't left waiting
+        self.loader.finished.emit(key, generation, image)
+
+
+
+class CoverLoader(QObject):
+    """Decodes covers (and page thumbnails) on a pool of threads so the GUI thread never has to wait on the disk
+
+    Covers come from the thumbnail cache. Covers that aren't cached yet are decoded at a smaller size straight from the jpg (see ThumbnailCache.decode()).
+    Every request gets a higher priority than the ones before it and asking for a cover that's already queued bumps it up again,
+    so whatever was most recently put on screen is loaded first. Each task in the pool loads the most wanted cover when it starts, not the one it was made for.
+
+    Attributes:
+        pool (QThreadPool)
+        queue ({tuple: int}): maps (id, folder, width, height, page) of each waiting cover to its priority
+        heap ([(int, tuple)]): (-priority, key) of the queue. entries whose priority is out of date are skipped
+        callbacks ({tuple: [callable]}): called on the GUI thread with the cover (QImage) once it's loaded
+        priorities (itertools.count): where the priority of each request comes from
+        generation (int): bumped by cancel(). covers requested before that are thrown away when they arrive
+        lock (Lock): guards queue and heap
+    """
+    finished = pyqtSignal(object, int, object)
+
+    def __init__(self, threads=4):
+        super().__init__()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(threads)
+        self.queue = {}
+        self.heap = []
+        self.callbacks = {}
+        self.priorities = count()
+        self.generation = 0
+        self.lock = Lock()
+        self.finished.connect(self.deliver)
+
+
+
+    def request(self, id_: int, folder: str, width: int, height: int, callback, page=None):
+        """Queues a cover to be loaded
+
+        Args:
+            id_ (int): what prioritize() knows the cover by. usually the book's id
+            folder (str): the directory of the book, relative to const.directory
+            width (int)
+            height (int): None to keep the aspect ratio instead of cropping
+            callback (callable): called on the GUI thread with the cover (QImage)
+            page (str, optional): file name of the page to load instead of the cover
+        """
+        key = (id_, folder, width, height, page)
+        self.callbacks.setdefault(key, []).append(callback)
+        with self.lock:
+            queued = key in self.queue
+            self.push(key)
+        if not queued:
+            self.pool.start(CoverTask(self))
+
+
+
+    def prioritize(self, ids):
+        """Moves the covers with these ids to the front of the queue. Used for the ones that are on screen
+        """
+        ids = set(ids)
+        with self.lock:
+            for key in [key for key in self.queue if key[0] in ids]:
+                self.push(key)
+
+
+
+    def push(self, key):
+        """Gives a cover the highest priority so far
+
+        Note:
+            Must be called while holding self.lock
+        """
+        self.queue[key] = priority = next(self.priorities)
+        heapq.heappush(self.heap, (-priority, key))
+
+
+
+    def next_request(self):
+        """Runs on a pool thread. Takes the most wanted cover off the queue
+
+        Returns:
+            (tuple, int): the key of the cover and the generation it was requested in. None if the queue is empty
+        """
+        with self.lock:
+            while self.heap:
+                priority, key = heapq.heappop(self.heap)
+                if self.queue.get(key) == -priority:
+                    del self.queue[key]
+                    return key, self.generation
+            return None
+
+
+
+    def deliver(self, key, generation: int, image):
+        """Runs on the GUI thread. Hands the cover to everything that asked for it
+        """
+        if generation != self.generation:
+            return
+        for callback in self.callbacks.pop(key, []):
+            callback(image)
+
+
+
+    def forget(self, callback):
+        """Stops a callback from being called, for when whatever asked for a cover is about to be deleted.
+        Covers that nothing else is waiting for are dropped from the queue
+
+        Args:
+            callback (callable): as it was given to request()
+        """
+        dropped = []
+        for key, callbacks in list(self.callbacks.items()):
+            if callback in callbacks:
+                callbacks[:] = [waiting for waiting in callbacks if waiting != callback]
+                if not callbacks:
+                    del self.callbacks[key]
+                    dropped.append(key)
+        with self.lock:
+            for key in dropped:
+                self.queue.pop(key, None) # its heap entry is skipped from now on. if it's already loading, deliver() finds no callbacks
+
+
+
+    def cancel(self):
+        """Drops every cover that's still waiting or being loaded. Their callbacks are never called
+        """
+        with self.lock:
+            self.queue.clear()
+            self.heap.clear()
+            self.generation += 1
+        self.callbacks.clear()
+        self.pool.clear()
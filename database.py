@@ -1,14 +1,34 @@
 # standard libraries
 from datetime import datetime
 from string import Template
+import json
 import sqlite3
 
 # dependencies
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QListWidgetItem
 
 # local modules
 import constants as const
 import exceptions
+import migrations
+from bitmap_index import BitmapIndex
+from bitmap_index import LINK_TABLES
+from bitmap_index import bits_to_ids
+from metadata_catalog import MetadataCatalog
+from page_manifest import directory_mtime
+from page_manifest import read_manifest
+from query_compiler import FTS_TITLE_COLUMNS
+from query_compiler import KEYSET_COLUMNS
+from query_compiler import QueryCompiler
+from query_compiler import SORT_QUERIES
+from query_compiler import fts_match
+from query_compiler import keyset_condition
+from query_compiler import keyset_order
+
+
+
+PAGE_SIZE = 60 # books the bookshelf gets at a time. more than fit on a screen
 
 
 
@@ -45,128 +65,74 @@ class ListItem(QListWidgetItem):
 
 
 
+# each metadata entry is aggregated as [id, name, description] so it can be unpacked straight into a ListItem
+BOOK_INFO_QUERY = '''
+    SELECT books.*,
+        (SELECT json_array(id, name, alt_name) FROM series WHERE series.id = books.series) AS series_json,
+        (SELECT json_group_array(json_array(id, name, alt_name)) FROM books_artists JOIN artists ON artists.id = artistID WHERE bookID = books.id) AS artists_json,
+        (SELECT json_group_array(json_array(id, name, description)) FROM books_genres JOIN genres ON genres.id = genreID WHERE bookID = books.id) AS genres_json,
+        (SELECT json_group_array(json_array(id, name, description)) FROM books_tags JOIN tags ON tags.id = tagID WHERE bookID = books.id) AS tags_json,
+        (
+            SELECT json_group_array(json_array(characterID, traits.id, traits.name, traits.description))
+            FROM characters
+            JOIN characters_traits ON characters.id = characterID
+            JOIN traits ON traits.id = traitID
+            WHERE characters.bookID = books.id
+        ) AS characters_json
+    FROM books
+    WHERE books.id IN (SELECT value FROM json_each(?))
+'''
+
+
+
 class DBHandler:
     """Controls connection and all interaction with the database.
 
+    The main handler is the only one that writes. Read only handlers are used by db_worker.DBWorker to run queries off the GUI thread;
+    they share the main handler's index and metadata catalog.
+
+    Args:
+        read_only (bool)
+
     Attributes:
         conn (sqlite3.Connection)
         db (sqlite3.Cursor)
+        index (BitmapIndex): None if const.bitmap_index is turned off
+        metadata (MetadataCatalog): cached copy of every metadata table
+        pending_writes ({int: {str: }}): bookmark and zoom changes that haven't been written yet. keys are book ids
+        flush_timer (QTimer): writes pending_writes when it times out
     """
-    def __init__(self):
+    def __init__(self, read_only=False):
+        self.pending_writes = {}
+        self.index = None
+        if read_only:
+            self.conn = sqlite3.connect('file:mangalibrary.db?mode=ro', uri=True)
+            self.db = self.conn.cursor()
+            self.db.row_factory = self.dict_factory
+            return
+
         self.conn = sqlite3.connect('mangalibrary.db')
+        self.conn.execute('PRAGMA journal_mode = WAL') # lets the read only connections read while this one writes
         self.db = self.conn.cursor()
         self.create_tables()
         self.db.row_factory = self.dict_factory
+        self.metadata = MetadataCatalog()
+        self.flush_timer = QTimer()
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(const.Timers.WRITE_BEHIND)
+        self.flush_timer.timeout.connect(self.flush_writes)
+        if const.bitmap_index:
+            self.index = BitmapIndex(self.conn)
+            self.index.build()
 
 
 
     def create_tables(self):
-        """Initializes the database if lost, deleted, or otherwise missing.
-        """
-        self.db.execute('''
-            CREATE TABLE IF NOT EXISTS books
-            (
-                id INTEGER PRIMARY KEY,
-                date_added DATETIME DEFAULT (DATETIME(CURRENT_TIMESTAMP, 'LOCALTIME')),
-                name TEXT,
-                alt_name TEXT,
-                series INTEGER,
-                series_order REAL,
-                pages INTEGER,
-                rating INTEGER,
-                notes TEXT,
-                directory TEXT,
-                zoom REAL,
-                bookmark INTEGER -- the page you left on when you closed the reader
-            )
-        ''')
-
-        self.db.execute('''
-            CREATE TABLE IF NOT EXISTS artists
-            (
-                id INTEGER PRIMARY KEY,
-                name TEXT,
-                alt_name TEXT
-            )
-        ''')
-
-        self.db.execute('''
-            CREATE TABLE IF NOT EXISTS series
-            (
-                id INTEGER PRIMARY KEY,
-                name TEXT,
-                alt_name TEXT
-            )
-        ''')
-
-        self.db.execute('''
-            CREATE TABLE IF NOT EXISTS genres
-            (
-                id INTEGER PRIMARY KEY,
-                name TEXT,
-                description TEXT
-            )
-        ''')
-
-        self.db.execute('''
-            CREATE TABLE IF NOT EXISTS tags
-            (
-                id INTEGER PRIMARY KEY,
-                name TEXT,
-                description TEXT
-            )
-        ''')
-
-        self.db.execute('''
-            CREATE TABLE IF NOT EXISTS books_artists
-            (
-                bookID INTEGER,
-                artistID INTEGER
-            )
-        ''')
-
-        self.db.execute('''
-            CREATE TABLE IF NOT EXISTS books_genres
-            (
-                bookID INTEGER,
-                genreID INTEGER
-            )
-        ''')
-
-        self.db.execute('''
-            CREATE TABLE IF NOT EXISTS books_tags
-            (
-                bookID INTEGER,
-                tagID INTEGER
-            )
-        ''')
-
-        self.db.execute('''
-            CREATE TABLE IF NOT EXISTS characters
-            (
-                id INTEGER PRIMARY KEY,
-                bookID INTEGER
-            )
-        ''')
-
-        self.db.execute('''
-            CREATE TABLE IF NOT EXISTS traits
-            (
-                id INTEGER PRIMARY KEY,
-                name TEXT,
-                description TEXT
-            )
-        ''')
-
-        self.db.execute('''
-            CREATE TABLE IF NOT EXISTS characters_traits
-            (
-                characterID INTEGER,
-                traitID INTEGER
-            )
-        ''')
+        """Initializes the database if lost, deleted, or otherwise missing and upgrades older databases to the current schema.
 
-        self.conn.commit()
+        See migrations.py
+        """
+        migrations.migrate(self.conn)
 
 
 
@@ -180,58 +146,140 @@ class DBHandler:
 
 
 
-    def get_metadata(self):
+    def get_metadata(self, tables=migrations.METADATA_TABLES):
         """Gets a list for each non-book table
 
+        Entries come from the metadata catalog, so this only reads from the db if a table changed since the last call.
+
+        Note:
+            ListItems can only belong to one list widget, so every call makes new ones
+
+        Args:
+            tables ([str], optional): which tables to get. defaults to all of them
+
         Returns
             {str: [ListItem]}: keys are table names
         """
-        data = {
-            'artists': [],
-            'series': [],
-            'genres': [],
-            'tags': [],
-            'traits': []
-        }
+        return {table: [ListItem(*entry, table) for entry in self.metadata.get(table, self.conn)] for table in tables}
+
 
-        self.db.execute('SELECT * FROM artists ORDER BY name COLLATE NOCASE')
-        temp = self.db.fetchall()
-        for entry in temp:
-            item = ListItem(entry['id'], entry['name'], entry['alt_name'], 'artists')
-            data['artists'].append(item)
 
-        self.db.execute('SELECT * FROM series ORDER BY name COLLATE NOCASE')
-        temp = self.db.fetchall()
-        for entry in temp:
-            item = ListItem(entry['id'], entry['name'], entry['alt_name'], 'series')
-            data['series'].append(item)
+    def get_books(self, filters=None, sort_by = const.Sort.ALPHA_ASC):
+        """Gets a list of books that satisfy the search filters
 
-        self.db.execute('SELECT * FROM genres ORDER BY name COLLATE NOCASE')
-        temp = self.db.fetchall()
-        for entry in temp:
-            item = ListItem(entry['id'], entry['name'], entry['description'], 'genres')
-            data['genres'].append(item)
+        The filters are compiled into a single statement by QueryCompiler so sqlite can plan the whole search at once.
+        If the bitmap index is on, it answers the artist, genre, tag, and character filters and sqlite only has to do the basic fields and sorting.
 
-        self.db.execute('SELECT * FROM tags ORDER BY name COLLATE NOCASE')
-        temp = self.db.fetchall()
-        for entry in temp:
-            item = ListItem(entry['id'], entry['name'], entry['description'], 'tags')
-            data['tags'].append(item)
+        Args:
+            filters (dict, optional): filters to filter by from search panel
+            sort_by (int): the way the books are to be sorted
 
-        self.db.execute('SELECT * FROM traits ORDER BY name COLLATE NOCASE')
-        temp = self.db.fetchall()
-        for entry in temp:
-            item = ListItem(entry['id'], entry['name'], entry['description'], 'traits')
-            data['traits'].append(item)
+        Returns:
+            [dict]
+        """
+        if filters == None: # if filters are not sent (like during startup), just give a list of all the books back
+            self.db.execute('SELECT * FROM books ORDER BY ' + SORT_QUERIES[sort_by])
+            return self.db.fetchall()
 
-        return data
+        book_ids = bits_to_ids(self.index.match(filters)) if self.index else None
+        query, params = QueryCompiler(filters).compile(sort_by, book_ids)
+        self.db.execute(query, params)
+        return self.db.fetchall()
 
 
 
-    def get_books(self, filters=None, sort_by = const.Sort.ALPHA_ASC):
+    def get_books_page(self, filters=None, sort_by=const.Sort.ALPHA_ASC, after=None, limit=PAGE_SIZE):
+        """Gets one page of the books that satisfy the search filters, in the same order as get_books() (ties are broken by id)
+
+        Pages are found with a keyset cursor: the sort column's value and the id of the last book of the previous page.
+        So a page deep into the results costs the same as the first one, and books added or deleted in the meantime don't shift the pages after them.
+        Books sorted randomly don't have an order to keep a cursor in, so they all come in one page.
+
+        Args:
+            filters (dict, optional): filters to filter by from search panel
+            sort_by (int): the way the books are to be sorted
+            after (tuple, optional): the cursor that came with the previous page. None for the first page
+            limit (int, optional): how many books to get. -1 for every book that's left
+
+        Returns:
+            ([dict], tuple): the books and the cursor of the next page. the cursor is None if there are no more pages
+        """
+        if sort_by == const.Sort.RANDOM:
+            return self.get_books(filters, sort_by), None
+
+        conditions = []
+        params = []
+        if filters is not None:
+            compiler = QueryCompiler(filters)
+            conditions.append(f'id IN (\n{compiler.compile_ids(bits_to_ids(self.index.match(filters)) if self.index else None)}\n)')
+            params += compiler.params
+        if after is not None:
+            condition, condition_params = keyset_condition(sort_by, after)
+            conditions.append(condition)
+            params += condition_params
+        where = f'WHERE {" AND ".join(conditions)} ' if conditions else ''
+        self.db.execute(f'SELECT * FROM books {where}ORDER BY {keyset_order(sort_by)} LIMIT ?', params + [limit])
+        books = self.db.fetchall()
+        if len(books) < limit or limit < 0:
+            return books, None
+        return books, (books[-1][KEYSET_COLUMNS[sort_by]], books[-1]['id'])
+
+
+
+    def count_books(self, filters=None):
+        """
+        Args:
+            filters (dict, optional): filters to filter by from search panel
+
+        Returns:
+            int: how many books satisfy the search filters
+        """
+        if filters is None:
+            self.db.execute('SELECT COUNT(*) AS count FROM books')
+            return self.db.fetchone()['count']
+
+        compiler = QueryCompiler(filters)
+        ids = compiler.compile_ids(bits_to_ids(self.index.match(filters)) if self.index else None)
+        self.db.execute(f'SELECT COUNT(*) AS count FROM ({ids})', compiler.params)
+        return self.db.fetchone()['count']
+
+
+
+    def get_books_in(self, book_ids: list[int], filters=None, sort_by=None, until=None):
+        """Gets the books out of book_ids that satisfy the search filters. Used to check whether books that were just added belong in the bookshelf
+
+        Args:
+            book_ids ([int])
+            filters (dict, optional): filters to filter by from search panel
+            sort_by (int, optional): the sort until is a cursor of
+            until (tuple, optional): a cursor from get_books_page(). only books that come before it are returned, the rest will come with later pages
+
+        Returns:
+            [dict]
+        """
+        conditions = ['id IN (SELECT value FROM json_each(?))']
+        params = [json.dumps(book_ids)]
+        if filters is not None:
+            compiler = QueryCompiler(filters)
+            conditions.append(f'id IN (\n{compiler.compile_ids(bits_to_ids(self.index.match(filters)) if self.index else None)}\n)')
+            params += compiler.params
+        if until is not None:
+            condition, condition_params = keyset_condition(sort_by, until)
+            conditions.append(f'NOT {condition}')
+            params += condition_params
+        self.db.execute(f'SELECT * FROM books WHERE {" AND ".join(conditions)}', params)
+        return self.db.fetchall()
+
+
+
+    def get_books_multipass(self, filters=None, sort_by = const.Sort.ALPHA_ASC):
         """Gets a list of books that satisfy the search filters
 
-        Dynamically builds a sqlite3 query string based on the information provided by filters
+        Dynamically builds a sqlite3 query string based on the information provided by filters.
+        This runs one query per field and feeds the results of each into the next one.
+
+        Note:
+            Kept as a fallback to compare results against get_books(). Should not be used otherwise.
 
         Args:
             filters (dict, optional): filters to filter by from search panel
@@ -240,17 +288,7 @@ class DBHandler:
         Returns:
             [dict]
         """
-        sort_query = {
-            const.Sort.ALPHA_ASC: 'books.name COLLATE NOCASE ASC',
-            const.Sort.ALPHA_DESC: 'books.name COLLATE NOCASE DESC',
-            const.Sort.RATING_ASC: 'books.rating ASC',
-            const.Sort.RATING_DESC: 'books.rating DESC',
-            const.Sort.PAGES_ASC: 'books.pages ASC',
-            const.Sort.PAGES_DESC: 'books.pages DESC',
-            const.Sort.DATE_ASC: 'books.date_added ASC',
-            const.Sort.DATE_DESC: 'books.date_added DESC',
-            const.Sort.RANDOM: 'random()'
-        }
+        sort_query = SORT_QUERIES
 
         if filters == None: # if filters are not sent (like during startup), just give a list of all the books back
             self.db.execute('SELECT * FROM books ORDER BY ' + sort_query[sort_by])
@@ -374,14 +412,33 @@ class DBHandler:
 
 
 
+    def search_text(self, search_term: str, columns=FTS_TITLE_COLUMNS):
+        """Full text search over books.
+
+        Args:
+            search_term (str)
+            columns ((str)): any of ('name', 'alt_name', 'notes')
+
+        Returns:
+            [int]: ids of matching books. None if search_term can't be searched with the index
+        """
+        if not (match := fts_match(search_term, columns)):
+            return None
+        self.db.execute(f'SELECT rowid AS id FROM {match[0]} WHERE {match[0]} MATCH ?', (match[1],))
+        return [x['id'] for x in self.db.fetchall()]
+
+
+
     def get_book(self, book_id: int):
         """Gets all the data in table book. should be used for just getting basic info. for all info use get_book_info()
 
         Args:
             book_id (int)
         """
-        self.db.execute(f'SELECT * FROM books WHERE books.id={book_id}')
-        return self.db.fetchone()
+        self.db.execute('SELECT * FROM books WHERE books.id=?', (book_id,))
+        if (book := self.db.fetchone()) and book_id in self.pending_writes: # writes that haven't been flushed yet
+            book.update(self.pending_writes[book_id])
+        return book
 
 
 
@@ -397,7 +454,7 @@ class DBHandler:
         Used mainly to populate info panel.
 
         Note:
-            For series, artists, genres, and tags fields, returns the ID instead of the str name
+            For series, artists, genres, and tags fields, returns ListItems instead of the str name
 
         Args:
             book_id (int)
@@ -405,40 +462,35 @@ class DBHandler:
         Returns:
             dict
         """
-        self.db.execute('SELECT * FROM books WHERE books.id=?', (book_id,))
-        info = self.db.fetchone()
-
-        self.db.execute('SELECT series.id, series.name FROM series INNER JOIN books ON series.id=books.series WHERE books.id=?', (book_id,))
-        series = self.db.fetchone()
-        info['series'] = (ListItem(-1, '', '', 'series') if not series else ListItem(series['id'], series['name'], series['alt_name'], 'series'))
-
-        self.db.execute('SELECT artists.id, artists.name FROM artists INNER JOIN books_artists ON artistID=artists.id INNER JOIN books ON bookID=books.id WHERE bookID=?', (book_id,))
-        artists = self.db.fetchall()
-        info['artists'] = []
-        for a in artists:
-            info['artists'].append(ListItem(a['id'], a['name'], a['alt_name'], 'artists'))
-
-        self.db.execute('SELECT genres.id, genres.name FROM genres INNER JOIN books_genres ON genreID=genres.id INNER JOIN books ON bookID=books.id WHERE bookID=?', (book_id,))
-        genres = self.db.fetchall()
-        info['genres'] = []
-        for g in genres:
-            info['genres'].append(ListItem(g['id'], g['name'], g['description'], 'genres'))
-
-        self.db.execute('SELECT tags.id, tags.name FROM tags INNER JOIN books_tags ON tagID=tags.id INNER JOIN books ON bookID=books.id WHERE bookID=?', (book_id,))
-        tags = self.db.fetchall()
-        info['tags'] = []
-        for t in tags:
-            info['tags'].append(ListItem(t['id'], t['name'], t['description'], 'tags'))
-
-        self.db.execute('SELECT characterID, traits.id, name FROM traits INNER JOIN characters_traits ON traits.id = traitID INNER JOIN characters ON characters.id = characterID WHERE bookID = ?', (book_id,))
-        characters = self.db.fetchall()
-        info['characters'] = dict()
-        for c in characters:
-            if c['characterID'] not in info['characters']:
-                info['characters'][c['characterID']] = []
-            info['characters'][c['characterID']].append(ListItem(c['id'], c['name'], c['description'], 'traits'))
+        books = self.get_book_infos([book_id])
+        return books[0] if books else None
+
 
-        return info
+
+    def get_book_infos(self, book_ids: list[int]):
+        """Returns all relevant information about many books at once.
+
+        Everything is fetched in a single query: each book's metadata is aggregated into json arrays by sqlite
+        and then turned into ListItems here, so the number of queries doesn't grow with the number of books.
+
+        Args:
+            book_ids ([int])
+
+        Returns:
+            [dict]: same format as get_book_info(), in the same order as book_ids. books that don't exist are skipped
+        """
+        self.db.execute(BOOK_INFO_QUERY, (json.dumps(book_ids),))
+        infos = {}
+        for info in self.db.fetchall(): # one row per book, even if its id is in book_ids more than once
+            series = json.loads(info.pop('series_json') or 'null')
+            info['series'] = ListItem(-1, '', '', 'series') if not series else ListItem(*series, 'series')
+            for table in ['artists', 'genres', 'tags']:
+                info[table] = [ListItem(*entry, table) for entry in json.loads(info.pop(f'{table}_json'))]
+            info['characters'] = dict()
+            for character_id, *trait in json.loads(info.pop('characters_json')):
+                info['characters'].setdefault(character_id, []).append(ListItem(*trait, 'traits'))
+            infos[info['id']] = info
+        return [infos[book_id] for book_id in book_ids if book_id in infos]
 
 
 
@@ -461,6 +513,7 @@ class DBHandler:
 
         self.db.execute(f'INSERT INTO {table}(name) VALUES("{name}")')
         self.conn.commit()
+        self.metadata.invalidate(table)
 
 
 
@@ -472,27 +525,30 @@ class DBHandler:
             id_ (int)
         """
         if table == 'books':
-            # deletes the book entry and all entries related to it in books_artists, books_genres, books_tags
-            self.db.execute('DELETE FROM books_artists WHERE bookID=?', (id_,))
-            self.db.execute('DELETE FROM books_genres WHERE bookID=?', (id_,))
-            self.db.execute('DELETE FROM books_tags WHERE bookID=?', (id_,))
+            # deletes the book entry. entries related to it in books_artists, books_genres, books_tags, and characters are removed by ON DELETE CASCADE
             self.db.execute('DELETE FROM books WHERE id=?', (id_,))
         elif table == 'series':
             # deletes the series entry and sets any book's series field to NULL
             self.db.execute('UPDATE books SET series=NULL WHERE series=?', (id_,))
             self.db.execute('DELETE FROM series WHERE id=?', (id_,))
         elif table in ['artists', 'genres', 'tags']:
-            # deletes the entry and all entries related to it in its respective many-to-many through table
-            self.db.execute(f'DELETE FROM books_{table} WHERE {table[:-1]}ID={id_}')
-            self.db.execute(f'DELETE FROM {table} WHERE id={id_}')
+            # deletes the entry. entries related to it in its respective many-to-many through table are removed by ON DELETE CASCADE
+            self.db.execute(f'DELETE FROM {table} WHERE id=?', (id_,))
         elif table == 'traits':
-            # deletes the entry and removes the trait from all characters and deletes any characters that don't have any traits
-            self.db.execute(f'DELETE FROM characters_traits WHERE traitID={id_}')
+            # deletes the entry (which removes the trait from all characters) and deletes any characters that don't have any traits
+            self.db.execute('DELETE FROM traits WHERE id=?', (id_,))
             self.db.execute('DELETE FROM characters WHERE id NOT IN (SELECT characterID FROM characters_traits)')
-            self.db.execute(f'DELETE FROM traits WHERE id={id_}')
 
         self.conn.commit()
 
+        if table != 'books':
+            self.metadata.invalidate(table)
+        if self.index:
+            if table == 'books':
+                self.index.remove_book(id_)
+            else:
+                self.index.remove_metadata(table, id_)
+
 
 
     def rename_metadata(self, table: str, id_: int, new_name: str):
@@ -505,6 +561,7 @@ class DBHandler:
         """
         self.db.execute(f'UPDATE {table} SET name="{new_name}" WHERE id={id_}')
         self.conn.commit()
+        self.metadata.invalidate(table)
 
 
 
@@ -519,6 +576,7 @@ class DBHandler:
         field = 'alt_name' if table in ['artists', 'series'] else 'description'
         self.db.execute(f'UPDATE {table} SET {field} = "{description}" WHERE id = {id_}')
         self.conn.commit()
+        self.metadata.invalidate(table)
 
 
 
@@ -531,81 +589,252 @@ class DBHandler:
             notes = f'"{notes}"'
         self.db.execute(f'INSERT INTO books(name, alt_name, series, series_order, pages, rating, notes, directory, zoom, bookmark) VALUES("{name}", {alt_name}, {series}, {series_order}, {pages}, {rating}, {notes}, "{directory}", {zoom}, {bookmark})')
         self.conn.commit()
+        if self.index:
+            self.index.add_book(self.db.lastrowid)
 
 
 
-    def update_book(self, data: dict):
-        """Updates a book's data
+    def add_books(self, books: list[dict]):
+        """Creates many new book entries in a single transaction
 
-        This basically cleans the book's DB entry and rebuilds it with the specific info.
-        Instead of editing only the parts we changed, we re-write the whole DB entry.
+        Books whose directories are already in the db are skipped, so a scan and the library watcher can't add the same book twice.
 
         Args:
-            data (dict)
+            books ([dict]): each needs 'name', 'directory', and 'pages'. books that also have 'mtime' and 'manifest' (see page_manifest.read_manifest()) get their page manifests stored along with them
+
+        Returns:
+            [int]: ids of the new books
         """
-        self.db.execute('UPDATE books SET name=?, alt_name=?, series=?, series_order=?, rating=?, notes=? WHERE id=?', (data['title'], data['alt_title'], data['series'], data['series_order'], data['rating'], data['notes'], data['id']))
+        self.db.execute('SELECT directory FROM books')
+        existing = {x['directory'] for x in self.db.fetchall()}
+        books = [book for book in books if book['directory'] not in existing]
+        self.db.execute('SELECT COALESCE(MAX(id), -1) AS last_id FROM books')
+        last_id = self.db.fetchone()['last_id']
+        self.db.executemany('INSERT INTO books(name, directory, pages, zoom, bookmark) VALUES(:name, :directory, :pages, 1, 0)', books)
 
-        self.db.execute('DELETE FROM books_artists WHERE bookID=?', (data['id'],))
-        for artist in data['artists']:
-            self.db.execute('INSERT INTO books_artists VALUES(?, ?)', (data['id'], artist))
+        self.db.execute('SELECT id FROM books WHERE id > ? ORDER BY id', (last_id,))
+        ids = [x['id'] for x in self.db.fetchall()]
+        self.set_manifests({id_: (book['mtime'], book['manifest']) for id_, book in zip(ids, books) if 'manifest' in book})
+        if self.index:
+            for id_ in ids:
+                self.index.add_book(id_)
+        return ids
 
-        self.db.execute('DELETE FROM books_genres WHERE bookID=?', (data['id'],))
-        for genre in data['genres']:
-            self.db.execute('INSERT INTO books_genres VALUES(?, ?)', (data['id'], genre))
 
-        self.db.execute('DELETE FROM books_tags WHERE bookID=?', (data['id'],))
-        for tag in data['tags']:
-            self.db.execute('INSERT INTO books_tags VALUES(?, ?)', (data['id'], tag))
 
-        self.db.execute(f'DELETE FROM characters_traits WHERE characterID IN (SELECT id FROM characters WHERE bookID = {data["id"]})')
-        self.db.execute(f'DELETE FROM characters WHERE bookID = {data["id"]}')
-        for character in data['characters']:
-            if not character: # don't add characters without traits
-                continue
-            self.db.execute(f'INSERT INTO characters(bookID) VALUES({data["id"]}) RETURNING *')
-            added_data = self.db.fetchone()
-            for trait in character:
-                self.db.execute(f'INSERT INTO characters_traits VALUES({added_data["id"]}, {trait})')
+    def update_book(self, data: dict):
+        """Updates a book's data
+
+        Only what actually changed gets written: the basic fields are compared against the db,
+        and each link table is diffed against the rows it already has so only the missing rows are inserted and the extra ones deleted.
+        Characters are compared by their set of traits, so a character that didn't change keeps its id and rows.
+        Everything is written in one transaction.
+
+        Args:
+            data (dict)
+
+        Returns:
+            set[str]: the fields that changed. any of ['name', 'alt_name', 'series', 'series_order', 'rating', 'notes', 'artists', 'genres', 'tags', 'characters']
+        """
+        book_id = data['id']
+        changed = set()
+
+        # basic fields
+        new_values = {
+            'name': data['title'],
+            'alt_name': data['alt_title'],
+            'series': data['series'],
+            'series_order': data['series_order'],
+            'rating': data['rating'],
+            'notes': data['notes']
+        }
+        self.db.execute(f'SELECT {", ".join(new_values)} FROM books WHERE id=?', (book_id,))
+        old_values = self.db.fetchone()
+        if (basic_changes := {column: value for column, value in new_values.items() if old_values[column] != value}):
+            changed.update(basic_changes)
+            self.db.execute(f'UPDATE books SET {", ".join(f"{column}=?" for column in basic_changes)} WHERE id=?', (*basic_changes.values(), book_id))
+
+        # artists, genres, and tags
+        link_changes = {}
+        for field, (linking_table, column) in LINK_TABLES.items():
+            self.db.execute(f'SELECT {column} FROM {linking_table} WHERE bookID=?', (book_id,))
+            old_ids = {x[column] for x in self.db.fetchall()}
+            new_ids = set(data[field])
+            if (added := new_ids - old_ids):
+                self.db.executemany(f'INSERT INTO {linking_table}(bookID, {column}) VALUES(?, ?)', [(book_id, id_) for id_ in added])
+            if (removed := old_ids - new_ids):
+                self.db.executemany(f'DELETE FROM {linking_table} WHERE bookID=? AND {column}=?', [(book_id, id_) for id_ in removed])
+            if added or removed:
+                changed.add(field)
+                link_changes[field] = (added, removed)
+
+        # characters
+        self.db.execute('SELECT id, traitID FROM characters JOIN characters_traits ON id=characterID WHERE bookID=?', (book_id,))
+        old_characters = {}
+        for row in self.db.fetchall():
+            old_characters.setdefault(row['id'], set()).add(row['traitID'])
+        unmatched = [frozenset(character) for character in data['characters'] if character] # don't add characters without traits
+        removed_characters = []
+        for character_id, traits in old_characters.items():
+            if traits in unmatched:
+                unmatched.remove(traits)
+            else:
+                removed_characters.append(character_id)
+        if removed_characters:
+            self.db.executemany('DELETE FROM characters WHERE id=?', [(id_,) for id_ in removed_characters]) # also removes their traits (ON DELETE CASCADE)
+        added_characters = {}
+        if unmatched:
+            self.db.execute('SELECT COALESCE(MAX(id), -1) AS last_id FROM characters')
+            last_id = self.db.fetchone()['last_id']
+            self.db.executemany('INSERT INTO characters(bookID) VALUES(?)', [(book_id,)] * len(unmatched))
+            self.db.execute('SELECT id FROM characters WHERE id > ? ORDER BY id', (last_id,))
+            added_characters = dict(zip((x['id'] for x in self.db.fetchall()), unmatched))
+            self.db.executemany('INSERT INTO characters_traits(characterID, traitID) VALUES(?, ?)', [(character_id, trait) for character_id, traits in added_characters.items() for trait in traits])
+        if removed_characters or added_characters:
+            changed.add('characters')
 
         self.conn.commit()
+        if self.index:
+            for field, (added, removed) in link_changes.items():
+                self.index.update_links(field, book_id, added, removed)
+            if 'characters' in changed:
+                self.index.update_characters(book_id, removed_characters, added_characters)
+        return changed
 
 
 
     def delete_book(self, id_: int):
         """Deletes a book from the DB and all references to it
 
+        Note:
+            References in the link tables and characters are removed by ON DELETE CASCADE
+
         Args:
             id_ (int)
         """
-        self.db.execute(f'DELETE FROM books WHERE id={id_}')
-        self.db.execute(f'DELETE FROM books_artists WHERE bookID={id_}')
-        self.db.execute(f'DELETE FROM books_genres WHERE bookID={id_}')
-        self.db.execute(f'DELETE FROM books_tags WHERE bookID={id_}')
-        self.db.execute(f'DELETE FROM characters_traits WHERE characterID IN (SELECT id FROM characters WHERE bookID={id_})')
-        self.db.execute(f'DELETE FROM characters WHERE bookID={id_}')
+        self.delete_books([id_])
+
+
+
+    def delete_books(self, ids: list[int]):
+        """Deletes many books in a single transaction. See delete_book()
+        """
+        self.db.executemany('DELETE FROM books WHERE id=?', [(id_,) for id_ in ids])
+        self.conn.commit()
+        if self.index:
+            for id_ in ids:
+                self.index.remove_book(id_)
+
+
+
+    def rename_book_directories(self, directories: dict):
+        """Points books at the new names of their folders
+
+        Args:
+            directories ({int: str}): maps book ids to their new directories
+        """
+        self.db.executemany('UPDATE books SET directory=? WHERE id=?', [(directory, id_) for id_, directory in directories.items()])
         self.conn.commit()
 
 
 
-    def get_book_directories(self):
-        """Used to get a list of all the directories for books in the database
+    def get_manifest_mtimes(self):
+        """Used by the scanner to find which books have changed on disk since their pages were last read
+
+        Returns:
+            {str: (int, int)}: maps each book's directory to its id and the mtime its manifest was made at. the mtime is None if it doesn't have a manifest yet
+        """
+        self.db.execute('SELECT books.id, books.directory, manifests.mtime FROM books LEFT JOIN manifests ON manifests.bookID = books.id')
+        return {x['directory']: (x['id'], x['mtime']) for x in self.db.fetchall()}
+
+
+
+    def get_pages(self, book_id: int):
+        """Gets the file names of a book's pages in reading order from its manifest
 
-        Only really used for Home.scan_directory()
+        If the book's directory has changed since the manifest was made (or it doesn't have one yet), the manifest is re-made first.
+        Should only be called on the main handler, since that might have to write.
 
         Returns:
             [str]
         """
-        self.db.execute('SELECT directory FROM books')
-        return [x['directory'] for x in self.db.fetchall()]
+        self.db.execute('SELECT books.directory, manifests.mtime FROM books LEFT JOIN manifests ON manifests.bookID = books.id WHERE books.id=?', (book_id,))
+        book = self.db.fetchone()
+        path = f'{const.directory}/{book["directory"]}'
+        if book['mtime'] != directory_mtime(path):
+            self.set_manifests({book_id: read_manifest(path)})
+        self.db.execute('SELECT file FROM pages WHERE bookID=? ORDER BY number', (book_id,))
+        return [x['file'] for x in self.db.fetchall()]
 
 
 
-    def set_book_zoom(self, id_: int, zoom: float):
-        self.db.execute(f'UPDATE books SET zoom = {zoom} WHERE id = {id_}')
+    def get_cover(self, directory: str):
+        """
+        Returns:
+            str: the file name of a book's first page. None if the book doesn't have a manifest yet or doesn't have any pages
+        """
+        self.db.execute('SELECT pages.file FROM books JOIN pages ON pages.bookID = books.id AND pages.number = 0 WHERE books.directory=?', (directory,))
+        return (cover := self.db.fetchone()) and cover['file']
+
+
+
+    def set_manifests(self, manifests: dict):
+        """Replaces the page manifests of books in a single transaction. Their page counts are updated to match
+
+        Args:
+            manifests ({int: (int, [dict])}): maps book ids to what page_manifest.read_manifest() returned for them
+        """
+        self.db.executemany('DELETE FROM pages WHERE bookID=?', [(id_,) for id_ in manifests])
+        self.db.executemany('INSERT INTO pages(bookID, number, file, bytes, width, height, format) VALUES(?, ?, ?, ?, ?, ?, ?)', [
+            (id_, number, page['file'], page['bytes'], page['width'], page['height'], page['format'])
+            for id_, (_, pages) in manifests.items()
+            for number, page in enumerate(pages)
+        ])
+        self.db.executemany('INSERT OR REPLACE INTO manifests(bookID, mtime) VALUES(?, ?)', [(id_, mtime) for id_, (mtime, _) in manifests.items()])
+        self.db.executemany('UPDATE books SET pages=? WHERE id=?', [(len(pages), id_) for id_, (_, pages) in manifests.items()])
         self.conn.commit()
 
 
 
+    def set_book_zoom(self, id_: int, zoom: float):
+        """Queues a zoom change. See flush_writes()
+        """
+        self.queue_write(id_, 'zoom', zoom)
+
+
+
     def set_bookmark(self, id_: int, page: int):
-        self.db.execute(f'UPDATE books SET bookmark = {page} WHERE id = {id_}')
+        """Queues a bookmark change. See flush_writes()
+        """
+        self.queue_write(id_, 'bookmark', page)
+
+
+
+    def queue_write(self, id_: int, field: str, value):
+        """Holds onto a write to books so it can be done later with others in one commit
+
+        Repeated writes to the same field of the same book replace each other, so only the last one is actually written.
+
+        Args:
+            id_ (int): book id
+            field (str): one of ['zoom', 'bookmark']
+            value
+        """
+        self.pending_writes.setdefault(id_, {})[field] = value
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+
+
+    def flush_writes(self):
+        """Writes everything queued by queue_write() in a single transaction
+
+        Runs on a timer after the first queued write, and should also be called when the reader closes and when the app exits.
+        """
+        self.flush_timer.stop()
+        if not self.pending_writes:
+            return
+        pending, self.pending_writes = self.pending_writes, {}
+        for field in ['zoom', 'bookmark']:
+            self.db.executemany(f'UPDATE books SET {field}=? WHERE id=?', [(values[field], id_) for id_, values in pending.items() if field in values])
         self.conn.commit()
\ No newline at end of file
@@ -0,0 +1,181 @@
+# standard libraries
+from concurrent.futures import ThreadPoolExecutor
+import sqlite3
+import threading
+
+# dependencies
+from PyQt5.QtCore import QObject
+from PyQt5.QtCore import pyqtSignal
+
+# local modules
+import database
+
+
+
+class Request:
+    """A query that was handed to the DBWorker
+
+    Args:
+        channel (str): requests on the same channel replace each other. the newest one cancels any older one that hasn't finished
+        callback (callable): called on the GUI thread with the result
+
+    Attributes:
+        future (concurrent.futures.Future): resolves to the result (on the worker thread)
+        cancelled (bool): checked by sqlite's progress handler to interrupt the query
+        result
+        error (Exception): set if the query failed for a reason other than being cancelled
+    """
+    def __init__(self, channel: str, callback):
+        self.channel = channel
+        self.callback = callback
+        self.future = None
+        self.cancelled = False
+        self.result = None
+        self.error = None
+
+    def cancel(self):
+        self.cancelled = True
+        self.future.cancel()
+
+
+
+class DBWorker(QObject):
+    """Runs read queries on a pool of threads so the GUI thread never has to wait on sqlite
+
+    Each thread has its own read only DBHandler. The db is in WAL mode, so they can keep reading while the main handler writes.
+    Results are sent back to the GUI thread with a signal and handed to the request's callback there.
+
+    Args:
+        db (database.DBHandler): the main (writing) handler. its index and metadata catalog are shared with the readers
+        workers (int): how many read connections to open
+
+    Signals:
+        failed (str, Exception): a query failed, so its callback won't be called. sent with the request's channel and the error
+
+    Attributes:
+        executor (ThreadPoolExecutor)
+        local (threading.local): holds each thread's read only handler and the request it's currently running
+        channels ({str: Request}): the newest request on each channel
+    """
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str, object)
+
+    def __init__(self, db, workers=2):
+        super().__init__()
+        self.db = db
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db_reader')
+        self.local = threading.local()
+        self.channels = {}
+        self.finished.connect(self.deliver)
+
+
+
+    def reader(self):
+        """Gets (or opens) the read only handler of the current worker thread
+        """
+        if (reader := getattr(self.local, 'reader', None)) is None:
+            reader = self.local.reader = database.DBHandler(read_only=True)
+            reader.index = self.db.index
+            reader.metadata = self.db.metadata
+            # the handler is called every 1000 sqlite instructions. returning non zero interrupts the query
+            reader.conn.set_progress_handler(lambda: self.local.request.cancelled, 1000)
+        return reader
+
+
+
+    def submit(self, channel: str, method: str, args: tuple, callback):
+        """Runs a DBHandler method on one of the worker threads
+
+        Args:
+            channel (str): see Request
+            method (str): name of the DBHandler method to run
+            args (tuple): arguments for the method
+            callback (callable): called on the GUI thread with the result
+
+        Returns:
+            Request
+        """
+        self.cancel(channel)
+        request = Request(channel, callback)
+        self.channels[channel] = request
+        request.future = self.executor.submit(self.run, request, method, args)
+        return request
+
+
+
+    def run(self, request: Request, method: str, args: tuple):
+        """Runs on a worker thread
+        """
+        if request.cancelled:
+            return
+        self.local.request = request
+        try:
+            request.result = getattr(self.reader(), method)(*args)
+        except sqlite3.OperationalError as e:
+            if not request.cancelled: # cancelled queries end with an 'interrupted' error
+                request.error = e
+        except Exception as e:
+            request.error = e
+        finally:
+            self.local.request = None
+        self.finished.emit(request)
+        return request.result
+
+
+
+    def deliver(self, request: Request):
+        """Runs on the GUI thread. Hands the result to the callback unless the request was cancelled or replaced in the meantime
+
+        A query that failed is sent out with the failed signal instead of being raised, since an exception escaping a slot would abort the app.
+        """
+        if self.channels.get(request.channel) is request:
+            del self.channels[request.channel]
+        if request.cancelled:
+            return
+        if request.error:
+            self.failed.emit(request.channel, request.error)
+            return
+        request.callback(request.result)
+
+
+
+    def cancel(self, channel: str):
+        """Cancels the newest request on a channel if it hasn't finished yet
+        """
+        if (request := self.channels.pop(channel, None)):
+            request.cancel()
+
+
+
+    def get_books_page(self, filters, sort_by, after, limit, callback):
+        """See DBHandler.get_books_page(). Only the newest search (or page of one) is kept; older ones are cancelled
+        """
+        return self.submit('books', 'get_books_page', (filters, sort_by, after, limit), callback)
+
+
+
+    def count_books(self, filters, callback):
+        """See DBHandler.count_books()
+        """
+        return self.submit('books_count', 'count_books', (filters,), callback)
+
+
+
+    def get_book_info(self, book_id: int, callback):
+        """See DBHandler.get_book_info(). Only the newest request is kept; older ones are cancelled
+        """
+        return self.submit('book_info', 'get_book_info', (book_id,), callback)
+
+
+
+    def get_metadata(self, tables, callback):
+        """See DBHandler.get_metadata()
+        """
+        return self.submit('metadata', 'get_metadata', (tables,), callback)
+
+
+
+    def shutdown(self):
+        for channel in list(self.channels):
+            self.cancel(channel)
+        self.executor.shutdown(wait=False, cancel_futures=True)
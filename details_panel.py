@@ -4,6 +4,7 @@ from functools import partial
 
 # dependencies
 from PyQt5.QtGui import QPalette
+from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import QBoxLayout
 from PyQt5.QtWidgets import QFrame
 from PyQt5.QtWidgets import QListWidget
@@ -12,6 +13,7 @@ from PyQt5.QtWidgets import QMessageBox
 
 # local modules
 import constants as const
+from cover_loader import CoverLoader
 from ui.details_frame import Ui_details_panel
 
 
@@ -70,11 +72,16 @@ class DetailsPanel(QFrame, Ui_details_panel):
 
     Args:
         db (database.DBHandler)
+        db_worker (db_worker.DBWorker)
         signals (signals.Signals)
         book_id (int): ID of the book that this panel is displaying info about. -1 is none selected
 
+    The bookshelf hands over whatever cover it's showing, which is only as big as a spine's,
+    so the cover is loaded again in the background at the size of cover_img (see show_book_info()).
+
     Attributes:
         cover_img (QLabel)
+        cover_loader (CoverLoader)
         title_text (QLineEdit)
         artist_text (QLineEdit)
         artist_list (QListWidget)
@@ -90,13 +97,22 @@ class DetailsPanel(QFrame, Ui_details_panel):
         notes_text (QTextEdit)
         submit_button (QPushButton)
     """
-    def __init__(self, db, signals):
+    def __init__(self, db, db_worker, signals):
         super().__init__()
         self.setupUi(self)
         self.db = db
+        self.db_worker = db_worker
         self.signals = signals
         self.book_id = -1
+        self.cover_loader = CoverLoader(threads=1)
         self.selected_character = None
+        self.metadata_generation = -1
+        self.lists = {
+            'artists': self.artists_list,
+            'genres': self.genres_list,
+            'tags': self.tags_list,
+            'traits': self.traits_list
+        }
         self.character_scroll_layout.setDirection(QBoxLayout.BottomToTop)
         self.character_scroll_layout.addStretch()
         self.populate_metadata()
@@ -104,25 +120,31 @@ class DetailsPanel(QFrame, Ui_details_panel):
 
 
 
-    def populate_metadata(self):
-        self.clear_fields()
+    def populate_metadata(self, tables=None):
+        """Populates the series dropdown and the metadata lists
 
-        metadata = self.db.get_metadata()
+        Args:
+            tables ([str], optional): only re-populate these. clears the whole panel and re-populates everything if not given
+        """
+        if not tables:
+            self.clear_fields()
+            tables = ['series', *self.lists]
+        self.metadata_generation = self.db.metadata.generation
+        metadata = self.db.get_metadata(tables)
 
         # populate series options
-        self.series_dropdown.addItem('')
-        for series in metadata['series']:
-            self.series_dropdown.addItem(series.text(), series.id_)
+        if 'series' in tables:
+            self.series_dropdown.clear()
+            self.series_dropdown.addItem('')
+            for series in metadata['series']:
+                self.series_dropdown.addItem(series.text(), series.id_)
 
         # populate metadata lists
-        for artist in metadata['artists']:
-            self.artists_list.addItem(artist)
-        for genre in metadata['genres']:
-            self.genres_list.addItem(genre)
-        for tag in metadata['tags']:
-            self.tags_list.addItem(tag)
-        for trait in metadata['traits']:
-            self.traits_list.addItem(trait)
+        for table, list_widget in self.lists.items():
+            if table in tables:
+                list_widget.clear()
+                for item in metadata[table]:
+                    list_widget.addItem(item)
 
 
 
@@ -160,23 +182,33 @@ class DetailsPanel(QFrame, Ui_details_panel):
 
 
 
-    def clear_fields(self):
+    def clear_fields(self, keep_lists=False):
+        """
+        Args:
+            keep_lists (bool): if true, the series dropdown and metadata lists are left alone
+        """
         self.cover_img.clear()
         self.title_text.clear()
+        self.alt_title_text.clear()
         self.artists_text.clear()
-        self.artists_list.clear()
-        self.series_dropdown.clear()
         self.order_number.setValue(0)
         self.rating_number.setValue(0)
         self.pages_text.clear()
         self.date_text.clear()
         self.genres_text.clear()
-        self.genres_list.clear()
         self.tags_text.clear()
-        self.tags_list.clear()
         self.traits_text.clear()
-        self.traits_list.clear()
         self.notes_text.clear()
+        self.remove_characters()
+        if not keep_lists:
+            self.series_dropdown.clear()
+            for list_widget in self.lists.values():
+                list_widget.clear()
+
+
+
+    def remove_characters(self):
+        self.selected_character = None
         for i in reversed(range(self.character_scroll_layout.count())):
             if (item := self.character_scroll_layout.itemAt(i).widget()) != None:
                 item.setParent(None)
@@ -184,9 +216,20 @@ class DetailsPanel(QFrame, Ui_details_panel):
 
 
     def update_metadata(self):
-        """Updates all the metadata when metadata is edited in any way
+        """Updates the metadata that was edited since the panel was last populated
 
-        Makes sure to re-populate book info if a book is currently selected
+        Makes sure to re-apply book info to those lists if a book is currently selected
+        """
+        if not (tables := self.db.metadata.changed_since(self.metadata_generation)):
+            return
+        self.populate_metadata(tables)
+        if self.book_id >= 0:
+            self.apply_book_metadata(self.db.get_book_info(self.book_id), tables)
+
+
+
+    def reset_book_details(self):
+        """Throws away any unsaved edits by re-populating the whole panel from the db
         """
         if self.book_id >= 0:
             cover_img = self.cover_img.pixmap().copy()
@@ -197,49 +240,89 @@ class DetailsPanel(QFrame, Ui_details_panel):
 
 
     def populate_book_info(self, cover_img, book_id):
+        """Loads the book's info in the background and fills in the panel once it arrives (see show_book_info())
+        """
         self.book_id = book_id
-        book_info = self.db.get_book_info(book_id)
-
         self.cover_img.setPixmap(cover_img)
+        self.cover_loader.cancel()
+        self.db_worker.get_book_info(book_id, self.show_book_info)
+
+
+
+    def show_book_info(self, book_info):
+        if book_info is None or book_info['id'] != self.book_id: # the book was deselected or changed while loading
+            return
         self.title_text.setText(book_info['name'])
         self.alt_title_text.setText(book_info['alt_name'])
-        self.series_dropdown.setCurrentText(book_info['series'].text())
         self.order_number.setValue((0 if not book_info['series_order'] else book_info['series_order']))
         self.rating_number.setValue((0 if not book_info['rating'] else book_info['rating']))
         self.pages_text.setText(str(book_info['pages']))
         self.date_text.setText(datetime.fromisoformat(book_info['date_added']).strftime('%B %d, %Y - %I:%M%p'))
         self.notes_text.setText(book_info['notes'])
+        self.apply_book_metadata(book_info)
+        self.cover_loader.request(book_info['id'], book_info['directory'], self.cover_img.maximumWidth(), None, partial(self.set_cover, book_info['id']))
 
-        for i in range(self.artists_list.count()):
-            item = self.artists_list.item(i)
-            if item in book_info['artists']:
-                self.apply_metadata(self.artists_list, item)
 
-        for i in range(self.genres_list.count()):
-            item = self.genres_list.item(i)
-            if item in book_info['genres']:
-                self.apply_metadata(self.genres_list, item)
 
-        for i in range(self.tags_list.count()):
-            item = self.tags_list.item(i)
-            if item in book_info['tags']:
-                self.apply_metadata(self.tags_list, item)
+    def set_cover(self, book_id: int, cover):
+        """Replaces the cover the bookshelf handed over with a full size one, uncropped like the bookshelf's covers used to be
+        """
+        if book_id == self.book_id and not cover.isNull():
+            self.cover_img.setPixmap(QPixmap.fromImage(cover))
 
-        for character_id, traits in book_info['characters'].items():
-            character = self.add_character()
-            for trait in traits:
-                character.addItem(trait)
+
+
+    def apply_book_metadata(self, book_info, tables=None):
+        """Applies a book's series, artists, genres, tags, and characters to the (freshly populated) dropdown and lists
+
+        Args:
+            book_info (dict): from DBHandler.get_book_info()
+            tables ([str], optional): only apply these. applies everything if not given
+        """
+        tables = tables or ['series', *self.lists]
+
+        if 'series' in tables:
+            self.series_dropdown.setCurrentText(book_info['series'].text())
+
+        for table in ['artists', 'genres', 'tags']:
+            if table not in tables:
+                continue
+            list_widget = self.lists[table]
+            for i in range(list_widget.count()):
+                item = list_widget.item(i)
+                if item in book_info[table]:
+                    self.apply_metadata(list_widget, item)
+
+        if 'traits' in tables:
+            self.remove_characters()
+            for character_id, traits in book_info['characters'].items():
+                character = self.add_character()
+                for trait in traits:
+                    character.addItem(trait)
 
 
 
     def cleanse_details(self):
         """Cleanses info about the currently selected book
 
-        Executed when a book is deselected in the gallery
+        Executed when a book is deselected in the gallery.
+        The lists are un-applied in place instead of being re-populated from the db.
         """
+        self.db_worker.cancel('book_info')
+        self.cover_loader.cancel()
         self.book_id = -1
         self.selected_character = None
-        self.populate_metadata()
+        self.clear_fields(keep_lists=True)
+        self.series_dropdown.setCurrentIndex(0)
+        for list_widget in self.lists.values():
+            items = []
+            while len(list_widget):
+                item = list_widget.takeItem(0)
+                item.setBackground(const.Colors.NONE)
+                items.append(item)
+            items.sort(key=lambda x: x.text().lower())
+            for item in items:
+                list_widget.addItem(item)
 
 
 
@@ -426,8 +509,8 @@ class DetailsPanel(QFrame, Ui_details_panel):
             return
 
         # update info
-        self.db.update_book(data)
-        self.signals.update_spine.emit(data['id'])
+        if self.db.update_book(data) - {'artists', 'genres', 'tags', 'characters'}: # spines only hold the basic fields
+            self.signals.update_spine.emit(data['id'])
 
         # inform user of successful operation
         popup = QMessageBox()
@@ -451,4 +534,4 @@ class DetailsPanel(QFrame, Ui_details_panel):
         reset = menu.addAction('Reset Book Details')
         if (selection := menu.exec_(event.globalPos())):
             if selection == reset:
-                self.update_metadata()
\ No newline at end of file
+                self.reset_book_details()
\ No newline at end of file
@@ -2,20 +2,26 @@
 from datetime import datetime
 from datetime import timedelta
 import json
-from os import listdir
-from os.path import isdir
 
 # dependencies
 from PyQt5.QtWidgets import QFileDialog
 from PyQt5.QtWidgets import QMainWindow
+from PyQt5.QtWidgets import QMessageBox
+from PyQt5.QtWidgets import QProgressDialog
 
 # local modules
 import constants as const
 import database
+from db_worker import DBWorker
 from bookshelf_panel import BookshelfPanel
 from details_panel import DetailsPanel
+from library_watcher import LibraryWatcher
 from metadata_panel import MetadataPanel
+from preview_list import THUMBNAIL_WIDTH
+from scanner import LibraryScanner
 from search_panel import SearchPanel
+from thumbnails import mip_sizes
+from virtual_bookshelf_panel import VirtualBookshelfPanel
 from ui.main_window import Ui_MainWindow
 
 
@@ -45,6 +51,7 @@ class Home(QMainWindow, Ui_MainWindow):
         details_panel (DetailsPanel)
         search_panel (SearchPanel)
         metadata_panel (MetadataPanel)
+        watcher (LibraryWatcher): None if "library_watcher" is turned off in config.json
     """
     def __init__(self, signals, directory: str):
         super().__init__()
@@ -54,9 +61,14 @@ class Home(QMainWindow, Ui_MainWindow):
         self.signals = signals
         self.directory = directory
         self.db = database.DBHandler()
-
-        self.bookshelf_panel = BookshelfPanel(self.db, self.signals)
-        self.details_panel = DetailsPanel(self.db, self.signals)
+        self.db_worker = DBWorker(self.db)
+        self.scanner = None
+        self.scan_time = None
+        self.imported = False
+        self.watcher = LibraryWatcher(self.db, self.signals, const.directory) if const.library_watcher else None
+
+        self.bookshelf_panel = (VirtualBookshelfPanel if const.virtual_bookshelf else BookshelfPanel)(self.db, self.db_worker, self.signals)
+        self.details_panel = DetailsPanel(self.db, self.db_worker, self.signals)
         self.search_panel = SearchPanel(self.db, self.signals)
         self.metadata_panel = MetadataPanel(self.db, self.signals)
         self.setup_panels()
@@ -94,6 +106,7 @@ class Home(QMainWindow, Ui_MainWindow):
         # signals
         self.signals.show_details_panel.connect(self.show_details_panel)
         self.signals.show_bookshelf_panel.connect(self.show_bookshelf_panel)
+        self.db_worker.failed.connect(self.query_failed)
 
 
 
@@ -150,16 +163,81 @@ class Home(QMainWindow, Ui_MainWindow):
 
 
     def scan_directory(self):
-        """Scans the manga directory for any new entries, adds the new books to the db with near blank fields, and then sets the search filter to only show the new books so the user can edit the metadata
+        """Scans the manga directory for any new entries and changed books in the background (see scanner.LibraryScanner)
+
+        The new books get added to the db by import_books() a batch at a time as they're read, and scan_finished() shows them once the scan is done.
+        Their covers are made at every mip level the bookshelf scales them from (see thumbnails.MIP_LEVELS) and the size the reader's series list shows them along the way.
+        """
+        if self.scanner and self.scanner.isRunning():
+            return
+        self.scan_time = datetime.now()
+        self.imported = False
+        self.scanner = LibraryScanner(const.directory, self.db.get_manifest_mtimes(), mip_sizes() + [(THUMBNAIL_WIDTH, None)])
+
+        progress = QProgressDialog('Scanning for new books...', 'Cancel', 0, 0, self)
+        progress.setWindowTitle('Scan')
+        progress.setMinimumDuration(500)
+        progress.canceled.connect(self.scanner.requestInterruption)
+        self.scanner.progress.connect(lambda done, total: (progress.setMaximum(total), progress.setValue(done)))
+        self.scanner.found.connect(self.import_books)
+        self.scanner.report.connect(self.scan_finished)
+        self.scanner.finished.connect(progress.reset)
+        self.scanner.start()
+
+
+
+    def import_books(self, books: list[dict], changed: dict):
+        """Adds a batch of new books to the db with near blank fields in a single transaction
+
+        Books whose pages changed on disk get their new manifests stored as well.
+        """
+        self.db.set_manifests(changed)
+        self.imported |= bool(self.db.add_books(books))
+
+
+
+    def query_failed(self, channel: str, error: Exception):
+        """Lets the user know a query that was running in the background failed, since whatever was waiting on it won't show up
+
+        Args:
+            channel (str): what the query was for. see DBWorker
+            error (Exception)
+        """
+        popup = QMessageBox()
+        popup.setIcon(QMessageBox.Critical)
+        popup.setWindowTitle('Error')
+        popup.setText(f'Could not load {channel.replace("_", " ")} from the database')
+        popup.setInformativeText(f'{type(error).__name__}: {error}')
+        popup.setStandardButtons(QMessageBox.Close)
+        popup.exec_()
+
+
+
+    def scan_finished(self, report: dict):
+        """Shows how fast the scan went, and then sets the search filter to only show the new books so the user can edit the metadata
+
+        Args:
+            report (dict): from LibraryScanner.report
         """
-        scan_time = datetime.now()
-        for book in (folder for folder in listdir(const.directory) if isdir(f'{const.directory}/{folder}') and folder not in self.db.get_book_directories()):
-            self.db.add_book(book, book, pages=len(listdir(f'{const.directory}/{book}')))
+        seconds = max(report['seconds'], 0.001)
+        megabytes = report['bytes'] / 1024 / 1024
+        popup = QMessageBox()
+        popup.setIcon(QMessageBox.Information)
+        popup.setWindowTitle('Scan')
+        popup.setText(f'Scan {"cancelled" if report["cancelled"] else "finished"}: read {report["books"]} books ({megabytes:.1f} MB) in {seconds:.1f} seconds')
+        popup.setInformativeText(f'{report["books"] / seconds:.1f} books/sec, {megabytes / seconds:.1f} MB/sec')
+        popup.setStandardButtons(QMessageBox.Close)
+        popup.exec_()
+
+        if not self.imported:
+            if report['books']: # page counts may have changed
+                self.search_panel.submit()
+            return
 
         # filter gallery to show only the the new books (using date filtering)
         self.show_details_panel()
         self.search_panel.clear_fields()
-        self.search_panel.date_low.setDateTime(scan_time - timedelta(minutes=1))
+        self.search_panel.date_low.setDateTime(self.scan_time - timedelta(minutes=1))
         self.search_panel.submit()
 
 
@@ -176,5 +254,7 @@ class Home(QMainWindow, Ui_MainWindow):
         with open('config.json', 'w') as file:
             json.dump(data, file)
         const.directory = folder[0]
+        if self.watcher:
+            self.watcher.set_directory(folder[0])
 
         self.search_panel.submit()
\ No newline at end of file
@@ -0,0 +1,50 @@
+# standard libraries
+from collections import deque
+
+
+
+class LatencyLog():
+    """Keeps the most recent timings of something so its percentiles can be checked against real libraries
+
+    Args:
+        size (int): how many timings to keep
+
+    Attributes:
+        timings (deque): the most recent timings, in milliseconds
+        skipped (int): turns that were overtaken by another one before they were painted
+    """
+    def __init__(self, size=1000):
+        self.timings = deque(maxlen=size)
+        self.skipped = 0
+
+
+
+    def record(self, ms: float):
+        self.timings.append(ms)
+
+
+
+    def percentile(self, p: float) -> float:
+        """
+        Args:
+            p (float): 0 to 100
+
+        Returns:
+            float: the timing p percent of the recorded ones are at or below. 0 if nothing has been recorded
+        """
+        if not self.timings:
+            return 0
+        ordered = sorted(self.timings)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+
+    def summary(self) -> str:
+        return (f'{len(self.timings)} turns, {self.skipped} skipped\n'
+                f'p50: {self.percentile(50):.1f} ms\n'
+                f'p95: {self.percentile(95):.1f} ms\n'
+                f'p99: {self.percentile(99):.1f} ms')
+
+
+
+page_turns = LatencyLog() # keypress to paint of the reader's page turns
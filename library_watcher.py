@@ -0,0 +1,162 @@
+# standard libraries
+from os import scandir
+
+# dependencies
+from PyQt5.QtCore import QFileSystemWatcher
+from PyQt5.QtCore import QObject
+from PyQt5.QtCore import QTimer
+
+# local modules
+import constants as const
+from book_source import is_book
+from scanner import LibraryScanner
+
+
+
+class LibraryWatcher(QObject):
+    """Keeps the db in sync with the manga directory while the app is open, so books don't have to be scanned in by hand
+
+    Changes to the manga directory are batched: every change restarts a short timer and the directory is only looked at once it runs out.
+    Each batch is compared against the folders seen in the last one:
+        folders that disappeared while a new folder with the same inode appeared were renamed, so the book just follows its folder
+        folders that disappeared for good have their books deleted from the db
+        new folders are read by a LibraryScanner in the background and added as new books
+    Books whose folders changed since their manifests were made (see page_manifest.py) get new manifests in the same pass.
+    New and changed book folders are watched until a batch goes by where they didn't change, so books that are still being copied in are read again once they're done.
+
+    If the manga directory can't be watched (some network drives can't), it's polled instead.
+    If it can't be read at all or suddenly looks empty, nothing is deleted, in case it's on a drive that was just unplugged.
+
+    The bookshelf is told exactly which books changed with signals.books_added, books_removed, and books_changed.
+
+    Args:
+        db (database.DBHandler): the main handler
+        signals (signals.Signals)
+        directory (str): the manga directory
+
+    Attributes:
+        watcher (QFileSystemWatcher)
+        batch (QTimer): syncs once changes stop coming in
+        poll (QTimer): syncs every so often when the directory can't be watched
+        folders ({str: int}): the inode of every folder in the manga directory as of the last sync
+        scanner (LibraryScanner): reads new and changed folders. None if it hasn't been needed yet
+        rescan (bool): whether something changed while the scanner was running
+        changing ([str]): paths of the folders and archives the scanner found new or changed books in
+    """
+    def __init__(self, db, signals, directory: str):
+        super().__init__()
+        self.db = db
+        self.signals = signals
+        self.directory = directory
+        self.scanner = None
+        self.rescan = False
+        self.changing = []
+        self.watcher = QFileSystemWatcher()
+        self.batch = QTimer()
+        self.batch.setSingleShot(True)
+        self.batch.setInterval(const.Timers.LIBRARY_BATCH)
+        self.poll = QTimer()
+        self.poll.setInterval(const.Timers.LIBRARY_POLL)
+        self.watcher.directoryChanged.connect(self.batch.start) # restarting the timer is what batches the changes
+        self.watcher.fileChanged.connect(self.batch.start) # archives
+        self.batch.timeout.connect(self.sync)
+        self.poll.timeout.connect(self.sync)
+        self.set_directory(directory)
+
+
+
+    def set_directory(self, directory: str):
+        """Starts watching a different manga directory
+
+        The folders and archives of the old one that were still being watched (see scan_finished()) are let go too.
+        """
+        if (watched := self.watcher.directories() + self.watcher.files()):
+            self.watcher.removePaths(watched)
+        self.changing = []
+        self.directory = directory
+        try:
+            self.folders = self.snapshot()
+        except OSError:
+            self.folders = {}
+        if self.watcher.addPath(directory):
+            self.poll.stop()
+        else:
+            self.poll.start()
+
+
+
+    def snapshot(self):
+        """
+        Returns:
+            {str: int}: maps every book (folder or archive) in the manga directory to its inode
+        """
+        with scandir(self.directory) as entries:
+            return {entry.name: entry.inode() for entry in entries if is_book(entry)}
+
+
+
+    def sync(self):
+        """Applies everything that changed in the manga directory since the last sync to the db
+        """
+        if self.scanner and self.scanner.isRunning():
+            self.rescan = True
+            return
+        try:
+            folders = self.snapshot()
+        except OSError: # the directory isn't available right now
+            return
+        known = self.db.get_manifest_mtimes()
+        if not folders and known: # most likely a drive that isn't plugged in
+            return
+
+        new_folders = {inode: folder for folder, inode in folders.items() if folder not in known}
+        renamed = {}
+        removed = []
+        for folder, (book_id, _) in known.items():
+            if folder in folders:
+                continue
+            if (inode := self.folders.get(folder)) and inode in new_folders: # some file systems don't have inodes (0)
+                renamed[book_id] = new_folders.pop(inode)
+            else:
+                removed.append(book_id)
+        self.folders = folders
+
+        if renamed:
+            self.db.rename_book_directories(renamed)
+            self.signals.books_changed.emit(list(renamed))
+        if removed:
+            self.db.delete_books(removed)
+            self.signals.books_removed.emit(removed)
+
+        self.changing = []
+        self.scanner = LibraryScanner(self.directory, self.db.get_manifest_mtimes())
+        self.scanner.found.connect(self.import_books)
+        self.scanner.finished.connect(self.scan_finished)
+        self.scanner.start()
+
+
+
+    def import_books(self, books: list[dict], changed: dict):
+        """Stores a batch of what the scanner found
+        """
+        ids = self.db.add_books(books)
+        self.db.set_manifests(changed)
+        if ids:
+            self.signals.books_added.emit(ids)
+        if changed:
+            self.signals.books_changed.emit(list(changed))
+        directories = {book_id: folder for folder, (book_id, _) in self.db.get_manifest_mtimes().items()} if changed else {}
+        self.changing += [f'{self.directory}/{book["directory"]}' for book in books] + [f'{self.directory}/{directories[book_id]}' for book_id in changed]
+
+
+
+    def scan_finished(self):
+        """Keeps watching the folders that changed, and stops watching the ones that have settled
+        """
+        if (settled := [path for path in self.watcher.directories() + self.watcher.files() if path != self.directory]):
+            self.watcher.removePaths(settled)
+        if self.changing:
+            self.watcher.addPaths(self.changing)
+        if self.rescan:
+            self.rescan = False
+            self.sync()
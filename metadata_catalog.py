@@ -0,0 +1,67 @@
+# standard libraries
+from threading import Lock
+
+# local modules
+from migrations import METADATA_TABLES
+
+
+
+class MetadataCatalog:
+    """Cache of every metadata table, shared by all the panels through DBHandler
+
+    Each table is read from the db once and then kept until something changes it.
+    Every change bumps a generation counter, and each table remembers the generation it was last changed at,
+    so anything holding onto a copy of the metadata can ask for just the tables that changed since it last looked.
+
+    Note:
+        Only DBHandler.create_metadata(), rename_metadata(), delete_metadata(), and update_metadata_description() should call invalidate()
+        The catalog is shared with the read only handlers of the db worker, so reading a table is done under a lock.
+
+    Attributes:
+        generation (int): goes up by one every time any table changes
+        table_generations ({str: int}): the generation each table was last changed at
+        rows ({str: [(int, str, str)]}): (id, name, description) for each entry, sorted by name. tables that need to be re-read are missing
+    """
+    def __init__(self):
+        self.generation = 0
+        self.table_generations = {table: 0 for table in METADATA_TABLES}
+        self.rows = {}
+        self.lock = Lock()
+
+
+
+    def get(self, table: str, conn):
+        """
+        Args:
+            table (str)
+            conn (sqlite3.Connection): connection to read the table with if it isn't cached. must belong to the calling thread
+
+        Returns:
+            [(int, str, str)]: (id, name, description) for every entry in the table, sorted by name
+        """
+        with self.lock:
+            if (rows := self.rows.get(table)) is None:
+                rows = self.rows[table] = conn.execute(f'SELECT id, name, {METADATA_TABLES[table]} FROM {table} ORDER BY name COLLATE NOCASE').fetchall()
+            return rows
+
+
+
+    def invalidate(self, table: str):
+        """Marks a table as changed so it gets re-read the next time it's needed
+        """
+        with self.lock:
+            self.generation += 1
+            self.table_generations[table] = self.generation
+            self.rows.pop(table, None)
+
+
+
+    def changed_since(self, generation: int):
+        """
+        Args:
+            generation (int): the generation the caller last loaded
+
+        Returns:
+            [str]: the tables that have changed since then
+        """
+        return [table for table, changed in self.table_generations.items() if changed > generation]
@@ -44,6 +44,14 @@ class MetadataPanel(QFrame, Ui_metadata_panel):
         self.setupUi(self)
         self.db = db
         self.signals = signals
+        self.metadata_generation = -1
+        self.lists = {
+            'artists': self.artists_list,
+            'series': self.series_list,
+            'genres': self.genres_list,
+            'tags': self.tags_list,
+            'traits': self.traits_list
+        }
         self.connect_events()
         self.populate_metadata()
 
@@ -78,35 +86,32 @@ class MetadataPanel(QFrame, Ui_metadata_panel):
         self.traits_list.contextMenuEvent = partial(self.context_menu, self.traits_list)
 
         # signals
-        self.signals.update_metadata.connect(self.populate_metadata)
+        self.signals.update_metadata.connect(self.update_metadata)
 
 
 
-    def populate_metadata(self):
+    def populate_metadata(self, tables=None):
         """Populates each of the lists
+
+        Args:
+            tables ([str], optional): only re-populate these lists
+        """
+        tables = tables or list(self.lists)
+        self.metadata_generation = self.db.metadata.generation
+        metadata = self.db.get_metadata(tables)
+
+        for table in tables:
+            self.lists[table].clear()
+            for item in metadata[table]:
+                self.lists[table].addItem(item)
+
+
+
+    def update_metadata(self):
+        """Re-populates only the lists whose tables changed since they were last populated
         """
-        self.clear_fields()
-        metadata = self.db.get_metadata()
-
-        for item in metadata['artists']:
-            self.artists_list.addItem(item)
-        for item in metadata['series']:
-            self.series_list.addItem(item)
-        for item in metadata['genres']:
-            self.genres_list.addItem(item)
-        for item in metadata['tags']:
-            self.tags_list.addItem(item)
-        for item in metadata['traits']:
-            self.traits_list.addItem(item)
-
-
-
-    def clear_fields(self):
-        self.artists_list.clear()
-        self.series_list.clear()
-        self.genres_list.clear()
-        self.tags_list.clear()
-        self.traits_list.clear()
+        if tables := self.db.metadata.changed_since(self.metadata_generation):
+            self.populate_metadata(tables)
 
 
 
@@ -0,0 +1,312 @@
+'''
+Versioned schema migrations for mangalibrary.db
+
+The version a db is on is stored in PRAGMA user_version. Every migration in MIGRATIONS that comes after that
+version is run in order, each one in its own transaction, and user_version is bumped along with it.
+New migrations should only ever be appended to the end of the list.
+'''
+
+
+
+BOOKS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS books
+    (
+        id INTEGER PRIMARY KEY,
+        date_added DATETIME DEFAULT (DATETIME(CURRENT_TIMESTAMP, 'LOCALTIME')),
+        name TEXT,
+        alt_name TEXT,
+        series INTEGER,
+        series_order REAL,
+        pages INTEGER,
+        rating INTEGER,
+        notes TEXT,
+        directory TEXT,
+        zoom REAL,
+        bookmark INTEGER -- the page you left on when you closed the reader
+    )
+'''
+
+METADATA_TABLES = {
+    'artists': 'alt_name',
+    'series': 'alt_name',
+    'genres': 'description',
+    'tags': 'description',
+    'traits': 'description'
+}
+
+# (linking table, left column, left table, right column, right table)
+LINK_TABLES = [
+    ('books_artists', 'bookID', 'books', 'artistID', 'artists'),
+    ('books_genres', 'bookID', 'books', 'genreID', 'genres'),
+    ('books_tags', 'bookID', 'books', 'tagID', 'tags'),
+    ('characters_traits', 'characterID', 'characters', 'traitID', 'traits')
+]
+
+
+
+def migrate(conn):
+    """Brings the db up to the newest schema version
+
+    Args:
+        conn (sqlite3.Connection)
+    """
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA user_version')
+    version = cursor.fetchone()[0]
+
+    for new_version, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        # foreign keys have to be off while tables are being rebuilt. this can't be changed inside a transaction
+        cursor.execute('PRAGMA foreign_keys = OFF')
+        cursor.execute('BEGIN')
+        try:
+            migration(cursor)
+            cursor.execute('PRAGMA foreign_key_check')
+            if cursor.fetchone():
+                raise RuntimeError(f'schema migration {new_version} left rows with broken foreign keys')
+            cursor.execute(f'PRAGMA user_version = {new_version}')
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+
+    cursor.execute('PRAGMA foreign_keys = ON')
+
+
+
+def table_columns(cursor, table: str):
+    """
+    Returns:
+        {str: bool}: maps each column name to whether or not it's (part of) the primary key. empty if the table doesn't exist
+    """
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {column[1]: bool(column[5]) for column in cursor.fetchall()}
+
+
+
+def rebuild_table(cursor, table: str, create_statement: str, converters=None, where=''):
+    """Rebuilds a table with a new definition while keeping all of its data
+
+    Only columns that exist in both the old and new definition are copied over.
+
+    Args:
+        cursor (sqlite3.Cursor)
+        table (str)
+        create_statement (str): must create a table called {table}
+        converters ({str: str}, optional): SQL expressions used to copy a column instead of copying it as is
+        where (str, optional): condition a row has to meet to be copied over
+    """
+    converters = converters or {}
+    old_columns = table_columns(cursor, table)
+    cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+    cursor.execute(create_statement)
+    columns = [column for column in table_columns(cursor, table) if column in old_columns]
+    selects = [converters.get(column, column) for column in columns]
+    cursor.execute(f'INSERT INTO {table}({", ".join(columns)}) SELECT {", ".join(selects)} FROM {table}_old {f"WHERE {where}" if where else ""}')
+    cursor.execute(f'DROP TABLE {table}_old')
+
+
+
+def baseline_schema(cursor):
+    """Version 1: creates every table and brings dbs from before the schema was versioned up to the same layout
+
+    Very old dbs didn't have primary keys on their ids (and were missing columns), so any table like that gets rebuilt.
+    Those dbs also stored date_added as a unix timestamp instead of a datetime string.
+    """
+    columns = table_columns(cursor, 'books')
+    if columns and (not columns.get('id') or 'zoom' not in columns or 'bookmark' not in columns):
+        rebuild_table(cursor, 'books', BOOKS_TABLE, {
+            'date_added': "CASE WHEN typeof(date_added) IN ('integer', 'real') THEN DATETIME(date_added, 'unixepoch', 'localtime') ELSE date_added END"
+        })
+    cursor.execute(BOOKS_TABLE)
+    cursor.execute('UPDATE books SET zoom = 1 WHERE zoom IS NULL')
+    cursor.execute('UPDATE books SET bookmark = 0 WHERE bookmark IS NULL')
+
+    for table, description in METADATA_TABLES.items():
+        create_statement = f'''
+            CREATE TABLE IF NOT EXISTS {table}
+            (
+                id INTEGER PRIMARY KEY,
+                name TEXT,
+                {description} TEXT
+            )
+        '''
+        columns = table_columns(cursor, table)
+        if columns and not columns.get('id'):
+            rebuild_table(cursor, table, create_statement)
+        cursor.execute(create_statement)
+
+    for table, left, _, right, _ in LINK_TABLES[:3]:
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table}
+            (
+                {left} INTEGER,
+                {right} INTEGER
+            )
+        ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS characters
+        (
+            id INTEGER PRIMARY KEY,
+            bookID INTEGER
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS characters_traits
+        (
+            characterID INTEGER,
+            traitID INTEGER
+        )
+    ''')
+
+
+
+def full_text_search(cursor):
+    """Version 2: creates the full text search indexes for titles, alt titles, and notes.
+
+    There are two indexes over the same columns:
+        books_fts uses trigrams so any substring of 3+ characters can be looked up (same results as LIKE '%x%')
+        books_fts_prefix indexes whole words with prefixes so 1 and 2 character searches don't have to scan the table (dropped in version 5)
+
+    Both are external content tables that read from books and are kept in sync with triggers.
+    They get backfilled from whatever is already in books.
+    """
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5
+        (
+            name, alt_name, notes,
+            content='books', content_rowid='id',
+            tokenize='trigram'
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts_prefix USING fts5
+        (
+            name, alt_name, notes,
+            content='books', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='1 2'
+        )
+    ''')
+
+    for table in ['books_fts', 'books_fts_prefix']:
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON books BEGIN
+                INSERT INTO {table}(rowid, name, alt_name, notes) VALUES (new.id, new.name, new.alt_name, new.notes);
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON books BEGIN
+                INSERT INTO {table}({table}, rowid, name, alt_name, notes) VALUES ('delete', old.id, old.name, old.alt_name, old.notes);
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF name, alt_name, notes ON books BEGIN
+                INSERT INTO {table}({table}, rowid, name, alt_name, notes) VALUES ('delete', old.id, old.name, old.alt_name, old.notes);
+                INSERT INTO {table}(rowid, name, alt_name, notes) VALUES (new.id, new.name, new.alt_name, new.notes);
+            END
+        ''')
+        cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+
+def link_constraints(cursor):
+    """Version 3: adds keys, foreign keys, and indexes
+
+    Link tables get a composite primary key (which also stops duplicate rows from breaking the AND filters),
+    an index in the other direction, and ON DELETE CASCADE to both sides.
+    Duplicate rows and rows pointing at things that no longer exist are dropped while copying.
+    Books also get indexes on every column that can be sorted by.
+    """
+    rebuild_table(cursor, 'characters', '''
+        CREATE TABLE characters
+        (
+            id INTEGER PRIMARY KEY,
+            bookID INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE
+        )
+    ''', where='bookID IN (SELECT id FROM books)') # also leaves out characters without a book, which NOT NULL wouldn't let through
+    cursor.execute('CREATE INDEX IF NOT EXISTS characters_book ON characters(bookID, id)')
+
+    for table, left, left_table, right, right_table in LINK_TABLES:
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+        cursor.execute(f'''
+            CREATE TABLE {table}
+            (
+                {left} INTEGER NOT NULL REFERENCES {left_table}(id) ON DELETE CASCADE,
+                {right} INTEGER NOT NULL REFERENCES {right_table}(id) ON DELETE CASCADE,
+                PRIMARY KEY ({left}, {right})
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO {table}({left}, {right})
+            SELECT {left}, {right} FROM {table}_old
+            WHERE {left} IN (SELECT id FROM {left_table}) AND {right} IN (SELECT id FROM {right_table})
+        ''')
+        cursor.execute(f'DROP TABLE {table}_old')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {table}_reverse ON {table}({right}, {left})')
+
+    # characters without any traits aren't allowed (see DBHandler.update_book)
+    cursor.execute('DELETE FROM characters WHERE id NOT IN (SELECT characterID FROM characters_traits)')
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS books_name ON books(name COLLATE NOCASE)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS books_rating ON books(rating)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS books_pages ON books(pages)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS books_date_added ON books(date_added)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS books_series ON books(series, series_order)')
+
+
+
+def page_manifests(cursor):
+    """Version 4: adds the page manifest of each book (see page_manifest.py)
+
+    pages holds the pages of a book in reading order, so nothing has to list the book's directory to find them.
+    manifests holds the mtime of the book's directory when its pages were last read, so they're only re-read when it changes.
+    Books that are already in the db get their manifests the next time they're opened or the library is scanned.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pages
+        (
+            bookID INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+            number INTEGER NOT NULL, -- 0 is the cover
+            file TEXT NOT NULL,
+            bytes INTEGER,
+            width INTEGER,
+            height INTEGER,
+            format TEXT,
+            PRIMARY KEY (bookID, number)
+        ) WITHOUT ROWID
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS manifests
+        (
+            bookID INTEGER PRIMARY KEY REFERENCES books(id) ON DELETE CASCADE,
+            mtime INTEGER NOT NULL
+        )
+    ''')
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS books_directory ON books(directory)')
+
+
+
+def drop_prefix_index(cursor):
+    """Version 5: drops books_fts_prefix
+
+    It only matched 1 and 2 character searches against the start of words, while titles used to match them anywhere.
+    Those searches are back to LIKE (see query_compiler.fts_match()), so nothing reads it anymore.
+    """
+    for trigger in ['insert', 'delete', 'update']:
+        cursor.execute(f'DROP TRIGGER IF EXISTS books_fts_prefix_{trigger}')
+    cursor.execute('DROP TABLE IF EXISTS books_fts_prefix')
+
+
+
+MIGRATIONS = [
+    baseline_schema,
+    full_text_search,
+    link_constraints,
+    page_manifests,
+    drop_prefix_index
+]
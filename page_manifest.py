@@ -0,0 +1,39 @@
+# standard libraries
+from os import stat
+
+# local modules
+from book_source import open_source
+
+
+
+def directory_mtime(path: str) -> int:
+    """
+    Returns:
+        int: the mtime of a book's folder or archive in nanoseconds. it changes whenever a page is added, removed or renamed
+    """
+    return stat(path).st_mtime_ns
+
+
+
+def read_manifest(path: str):
+    """Lists the pages of a book in reading order
+
+    Only images count as pages, so things like Thumbs.db or a .txt left in the folder are skipped.
+    Dimensions and format come from the image headers. Nothing is decoded.
+
+    Args:
+        path (str): the book's folder or archive
+
+    Returns:
+        (int, [dict]): the book's mtime (see directory_mtime()) and the pages, each with 'file', 'bytes', 'width', 'height', and 'format'
+    """
+    mtime = directory_mtime(path)
+    source = open_source(path)
+    pages = []
+    for file in source.files():
+        reader = source.image_reader(file, header_only=True)
+        if not reader.canRead(): # not actually an image
+            continue
+        dimensions = reader.size()
+        pages.append({'file': file, 'bytes': source.stat(file)[1], 'width': dimensions.width(), 'height': dimensions.height(), 'format': bytes(reader.format()).decode()})
+    return mtime, pages
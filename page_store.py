@@ -0,0 +1,225 @@
+# standard libraries
+from collections import OrderedDict
+from zipfile import BadZipFile
+import zlib
+
+# dependencies
+from PyQt5.QtCore import QObject
+from PyQt5.QtCore import QRunnable
+from PyQt5.QtCore import QThreadPool
+from PyQt5.QtCore import Qt
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtGui import QImage
+from PyQt5.QtGui import QPixmap
+
+# local modules
+import constants as const
+
+
+
+def scale(image, zoom: float):
+    """Scales a page to a zoom level the same way the reader always has
+
+    Returns:
+        QImage
+    """
+    return image.scaled(int(image.width()*zoom), int(image.height()*zoom), Qt.KeepAspectRatio, Qt.FastTransformation)
+
+
+
+class PageTask(QRunnable):
+    """Decodes one page on a pool thread. See PageStore
+
+    Pages next to the current one are also scaled to the current zoom while they're on the pool thread.
+    """
+    def __init__(self, store, generation: int, index: int, file: str):
+        super().__init__()
+        self.store = store
+        self.generation = generation
+        self.index = index
+        self.file = file
+
+
+
+    def run(self):
+        if self.generation != self.store.generation: # the book was closed
+            return
+        if self.index not in self.store.window: # the reader moved on before this page got a thread
+            self.store.decoded.emit(self.generation, self.index, None, None, 0)
+            return
+        try:
+            image = self.store.source.image_reader(self.file).read()
+        except (OSError, KeyError, BadZipFile, zlib.error): # the book was moved or changed, or it's a broken archive
+            image = QImage() # stored like a page that couldn't be decoded, so the reader shows a blank page instead of the last one
+        zoom = self.store.zoom
+        render = scale(image, zoom) if abs(self.index - self.store.current) <= 1 and not image.isNull() else None
+        self.store.decoded.emit(self.generation, self.index, image, render, zoom)
+
+
+
+class RenderTask(QRunnable):
+    """Scales a page that's already been decoded to the current zoom on a pool thread. See PageStore
+    """
+    def __init__(self, store, generation: int, index: int, image, zoom: float):
+        super().__init__()
+        self.store = store
+        self.generation = generation
+        self.index = index
+        self.image = image
+        self.zoom = zoom
+
+
+
+    def run(self):
+        if self.generation == self.store.generation and self.zoom == self.store.zoom:
+            self.store.rendered.emit(self.generation, self.index, scale(self.image, self.zoom), self.zoom)
+
+
+
+class PageStore(QObject):
+    """Decodes the pages of a book around the one being read instead of all of them at once
+
+    Only the current page and the pages within const.page_prefetch of it are decoded, in the background and nearest first.
+    Decoded pages are kept until the store goes over const.page_cache_mb, then the least recently used pages outside the window are dropped.
+    That way opening a book takes the same time no matter how many pages it has.
+
+    The current page and the pages right before and after it are also kept scaled to the current zoom,
+    so turning a page only has to swap in a pixmap that's already been made.
+
+    Args:
+        source (FolderSource or ZipSource): the book. see book_source.py
+        files ([str]): the file name of each page, in order
+
+    Signals:
+        page_loaded (int): a page finished decoding or rendering
+
+    Attributes:
+        pages (OrderedDict): maps page index to its decoded QImage, least recently used first
+        renders ({int: (float, QPixmap)}): maps page index to the zoom it was scaled to and the scaled page
+        pending (set[int]): pages that are queued or being decoded
+        window (set[int]): the pages that should be in memory right now
+        current (int): the page being read
+        zoom (float): the zoom pages are rendered at
+        generation (int): bumped by clear(). anything decoded before that is thrown away
+        budget (int): bytes the decoded pages may take up
+    """
+    page_loaded = pyqtSignal(int)
+    decoded = pyqtSignal(int, int, object, object, float)
+    rendered = pyqtSignal(int, int, object, float)
+
+    def __init__(self, source, files: list[str]):
+        super().__init__()
+        self.source = source
+        self.files = files
+        self.pages = OrderedDict()
+        self.renders = {}
+        self.pending = set()
+        self.window = set()
+        self.current = 0
+        self.zoom = 1
+        self.generation = 0
+        self.budget = const.page_cache_mb * 1024 * 1024
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(2)
+        self.decoded.connect(self.store)
+        self.rendered.connect(self.store_render)
+
+
+
+    def page(self, index: int):
+        """
+        Returns:
+            QImage: None if the page hasn't been decoded yet. null if it couldn't be read
+        """
+        if (image := self.pages.get(index)) is not None:
+            self.pages.move_to_end(index)
+        return image
+
+
+
+    def render(self, index: int, zoom: float):
+        """
+        Returns:
+            QPixmap: the page scaled to zoom. None if it hasn't been rendered at that zoom yet
+        """
+        if (render := self.renders.get(index)) and render[0] == zoom:
+            return render[1]
+        return None
+
+
+
+    def set_current(self, index: int, zoom: float):
+        """Moves the window to a new page and starts decoding whatever in it isn't in memory yet
+
+        The current page is decoded first, then the pages after it and before it, nearest first.
+        Pages next to the current one that are already decoded are rendered at zoom ahead of time.
+        """
+        self.current = index
+        if zoom != self.zoom:
+            self.zoom = zoom
+            self.renders = {}
+        self.renders = {page: render for page, render in self.renders.items() if abs(page - index) <= 1}
+
+        ahead = range(index, min(index + const.page_prefetch + 1, len(self.files)))
+        behind = range(index - 1, max(index - const.page_prefetch, 0) - 1, -1)
+        self.window = set(ahead) | set(behind)
+        for distance, page in enumerate(sorted(self.window, key=lambda page: (abs(page - index), page < index))):
+            if abs(page - index) <= 1 and page in self.pages and page not in self.renders:
+                self.pool.start(RenderTask(self, self.generation, page, self.pages[page], zoom), len(self.window) + 1)
+            if page in self.pages or page in self.pending:
+                continue
+            self.pending.add(page)
+            self.pool.start(PageTask(self, self.generation, page, self.files[page]), len(self.window) - distance)
+        self.evict()
+
+
+
+    def store(self, generation: int, index: int, image, render, zoom: float):
+        """Runs on the GUI thread when a page has been decoded
+        """
+        if generation != self.generation:
+            return
+        self.pending.discard(index)
+        if image is None: # skipped
+            return
+        self.pages[index] = image
+        if render is not None:
+            self.store_render(generation, index, render, zoom, False)
+        self.evict()
+        self.page_loaded.emit(index)
+
+
+
+    def store_render(self, generation: int, index: int, render, zoom: float, notify=True):
+        """Runs on the GUI thread when a page has been scaled. Renders that are already out of date are thrown away
+        """
+        if generation != self.generation or zoom != self.zoom or abs(index - self.current) > 1:
+            return
+        self.renders[index] = (zoom, QPixmap.fromImage(render))
+        if notify:
+            self.page_loaded.emit(index)
+
+
+
+    def evict(self):
+        """Drops the least recently used pages outside of the window until the store is within its budget
+        """
+        used = sum(image.sizeInBytes() for image in self.pages.values())
+        for index in list(self.pages):
+            if used <= self.budget:
+                break
+            if index in self.window:
+                continue
+            used -= self.pages.pop(index).sizeInBytes()
+
+
+
+    def clear(self):
+        """Drops every page and cancels everything that's still waiting to be decoded
+        """
+        self.generation += 1
+        self.pool.clear()
+        self.pages.clear()
+        self.renders.clear()
+        self.pending.clear()
+        self.window = set()
@@ -0,0 +1,195 @@
+# standard libraries
+from functools import partial
+
+# dependencies
+from PyQt5.QtCore import QAbstractListModel
+from PyQt5.QtCore import QModelIndex
+from PyQt5.QtCore import QRect
+from PyQt5.QtCore import QSize
+from PyQt5.QtCore import Qt
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtWidgets import QAbstractItemView
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWidgets import QListView
+from PyQt5.QtWidgets import QStyle
+from PyQt5.QtWidgets import QStyledItemDelegate
+
+# local modules
+from cover_loader import placeholder
+
+
+
+PreviewRole = Qt.UserRole # the row's dict
+THUMBNAIL_WIDTH = 100
+THUMBNAIL_HEIGHT = 141 # room left for each thumbnail. pages are scaled to fit inside it
+PADDING = 10
+
+
+
+class PreviewModel(QAbstractListModel):
+    """Rows of the reader's page and series lists
+
+    Each row is a dict with:
+        'id' (int): the page number or the book's id
+        'text' (str)
+        'folder' (str): directory of the book, relative to const.directory
+        'page' (str): the page's file name. None for the book's cover
+
+    Thumbnails are only requested when the view paints a row and come from the shared thumbnail cache,
+    so the same page shown in both lists is only decoded once.
+
+    Args:
+        loader (CoverLoader): shouldn't be shared with anything else, since it's cancelled whenever the rows change
+
+    Attributes:
+        rows ([dict])
+        thumbnails ({int: QPixmap}): thumbnails that have arrived, by row
+        loading (set[int]): rows whose thumbnails have been requested but haven't arrived yet
+    """
+    def __init__(self, loader):
+        super().__init__()
+        self.loader = loader
+        self.rows = []
+        self.thumbnails = {}
+        self.loading = set()
+        self.placeholder = placeholder(THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT)
+
+
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return row['text']
+        if role == Qt.DecorationRole:
+            return self.thumbnail(index.row())
+        if role == PreviewRole:
+            return row
+        return None
+
+
+
+    def thumbnail(self, row: int):
+        """
+        Returns:
+            QPixmap: the placeholder until the thumbnail has been loaded in the background
+        """
+        if (pixmap := self.thumbnails.get(row)) is not None:
+            return pixmap
+        if row in self.loading:
+            self.loader.prioritize([self.rows[row]['id']])
+        else:
+            self.loading.add(row)
+            self.loader.request(self.rows[row]['id'], self.rows[row]['folder'], THUMBNAIL_WIDTH, None, partial(self.set_thumbnail, row), self.rows[row]['page'])
+        return self.placeholder
+
+
+
+    def set_thumbnail(self, row: int, image):
+        self.loading.discard(row)
+        if image.height() > THUMBNAIL_HEIGHT: # tall pages are shrunk to fit
+            image = image.scaled(THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        self.thumbnails[row] = QPixmap.fromImage(image)
+        self.dataChanged.emit(self.index(row), self.index(row), [Qt.DecorationRole])
+
+
+
+    def set_rows(self, rows: list[dict]):
+        """Replaces every row. Thumbnails that are still loading are cancelled
+        """
+        self.beginResetModel()
+        self.loader.cancel()
+        self.rows = rows
+        self.thumbnails = {}
+        self.loading = set()
+        self.endResetModel()
+
+
+
+class PreviewDelegate(QStyledItemDelegate):
+    """Paints a thumbnail with its text underneath
+    """
+    def sizeHint(self, option, index):
+        return QSize(THUMBNAIL_WIDTH + PADDING * 2, THUMBNAIL_HEIGHT + option.fontMetrics.lineSpacing() * 2 + PADDING * 2)
+
+
+
+    def paint(self, painter, option, index):
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawPrimitive(QStyle.PE_PanelItemViewItem, option, painter, option.widget) # selection and hover background
+
+        if not (thumbnail := index.data(Qt.DecorationRole)).isNull():
+            painter.drawPixmap(option.rect.center().x() - thumbnail.width() // 2, option.rect.top() + PADDING + (THUMBNAIL_HEIGHT - thumbnail.height()) // 2, thumbnail)
+
+        text = QRect(option.rect.left() + PADDING, option.rect.top() + PADDING + THUMBNAIL_HEIGHT, option.rect.width() - PADDING * 2, option.fontMetrics.lineSpacing() * 2)
+        painter.save()
+        painter.setPen(option.palette.color(option.palette.Text))
+        painter.drawText(text, Qt.AlignHCenter | Qt.AlignTop | Qt.TextWordWrap, index.data(Qt.DisplayRole))
+        painter.restore()
+
+
+
+class PreviewList(QListView):
+    """Drop in replacement for the QListWidgets of the reader's page and series lists
+
+    Only the rows on screen are painted, and their thumbnails are loaded as they scroll into view.
+
+    Args:
+        loader (CoverLoader)
+        replaces (QListWidget): the list from the .ui file to take the place of
+
+    Signals:
+        currentRowChanged (int): same as QListWidget's
+    """
+    currentRowChanged = pyqtSignal(int)
+
+    def __init__(self, loader, replaces):
+        super().__init__(replaces.parentWidget())
+        self.setModel(PreviewModel(loader))
+        self.setItemDelegate(PreviewDelegate())
+        self.setUniformItemSizes(True)
+        self.setSpacing(PADDING)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setPalette(replaces.palette())
+        self.setObjectName(replaces.objectName())
+        self.selectionModel().currentRowChanged.connect(lambda current, previous: self.currentRowChanged.emit(current.row()))
+
+        replaces.parentWidget().layout().replaceWidget(replaces, self)
+        replaces.deleteLater()
+
+
+
+    def set_rows(self, rows: list[dict]):
+        self.model().set_rows(rows)
+
+
+
+    def row(self, row: int):
+        """
+        Returns:
+            dict: the row's data
+        """
+        return self.model().rows[row]
+
+
+
+    def count(self):
+        return self.model().rowCount()
+
+
+
+    def currentRow(self):
+        return self.currentIndex().row()
+
+
+
+    def setCurrentRow(self, row: int):
+        self.setCurrentIndex(self.model().index(row))
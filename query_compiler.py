@@ -0,0 +1,263 @@
+# standard libraries
+from datetime import datetime
+import json
+from string import ascii_lowercase
+from string import ascii_uppercase
+
+# local modules
+import constants as const
+
+
+
+SORT_QUERIES = {
+    const.Sort.ALPHA_ASC: 'books.name COLLATE NOCASE ASC',
+    const.Sort.ALPHA_DESC: 'books.name COLLATE NOCASE DESC',
+    const.Sort.RATING_ASC: 'books.rating ASC',
+    const.Sort.RATING_DESC: 'books.rating DESC',
+    const.Sort.PAGES_ASC: 'books.pages ASC',
+    const.Sort.PAGES_DESC: 'books.pages DESC',
+    const.Sort.DATE_ASC: 'books.date_added ASC',
+    const.Sort.DATE_DESC: 'books.date_added DESC',
+    const.Sort.RANDOM: 'random()'
+}
+
+
+KEYSET_COLUMNS = { # the column each sort is ordered by, which a page's cursor holds the value of. see keyset_condition()
+    const.Sort.ALPHA_ASC: 'name',
+    const.Sort.ALPHA_DESC: 'name',
+    const.Sort.RATING_ASC: 'rating',
+    const.Sort.RATING_DESC: 'rating',
+    const.Sort.PAGES_ASC: 'pages',
+    const.Sort.PAGES_DESC: 'pages',
+    const.Sort.DATE_ASC: 'date_added',
+    const.Sort.DATE_DESC: 'date_added'
+}
+
+
+FTS_TITLE_COLUMNS = ('name', 'alt_name')
+NOCASE = str.maketrans(ascii_uppercase, ascii_lowercase) # what COLLATE NOCASE folds. letters outside of ASCII keep their case
+
+
+
+def fts_match(search_term: str, columns=FTS_TITLE_COLUMNS):
+    """Builds a full text search MATCH expression for the books_fts index
+
+    The trigram index matches any substring of 3 or more characters like LIKE '%x%' does.
+    Shorter searches can't be looked up in it, so they're left to LIKE.
+
+    Args:
+        search_term (str)
+        columns ((str)): which columns of books to search in
+
+    Returns:
+        (str, str): the fts table and the expression to MATCH it against. None if search_term is too short for the index
+    """
+    if len(search_term) < 3:
+        return None
+    return 'books_fts', '{' + ' '.join(columns) + '} : "' + search_term.replace('"', '""') + '"'
+
+
+
+def keyset_order(sort_by: int) -> str:
+    """Same as SORT_QUERIES, with the id to break ties so every book has exactly one place in the order. Needed for keyset_condition()
+    """
+    return f'{SORT_QUERIES[sort_by]}, books.id {"DESC" if SORT_QUERIES[sort_by].endswith("DESC") else "ASC"}'
+
+
+
+def keyset_key(sort_by: int):
+    """Python's version of keyset_order(), for re-sorting books that were already fetched without them ending up in a different order than sqlite's
+
+    Args:
+        sort_by (int): anything but const.Sort.RANDOM
+
+    Returns:
+        (callable, bool): the key, which takes a book's value in KEYSET_COLUMNS[sort_by] and its id, and whether to sort in reverse
+    """
+    fold = KEYSET_COLUMNS[sort_by] == 'name' # sorted with COLLATE NOCASE
+
+    def key(value, book_id: int):
+        if value is None: # NULLs come first in ascending order and last in descending order
+            return (False, 0, book_id)
+        return (True, value.translate(NOCASE) if fold else value, book_id)
+
+    return key, SORT_QUERIES[sort_by].endswith('DESC')
+
+
+
+def keyset_condition(sort_by: int, after: tuple):
+    """Builds the condition that only lets through the books that come after a cursor in keyset_order()
+
+    Written out instead of as a row value comparison so books with NULLs are put where ORDER BY puts them (first when ascending, last when descending).
+    The condition is never NULL itself, so it can be negated to get the books up to the cursor.
+
+    Args:
+        sort_by (int): anything but const.Sort.RANDOM
+        after ((any, int)): the last book's value in KEYSET_COLUMNS[sort_by] and its id
+
+    Returns:
+        (str, list): the condition and the parameters to execute it with
+    """
+    expression = SORT_QUERIES[sort_by].rsplit(' ', 1)[0]
+    descending = SORT_QUERIES[sort_by].endswith('DESC')
+    operator = '<' if descending else '>'
+    value, book_id = after
+    if value is None:
+        if descending: # only NULLs are left
+            return f'({expression} IS NULL AND books.id < ?)', [book_id]
+        return f'(({expression} IS NULL AND books.id > ?) OR {expression} IS NOT NULL)', [book_id]
+    condition = f'({expression} {operator} ? OR ({expression} = ? AND books.id {operator} ?))'
+    if descending:
+        return f'({condition} OR {expression} IS NULL)', [value, value, book_id]
+    return f'({expression} IS NOT NULL AND {condition})', [value, value, book_id]
+
+
+
+class QueryCompiler:
+    """Turns the filters dict from SearchPanel.submit() into one parameterized statement
+
+    Every filter becomes one SELECT of book ids and they are all chained together with INTERSECT / EXCEPT.
+    Compound operators in sqlite are evaluated left to right, so each step narrows down the result of the steps before it.
+    Because it's a single statement, sqlite gets to plan the whole search at once instead of us feeding the previous results back in as id lists.
+
+    Args:
+        filters (dict): filters to filter by from search panel
+
+    Attributes:
+        filters (dict)
+        params ([]): values for each ? placeholder, in order
+    """
+    def __init__(self, filters: dict):
+        self.filters = filters
+        self.params = []
+
+
+
+    def compile(self, sort_by=const.Sort.ALPHA_ASC, book_ids=None):
+        """Builds the full search query
+
+        Args:
+            sort_by (int): the way the books are to be sorted
+            book_ids ([int], optional): if the artist, genre, tag, and character filters were already evaluated elsewhere (see bitmap_index), the ids that passed them
+
+        Returns:
+            (str, list): the query and the parameters to execute it with
+        """
+        self.params = []
+        query = f'SELECT * FROM books WHERE id IN (\n{self.compile_ids(book_ids)}\n) ORDER BY {SORT_QUERIES[sort_by]}'
+        return query, self.params
+
+
+
+    def compile_ids(self, book_ids=None):
+        """Builds the compound SELECT that returns the ids of every book that satisfies the filters
+
+        Note:
+            Appends to self.params, so it should only be called through compile() unless params are reset beforehand
+
+        Args:
+            book_ids ([int], optional): replaces the artist, genre, tag, and character filters
+
+        Returns:
+            str
+        """
+        steps = [('', self.basic_subquery())]
+        if book_ids is not None:
+            steps.append(('INTERSECT', 'SELECT value FROM json_each(?)'))
+            self.params.append(json.dumps(book_ids))
+            return '\n'.join(f'{operator} {select}'.strip() for operator, select in steps)
+
+        # all many to many fields except for characters (artists, genres, and tags)
+        for field in ['artists', 'genres', 'tags']:
+            linking_table = f'books_{field}'
+            column = f'{field[:-1]}ID'
+            if field not in self.filters: # null search
+                steps.append(('EXCEPT', f'SELECT bookID FROM {linking_table}'))
+                continue
+
+            search = self.filters[field]
+            if search.has(const.Filters.AND):
+                and_list = search.data[const.Filters.AND]
+                steps.append(('INTERSECT', f'SELECT bookID FROM {linking_table} WHERE {column} IN {self.placeholders(and_list)} GROUP BY bookID HAVING COUNT(DISTINCT {column}) = {len(set(and_list))}'))
+            if search.has(const.Filters.OR):
+                steps.append(('INTERSECT', f'SELECT bookID FROM {linking_table} WHERE {column} IN {self.placeholders(search.data[const.Filters.OR])}'))
+            if search.has(const.Filters.NOT):
+                steps.append(('EXCEPT', f'SELECT bookID FROM {linking_table} WHERE {column} IN {self.placeholders(search.data[const.Filters.NOT])}'))
+
+        # characters are special because all the traits of one card have to belong to the same character
+        if 'characters' not in self.filters: # null search
+            steps.append(('EXCEPT', 'SELECT bookID FROM characters'))
+        else:
+            for character in self.filters['characters']:
+                conditions = []
+                if character.has(const.Filters.AND):
+                    and_list = character.data[const.Filters.AND]
+                    conditions.append(f'id IN (SELECT characterID FROM characters_traits WHERE traitID IN {self.placeholders(and_list)} GROUP BY characterID HAVING COUNT(DISTINCT traitID) = {len(set(and_list))})')
+                if character.has(const.Filters.OR):
+                    conditions.append(f'id IN (SELECT characterID FROM characters_traits WHERE traitID IN {self.placeholders(character.data[const.Filters.OR])})')
+                if character.has(const.Filters.NOT):
+                    conditions.append(f'id NOT IN (SELECT characterID FROM characters_traits WHERE traitID IN {self.placeholders(character.data[const.Filters.NOT])})')
+                if conditions: # a card without any traits matches every book
+                    steps.append(('INTERSECT', 'SELECT bookID FROM characters WHERE ' + '\n\tAND '.join(conditions)))
+
+        return '\n'.join(f'{operator} {select}'.strip() for operator, select in steps)
+
+
+
+    def basic_subquery(self):
+        """Builds the SELECT for the basic fields (title, rating, pages, and dates)
+
+        Returns:
+            str
+        """
+        basic = self.filters['basic']
+        query = 'SELECT id FROM books'
+        where_clauses = []
+        if title := basic['title']:
+            columns = FTS_TITLE_COLUMNS
+            if title.lower().startswith('notes:'): # "notes:" searches through the notes instead of the titles
+                title = title[6:].strip()
+                columns = ('notes',)
+            if match := fts_match(title, columns):
+                where_clauses.append(f'id IN (SELECT rowid FROM {match[0]} WHERE {match[0]} MATCH ?)')
+                self.params.append(match[1])
+            elif title:
+                where_clauses.append('(' + ' OR '.join(f"{column} LIKE '%' || ? || '%'" for column in columns) + ')')
+                self.params += [title] * len(columns)
+        if (rating := basic['rating'][0]) >= 0:
+            operator = '>=' if basic['rating'][1] else '='
+            where_clauses.append(f'rating {operator} ?')
+            self.params.append(rating)
+        if basic['rating'][0] < 0 and basic['rating'][1] == 0:
+            where_clauses.append('rating IS NULL')
+        if pages_low := basic['pages_low']:
+            where_clauses.append('pages >= ?')
+            self.params.append(pages_low)
+        if pages_high := basic['pages_high']:
+            where_clauses.append('pages <= ?')
+            self.params.append(pages_high)
+        if (date_low := basic['date_low']) > datetime(1900, 1, 1, 0, 0, 0, 0):
+            where_clauses.append('date_added >= ?')
+            self.params.append(str(date_low))
+        if (date_high := basic['date_high']) > datetime(1900, 1, 1, 0, 0, 0, 0):
+            where_clauses.append('date_added <= ?')
+            self.params.append(str(date_high))
+
+        # combine where clauses and add it to query
+        if where_clauses:
+            query += '\nWHERE ' + '\n\tAND '.join(where_clauses)
+        return query
+
+
+
+    def placeholders(self, values: list):
+        """Adds values to the parameter list and returns the matching (?, ?, ...) list for an IN clause
+
+        Args:
+            values ([int])
+
+        Returns:
+            str
+        """
+        self.params += values
+        return '(' + ','.join('?' * len(values)) + ')'
@@ -1,58 +1,26 @@
 # standard libraries
-from os import listdir
+from time import perf_counter
 
 # dependencies
+from PyQt5.QtCore import QEvent
+from PyQt5.QtCore import QTimer
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPixmap
-from PyQt5.QtWidgets import QFrame
-from PyQt5.QtWidgets import QListWidgetItem
 from PyQt5.QtWidgets import QMainWindow
 from PyQt5.QtWidgets import QMenu
+from PyQt5.QtWidgets import QMessageBox
 from PyQt5.QtWidgets import QShortcut
 
 # local modules
 from ui.reader_window import Ui_MainWindow
-from ui.page_preview import Ui_page_preview
 import constants as const
-
-
-
-class PagePreview(Ui_page_preview, QFrame):
-    '''
-    Done this way because adding images to a qlistwidget is pretty annoying and this allows padding/margins
-    for highlighting purposes
-    '''
-    def __init__(self, text: int, image: QPixmap):
-        super().__init__()
-        self.setupUi(self)
-
-        pixmap = image.scaledToWidth(100, Qt.FastTransformation)
-        self.img_label.setPixmap(pixmap)
-        self.img_label.setFixedHeight(pixmap.size().height())
-        self.text_label.setText(text)
-        self.text_label.setFixedHeight(self.text_label.heightForWidth(100) + 5)
-
-
-    def adjust(self):
-        '''
-        When wrapping text, the label resizes properly, but doesn't tell the frame that it also needs to resize. This fixes the height issues that occur resulting from that
-        '''
-        height = self.img_label.height() + self.text_label.height() + self.verticalLayout.getContentsMargins()[0] + self.verticalLayout.getContentsMargins()[2] + self.verticalLayout.spacing()
-        self.setFixedHeight(height)
-
-
-
-class SeriesPreview(PagePreview):
-    '''
-    Page Preview for Series
-    Done this way because the list items needs to have additional properties
-    '''
-    def __init__(self, book_id: int, book_title: str, order: int, book_directory: str):
-        super().__init__(f'{order} - {book_title}', QPixmap(f'{const.directory}/{book_directory}/{listdir(const.directory + "/" + book_directory)[0]}'))
-        self.order = order
-        self.book_id = book_id
-        self.book_title = book_title
-        self.book_directory = book_directory
+from book_source import FolderSource
+from book_source import open_source
+from cover_loader import CoverLoader
+from latency import page_turns
+from page_store import PageStore
+from page_store import scale
+from preview_list import PreviewList
 
 
 
@@ -65,16 +33,24 @@ class Reader(QMainWindow, Ui_MainWindow):
     Attributes:
         signals (signals.Signals)
         image (QLabel): label used to load pixmaps onto
-        page_list (QListWidget): shows all pages, allowing the user to select one to jump to
-        series_list (QListWidget): shows all books in the series, allowing the user to jump to a sequel or prequel
+        page_list (PreviewList): shows all pages, allowing the user to select one to jump to
+        series_list (PreviewList): shows all books in the series, allowing the user to jump to a sequel or prequel
         pages ([str]): holds filenames for each page in the book
+        page_store (PageStore): decodes the pages around the current one
         current_page (int): the page of the book currently being viewed. 0 for the first page
         zoom (float): zoom multiplier. ex: 1 means 100%, 1.1 means 110%, 0.9 means 90%
+        target (int): the page the latest turn is headed to
+        shown (int): the page that's on screen. -1 for none
+        turn_scheduled (bool): whether the latest turn is still waiting to be drawn (see turn_to())
+        turn_started (float): perf_counter() of the latest turn if it hasn't been painted yet. None if there isn't one
+        opening (bool): whether open_book() is moving the page list to the book's bookmark, which isn't a page turn
     """
     def __init__(self, signals, db):
         super().__init__()
         self.setupUi(self)
         self.setAttribute(Qt.WA_DeleteOnClose)
+        self.page_list = PreviewList(CoverLoader(threads=2), self.page_list)
+        self.series_list = PreviewList(CoverLoader(threads=2), self.series_list)
 
         # init attributes
         self.signals = signals
@@ -82,9 +58,16 @@ class Reader(QMainWindow, Ui_MainWindow):
         self.book_id = -1
         self.book_title = '' # unused, but useful to keep it here if needed in the future
         self.directory = ''
+        self.folder = ''
         self.pages = []
+        self.page_store = PageStore(FolderSource(''), [])
         self.series = []
         self.zoom = 1
+        self.target = -1
+        self.shown = -1
+        self.turn_scheduled = False
+        self.turn_started = None
+        self.opening = False
 
         self.connect_events()
 
@@ -98,18 +81,17 @@ class Reader(QMainWindow, Ui_MainWindow):
         QShortcut(Qt.Key_Minus, self, self.zoom_out)
         QShortcut(Qt.Key_Escape, self, self.close)
 
-        self.page_list.currentRowChanged.connect(self.draw)
-        self.series_list.itemDoubleClicked.connect(self.open_book_in_series)
-        self.page_list.itemDoubleClicked.connect(self.open_book_in_series)
+        self.page_list.currentRowChanged.connect(self.turn_to)
+        self.series_list.doubleClicked.connect(self.open_book_in_series)
+        self.image.installEventFilter(self) # see eventFilter()
 
         # right click context menu
         self.contextMenuEvent = self.context_menu
 
 
 
-    def open_book_in_series(self, item):
-        book = self.series_list.itemWidget(item)
-        self.open_book(book.book_id)
+    def open_book_in_series(self, index):
+        self.open_book(self.series_list.row(index.row())['id'])
 
 
 
@@ -120,50 +102,37 @@ class Reader(QMainWindow, Ui_MainWindow):
             book_directory (str): the relative directory to find the book
         """
         book = self.db.get_book(book_id)
+        self.opening = True
         self.setWindowTitle(book['name'])
         self.book_id = book['id']
         self.book_title = book['name']
         self.directory = f'{const.directory}/{book["directory"]}'
+        self.folder = book['directory']
         self.zoom = book['zoom']
         self.pages = self.get_imgs()
+        self.shown = -1
+        self.page_store.clear()
+        self.page_store = PageStore(open_source(self.directory), self.pages)
+        self.page_store.page_loaded.connect(self.page_loaded)
         self.populate_page_list()
         self.populate_series_list()
         self.pages_series_tab_widget.setCurrentIndex(0)
         self.page_list.setCurrentRow(book['bookmark'])
+        self.opening = False
 
 
 
     def populate_page_list(self):
-        self.page_list.clear()
-        for index, page in enumerate(self.pages):
-            item = QListWidgetItem()
-            self.page_list.addItem(item)
-
-            card = PagePreview(f'Page {index+1}', page)
-            self.page_list.setItemWidget(item, card)
-            card.adjust()
-            item.setSizeHint(card.size())
-
-        self.page_list.setSpacing(10)
+        self.page_list.set_rows([{'id': index, 'text': f'Page {index+1}', 'folder': self.folder, 'page': page} for index, page in enumerate(self.pages)])
         self.page_list.setCurrentRow(0)
 
 
 
     def populate_series_list(self):
-        self.series_list.clear()
-        for book in self.db.get_series_for(self.book_id):
-            item = QListWidgetItem()
-            self.series_list.addItem(item)
-
-            card = SeriesPreview(*book.values())
-            self.series_list.setItemWidget(item, card)
-            card.adjust()
-            item.setSizeHint(card.size())
-
-            if book['id'] == self.book_id:
-                self.series_list.setCurrentItem(item)
-
-        self.series_list.setSpacing(10)
+        series = self.db.get_series_for(self.book_id)
+        self.series_list.set_rows([{'id': book['id'], 'text': f'{book["series_order"]} - {book["name"]}', 'folder': book['directory'], 'page': None} for book in series])
+        if (current := next((row for row, book in enumerate(series) if book['id'] == self.book_id), None)) is not None:
+            self.series_list.setCurrentRow(current)
 
 
 
@@ -215,34 +184,97 @@ class Reader(QMainWindow, Ui_MainWindow):
 
 
 
-    def get_imgs(self) -> list[QPixmap]:
-        """Gets a list of all image files in a folder
+    def get_imgs(self) -> list[str]:
+        """Gets the pages of the book in reading order from its manifest (see DBHandler.get_pages())
 
         Returns:
-            [str]: a relative directory for each file
+            [str]: the file name of each page
         """
-        return [QPixmap(f'{self.directory}/{x}') for x in listdir(f'{self.directory}/')]
+        return self.db.get_pages(self.book_id)
+
+
+
+    def turn_to(self, page: int):
+        """Turns to a page once the events that are already waiting have been handled
+
+        While an arrow key is held, the pages it goes through before the next draw are skipped instead of each being drawn.
+        Only the latest turn is timed. Opening a book isn't timed at all
+        """
+        if page < 0:
+            return
+        if self.opening:
+            self.turn_started = None
+        else:
+            if self.turn_scheduled and self.turn_started is not None: # overtaking the draw of open_book() isn't a skip
+                page_turns.skipped += 1
+            self.turn_started = perf_counter()
+        if not self.turn_scheduled:
+            self.turn_scheduled = True
+            QTimer.singleShot(0, self.finish_turn)
+        self.target = page
+
+
+
+    def finish_turn(self):
+        self.turn_scheduled = False
+        self.draw(self.target)
 
 
 
     def draw(self, page: int):
         """Displays a page in the book
 
-        Also resizes the image and moves the scrollbar back to the top
+        Also resizes the image and moves the scrollbar back to the top.
+        If the page hasn't been decoded yet, it's drawn by page_loaded() once it has.
         """
-        pixmap = self.pages[page]
-        pixmap = pixmap.scaled(int(pixmap.width()*self.zoom), int(pixmap.height()*self.zoom), Qt.KeepAspectRatio, Qt.FastTransformation)
-        self.image.setPixmap(pixmap)
+        if page < 0:
+            return
+        self.page_store.set_current(page, self.zoom)
+        self.render_page(page)
         self.scrollArea.verticalScrollBar().setSliderPosition(0)
         self.db.set_bookmark(self.book_id, page)
 
 
 
+    def render_page(self, page: int):
+        """Puts a page on screen at the current zoom if it has been decoded
+
+        Pages the page store has already scaled to the current zoom are used as they are. Others are scaled here.
+        """
+        if (pixmap := self.page_store.render(page, self.zoom)) is None:
+            if (image := self.page_store.page(page)) is None:
+                return
+            pixmap = QPixmap() if image.isNull() else QPixmap.fromImage(scale(image, self.zoom)) # pages that couldn't be read are shown blank
+        self.image.setPixmap(pixmap)
+        self.shown = page
+
+
+
+    def page_loaded(self, page: int):
+        """Draws the current page once the page store has decoded it
+        """
+        if page == self.page_list.currentRow() and page != self.shown:
+            self.render_page(page)
+
+
+
+    def eventFilter(self, source, event):
+        """Records how long the latest page turn took to reach the screen. See latency.page_turns
+        """
+        if source is self.image and event.type() == QEvent.Paint and self.turn_started is not None and self.shown == self.page_list.currentRow():
+            page_turns.record((perf_counter() - self.turn_started) * 1000)
+            self.turn_started = None
+        return super().eventFilter(source, event)
+
+
+
     def context_menu(self, event):
         """Opens a context menu for the reader
 
         "Close": same as pressing esc - closes this window
         "Reset Zoom": resets zoom level to 1.0 / 100%
+        "Go Back To Page 1": jumps to the first page
+        "Page Turn Latency": shows how long page turns have been taking, from keypress to paint
 
         Args:
             event (QMouseEvent): The event that was emitted. Unused, but required by PyQt5
@@ -251,6 +283,7 @@ class Reader(QMainWindow, Ui_MainWindow):
         close = menu.addAction('Close')
         reset_zoom = menu.addAction('Reset Zoom')
         page_one = menu.addAction('Go Back To Page 1')
+        latency = menu.addAction('Page Turn Latency')
         if (selection := menu.exec_(event.globalPos())):
             if selection == close:
                 self.close()
@@ -259,12 +292,19 @@ class Reader(QMainWindow, Ui_MainWindow):
                 self.draw(self.page_list.currentRow())
             elif selection == page_one:
                 self.page_list.setCurrentRow(0)
+            elif selection == latency:
+                popup = QMessageBox()
+                popup.setWindowTitle('Page Turn Latency')
+                popup.setText(page_turns.summary())
+                popup.setStandardButtons(QMessageBox.Close)
+                popup.exec_()
 
 
 
     def closeEvent(self, event):
         '''
-        Fixes a memory leak
+        Fixes a memory leak and makes sure the bookmark and zoom are saved
         '''
-        del self.pages
+        self.page_store.clear()
+        self.db.flush_writes()
         event.setAccepted(True)
\ No newline at end of file
@@ -0,0 +1,139 @@
+# standard libraries
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from multiprocessing import get_context
+from os import scandir
+from time import perf_counter
+from zipfile import BadZipFile
+
+# dependencies
+from PyQt5.QtCore import QThread
+from PyQt5.QtCore import pyqtSignal
+
+# local modules
+from book_source import book_name
+from book_source import is_book
+from page_manifest import read_manifest
+from thumbnails import thumbnail_cache
+
+
+
+BATCH_SIZE = 100 # books handed to the db at a time
+SERIAL_LIMIT = 8 # folders that are quicker to read on the scanner's own thread than to start worker processes for
+
+
+
+def start_worker():
+    """Runs once in each worker process before it reads any books. Its thumbnails are counted and evicted by the scanner once the scan is done
+    """
+    thumbnail_cache.evicts = False
+
+
+
+def scan_book(directory: str, folder: str, cover_sizes: list[tuple]):
+    """Does everything a scan needs from one book in a single pass: reads its manifest and makes its cover thumbnails
+
+    Runs in a worker process (or on the scanner's thread for small scans), so it can't touch the db.
+
+    Args:
+        directory (str): the manga directory
+        folder (str): the book's directory
+        cover_sizes ([(int, int)]): (width, height) of every thumbnail of the cover to make. see ThumbnailCache.cover()
+
+    Returns:
+        (str, int, [dict]): the folder and what page_manifest.read_manifest() returned for it. (folder, None, None) if it couldn't be read
+    """
+    try:
+        mtime, pages = read_manifest(f'{directory}/{folder}')
+        if pages:
+            for width, height in cover_sizes:
+                thumbnail_cache.page(folder, pages[0]['file'], width, height)
+    except (OSError, BadZipFile): # moved or deleted since the scan started, or a broken archive
+        return folder, None, None
+    return folder, mtime, pages
+
+
+
+class LibraryScanner(QThread):
+    """Looks through the manga directory for folders and archives that aren't in the db yet and books whose pages have changed
+
+    Runs on its own thread so the window stays responsive while the disk is being read.
+    A book's pages are only re-read when the mtime of its directory doesn't match the one its manifest was made at.
+    Each book that needs reading is handed to a pool of worker processes (see scan_book()), so big libraries are read in parallel.
+    The results are handed back in batches with the found signal so the main db handler can store each batch in one transaction,
+    and a cancelled scan keeps whatever was stored before it was cancelled.
+
+    Args:
+        directory (str): the manga directory
+        known (dict): from DBHandler.get_manifest_mtimes()
+        cover_sizes ([(int, int)], optional): cover thumbnails to make for each book that's read. see scan_book()
+
+    Signals:
+        progress (int, int): (folders done, total folders to read)
+        found ([dict], dict): a batch of new books, ready for DBHandler.add_books(), and new manifests of books that changed, ready for DBHandler.set_manifests()
+        report (dict): emitted once the scan is over, even if it was cancelled. has 'books', 'bytes', 'seconds', and 'cancelled'
+    """
+    progress = pyqtSignal(int, int)
+    found = pyqtSignal(object, object)
+    report = pyqtSignal(object)
+
+    def __init__(self, directory: str, known: dict, cover_sizes=None):
+        super().__init__()
+        self.directory = directory
+        self.known = known
+        self.cover_sizes = cover_sizes or []
+
+
+
+    def run(self):
+        start = perf_counter()
+        with scandir(self.directory) as entries:
+            folders = {entry.name: entry.stat().st_mtime_ns for entry in entries if is_book(entry)}
+        new_folders = sorted(folder for folder in folders if folder not in self.known)
+        changed_folders = sorted(folder for folder, mtime in folders.items() if folder in self.known and self.known[folder][1] != mtime)
+        to_read = new_folders + changed_folders
+
+        stats = {'books': 0, 'bytes': 0, 'seconds': 0, 'cancelled': False}
+        if len(to_read) <= SERIAL_LIMIT:
+            self.read((scan_book(self.directory, folder, self.cover_sizes) for folder in to_read), len(to_read), stats)
+        else:
+            with ProcessPoolExecutor(mp_context=get_context('spawn'), initializer=start_worker) as pool: # forking a process with Qt's threads running isn't safe
+                futures = [pool.submit(scan_book, self.directory, folder, self.cover_sizes) for folder in to_read]
+                self.read((future.result() for future in as_completed(futures)), len(to_read), stats)
+                pool.shutdown(cancel_futures=True) # only does anything if the scan was cancelled
+            thumbnail_cache.recount()
+        stats['seconds'] = perf_counter() - start
+        self.report.emit(stats)
+
+
+
+    def read(self, results, total: int, stats: dict):
+        """Collects the books as they're read and hands them over a batch at a time
+
+        Args:
+            results: iterable of what scan_book() returned
+            total (int): how many books are being read
+            stats (dict): the report. filled in as books are read
+        """
+        books = []
+        changed = {}
+        self.progress.emit(0, total)
+        for done, (folder, mtime, pages) in enumerate(results, start=1):
+            if self.isInterruptionRequested():
+                stats['cancelled'] = True
+                break
+            if pages is None: # couldn't be read
+                pass
+            elif folder in self.known:
+                changed[self.known[folder][0]] = (mtime, pages)
+            else:
+                books.append({'name': book_name(folder), 'directory': folder, 'pages': len(pages), 'mtime': mtime, 'manifest': pages})
+            stats['books'] += pages is not None
+            stats['bytes'] += sum(page['bytes'] for page in pages or [])
+            if len(books) + len(changed) >= BATCH_SIZE:
+                self.found.emit(books, changed)
+                books, changed = [], {}
+            if done % 10 == 0 or done == total:
+                self.progress.emit(done, total)
+        if books or changed:
+            self.found.emit(books, changed)
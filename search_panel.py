@@ -63,7 +63,14 @@ class SearchPanel(QFrame, Ui_search_panel):
         self.signals = signals
         self.filter_type = const.Filters.AND
         self.selected_character = None
+        self.metadata_generation = -1
         self.setupUi(self)
+        self.lists = {
+            'artists': self.artists_list,
+            'genres': self.genres_list,
+            'tags': self.tags_list,
+            'traits': self.traits_list
+        }
         self.character_scroll_layout.setDirection(QBoxLayout.BottomToTop)
         self.character_scroll_layout.addStretch()
         self.connect_events()
@@ -106,7 +113,7 @@ class SearchPanel(QFrame, Ui_search_panel):
         self.date_high.contextMenuEvent = partial(self.context_menu, self.date_high)
 
         # signals
-        self.signals.update_metadata.connect(self.populate_metadata)
+        self.signals.update_metadata.connect(self.update_metadata)
         self.signals.clear_filter.connect(self.populate_metadata)
         self.signals.clear_filter.connect(self.submit)
         self.signals.search_character_select.connect(self.select_character)
@@ -114,17 +121,53 @@ class SearchPanel(QFrame, Ui_search_panel):
 
 
     def populate_metadata(self):
+        """Clears the whole form and re-populates every metadata list
+        """
         self.clear_fields()
-        metadata = self.db.get_metadata()
-
-        for item in metadata['artists']:
-            self.artists_list.addItem(item)
-        for item in metadata['genres']:
-            self.genres_list.addItem(item)
-        for item in metadata['tags']:
-            self.tags_list.addItem(item)
-        for item in metadata['traits']:
-            self.traits_list.addItem(item)
+        self.metadata_generation = self.db.metadata.generation
+        metadata = self.db.get_metadata(self.lists.keys())
+
+        for table, list_widget in self.lists.items():
+            for item in metadata[table]:
+                list_widget.addItem(item)
+
+
+
+    def update_metadata(self):
+        """Re-populates only the lists whose tables changed since they were last populated
+
+        Filters that were applied to entries that still exist are kept.
+        """
+        tables = [table for table in self.db.metadata.changed_since(self.metadata_generation) if table in self.lists]
+        self.metadata_generation = self.db.metadata.generation
+        if not tables:
+            return
+        metadata = self.db.get_metadata(tables)
+
+        for table in tables:
+            list_widget = self.lists[table]
+            applied = {}
+            for i in range(list_widget.count()):
+                item = list_widget.item(i)
+                if item.filter_type != const.Filters.NONE:
+                    applied[item.id_] = item.filter_type
+            list_widget.clear()
+            for item in metadata[table]:
+                list_widget.addItem(item)
+                if item.id_ in applied:
+                    self.add_filter(list_widget, item, applied[item.id_])
+
+        if 'traits' in tables: # characters hold copies of the traits, so those need to be renamed / removed too
+            names = {item.id_: item.text() for item in metadata['traits']}
+            for index in range(self.character_scroll_layout.count()):
+                if (character := self.character_scroll_layout.itemAt(index).widget()) == None:
+                    continue
+                for i in reversed(range(character.count())):
+                    trait = character.item(i)
+                    if trait.id_ in names:
+                        trait.setText(names[trait.id_])
+                    else:
+                        character.takeItem(i)
 
 
 
@@ -14,6 +14,9 @@ class Signals(QObject):
         open_book_signal (pyqtSignal): emitted when a book spine is double clicked to open the reader
         close_book_signal (pyqtSignal): emitted when a book is closed in the reader to open up the library
         update_metadata (pyqtSignal): emitted when changes are made to the metadata to update all metadata lists
+        books_added (pyqtSignal): ids of books that were added to the db by the library watcher
+        books_removed (pyqtSignal): ids of books that were deleted from the db by the library watcher
+        books_changed (pyqtSignal): ids of books whose folders were renamed or whose pages changed
     """
     search_advanced = pyqtSignal(object)
     update_metadata = pyqtSignal()
@@ -27,4 +30,7 @@ class Signals(QObject):
     show_bookshelf_panel = pyqtSignal()
     clear_filter = pyqtSignal()
     details_character_select = pyqtSignal(object)
-    search_character_select = pyqtSignal(object)
\ No newline at end of file
+    search_character_select = pyqtSignal(object)
+    books_added = pyqtSignal(list)
+    books_removed = pyqtSignal(list)
+    books_changed = pyqtSignal(list)
\ No newline at end of file
@@ -1,5 +1,4 @@
 # standard libraries
-from os import listdir
 from os import startfile
 from os.path import relpath
 from datetime import datetime
@@ -13,6 +12,8 @@ from PyQt5.QtWidgets import QMenu
 
 # local modules
 import constants as const
+from cover_loader import placeholder
+from thumbnails import thumbnail_cache
 
 
 
@@ -25,19 +26,26 @@ class BookSpine(QtWidgets.QFrame):
         book_id (int)
         title (str): the title of the book
         folder (str): the base directory of all the books. NOT the directory of this specific book.
+        cover_loader (CoverLoader, optional): loads the cover in the background. if not given, the cover is loaded right away
 
     Attributes:
         title (str)
         layout (QVBoxLayout)
+        db_data (tuple): the book's row from the db, as of the last set_db_data()
+        cell ((int, int)): where the spine is in the bookshelf's grid. None if it isn't in the grid
+        cover_width (int): the width the cover was last loaded at, even if it couldn't be read. None if it hasn't arrived yet
     """
-    def __init__(self, signals, book_id: int, date_added: datetime, title: str, alt_title: str, series: int, series_order: float, pages: int, rating: int, notes: str, folder: str, zoom: float, bookmark: int):
+    def __init__(self, signals, book_id: int, date_added: datetime, title: str, alt_title: str, series: int, series_order: float, pages: int, rating: int, notes: str, folder: str, zoom: float, bookmark: int, cover_loader=None):
         super().__init__()
         self.layout = QtWidgets.QVBoxLayout()
 
         self.signals = signals
+        self.cover_loader = cover_loader
         self.row = None
+        self.cell = None
         self.image = None
         self.loaded_image = None
+        self.cover_width = None
         self.scale = QtWidgets.QDesktopWidget().screenGeometry(0).width() / 1920
         self.hide_ = False # hide (without _) is used by the QFrame that this is a part of. used for basic search to "remove" entries while keeping them in memory
 
@@ -49,8 +57,10 @@ class BookSpine(QtWidgets.QFrame):
         self.setup_title()
         self.set_db_data(book_id, date_added, title, alt_title, series, series_order, pages, rating, notes, folder, zoom, bookmark)
         self.resize(QtWidgets.QApplication.primaryScreen().size().width())
+        self.refresh_cover()
 
     def set_db_data(self, book_id: int, date_added: datetime, title: str, alt_title: str, series: int, series_order: float, pages: int, rating: int, notes: str, folder: str, zoom: float, bookmark: int):
+        self.db_data = (book_id, date_added, title, alt_title, series, series_order, pages, rating, notes, folder, zoom, bookmark) # so the bookshelf can tell if the book changed since
         self.id_ = book_id
         self.title = title
         self.alt_title = alt_title
@@ -64,11 +74,31 @@ class BookSpine(QtWidgets.QFrame):
 
         # update the title and image if they were changed
         self.title_label.setText(self.title)
-        self.loaded_image = QPixmap(f'{const.directory}/{self.folder}/{listdir(f"{const.directory}/{self.folder}/")[0]}')
-        img = self.loaded_image.scaledToWidth(int(const.Spines.IMG_WIDTH * self.scale), QtCore.Qt.SmoothTransformation)
-        crop = QtCore.QRect(int((img.width() - const.Spines.IMG_WIDTH * self.scale) / 2), int((img.height() - const.Spines.IMG_HEIGHT * self.scale) / 2), int(const.Spines.IMG_WIDTH * self.scale), int(const.Spines.IMG_HEIGHT * self.scale))
-        img = img.copy(crop)
-        self.image.setPixmap(img)
+        self.load_image()
+
+    def load_image(self):
+        """Loads the cover at the current scale. With a cover loader, whatever was shown before (or a placeholder) stays up until it arrives
+        """
+        width = int(const.Spines.IMG_WIDTH * self.scale)
+        height = int(const.Spines.IMG_HEIGHT * self.scale)
+        if not self.cover_loader:
+            self.set_cover(thumbnail_cache.cover(self.folder, width, height))
+            return
+        if self.loaded_image is None:
+            self.loaded_image = placeholder(width, height)
+            self.image.setPixmap(self.loaded_image)
+        self.cover_loader.request(self.id_, self.folder, width, height, self.set_cover)
+
+    def set_cover(self, cover):
+        width = int(const.Spines.IMG_WIDTH * self.scale)
+        if not cover.isNull() and cover.width() != width: # the spine was resized while it was loading
+            return
+        self.cover_width = width
+        if cover.isNull(): # couldn't be read. the placeholder stays up so it isn't asked for again until the spine is resized
+            self.loaded_image = placeholder(width, int(const.Spines.IMG_HEIGHT * self.scale))
+        else:
+            self.loaded_image = QPixmap.fromImage(cover)
+        self.image.setPixmap(self.loaded_image)
 
     def setup_frame(self):
         self.setFixedWidth(int(const.Spines.WIDTH * self.scale))
@@ -112,14 +142,20 @@ class BookSpine(QtWidgets.QFrame):
         self.scale = window_width / 1920
         self.setup_frame()
 
-        self.image.setFixedWidth(int(const.Spines.IMG_WIDTH * self.scale))
-        self.image.setFixedHeight(int(const.Spines.IMG_HEIGHT * self.scale))
-        img = self.loaded_image.scaledToWidth(int(const.Spines.IMG_WIDTH * self.scale), QtCore.Qt.SmoothTransformation)
-        crop = QtCore.QRect(int((img.width() - const.Spines.IMG_WIDTH * self.scale) / 2), int((img.height() - const.Spines.IMG_HEIGHT * self.scale) / 2), int(const.Spines.IMG_WIDTH * self.scale), int(const.Spines.IMG_HEIGHT * self.scale))
-        img = img.copy(crop)
-        self.image.setPixmap(img)
+        width = int(const.Spines.IMG_WIDTH * self.scale)
+        height = int(const.Spines.IMG_HEIGHT * self.scale)
+        self.image.setFixedWidth(width)
+        self.image.setFixedHeight(height)
+        if self.loaded_image.width() != width: # stretched until refresh_cover() is called, which is cheap enough to do on every resize event
+            self.image.setPixmap(self.loaded_image.scaled(width, height, QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.FastTransformation))
 
-        self.title_label.setFixedWidth(int(const.Spines.IMG_WIDTH * self.scale))
+        self.title_label.setFixedWidth(width)
+
+    def refresh_cover(self):
+        """Loads the cover again if the spine was resized since it was loaded. See resize()
+        """
+        if self.cover_width != int(const.Spines.IMG_WIDTH * self.scale):
+            self.load_image()
 
     def context_menu(self, event):
         """Opens a context menu for the books.
@@ -148,6 +184,13 @@ class BookSpine(QtWidgets.QFrame):
             elif selection == delete_disk:
                 self.signals.delete_book_disk.emit(self)
 
+    def size_in_bytes(self):
+        """
+        Returns:
+            int: roughly how much memory the cover takes up
+        """
+        return self.loaded_image.width() * self.loaded_image.height() * self.loaded_image.depth() // 8
+
     def clear_mem(self):
         '''fixes memory leak
         '''
@@ -165,6 +208,7 @@ class BlankSpine(QtWidgets.QFrame):
     """
     def __init__(self):
         super().__init__()
+        self.cell = None
         self.setFixedWidth(const.Spines.WIDTH)
         self.setFixedHeight(const.Spines.HEIGHT)
         self.resize(QtWidgets.QApplication.primaryScreen().size().width())
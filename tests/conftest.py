@@ -0,0 +1,165 @@
+# standard libraries
+from contextlib import chdir
+from datetime import datetime
+from datetime import timedelta
+import os
+from pathlib import Path
+import random
+import shutil
+import sys
+
+# dependencies
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+# dependencies
+from PyQt5.QtWidgets import QApplication
+
+# local modules
+with chdir(ROOT): # constants reads config.json from the working directory when it's imported
+    import constants as const
+import database
+from search_panel import SearchFilters
+
+
+
+NO_DATE = datetime(1900, 1, 1) # what the search panel sends when a date isn't filtered by
+WORDS = ['alpha', 'Beta', 'gamma', 'Delta', 'echo', 'Foxtrot', 'golf', 'Hotel', 'india', 'Juliet', 'kilo', 'Lima']
+SORTS = [value for name, value in vars(const.Sort).items() if not name.startswith('_')]
+
+
+
+@pytest.fixture(scope='session', autouse=True)
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A working directory with a fresh mangalibrary.db. get_books_multipass() reads its sql out of queries/
+    """
+    shutil.copytree(ROOT / 'queries', tmp_path / 'queries')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+
+@pytest.fixture
+def db(workdir):
+    handler = database.DBHandler()
+    yield handler
+    handler.conn.close()
+
+
+
+@pytest.fixture
+def library(db):
+    """A db filled by fill_library()
+    """
+    fill_library(db, random.Random(0))
+    return db
+
+
+
+def fill_library(db, rng: random.Random, books=200):
+    """Fills a db with random books and metadata, with plenty of ties, NULLs, and books that aren't linked to anything
+
+    Args:
+        db (database.DBHandler)
+        rng (random.Random)
+        books (int)
+    """
+    conn = db.conn
+    for table, count in [('artists', 12), ('genres', 6), ('tags', 20), ('traits', 10), ('series', 5)]:
+        conn.executemany(f'INSERT INTO {table}(name) VALUES(?)', [(f'{table} {i}',) for i in range(count)])
+    start = datetime(2020, 1, 1)
+    rows = []
+    for _ in range(books):
+        name = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+        rows.append((
+            name,
+            rng.choice([None, rng.choice(WORDS)]),
+            str(start + timedelta(days=rng.randint(0, 30))), # lots of books added on the same day
+            rng.choice([None, 1, 2, 3, 4, 5]),
+            rng.choice([None, 20, 40, 60, 80]),
+            f'{name} {rng.random()}'
+        ))
+    conn.executemany('INSERT INTO books(name, alt_name, date_added, rating, pages, directory) VALUES(?, ?, ?, ?, ?, ?)', rows)
+    book_ids = [row[0] for row in conn.execute('SELECT id FROM books')]
+    for linking_table, column, table, per_book in [('books_artists', 'artistID', 'artists', 2), ('books_genres', 'genreID', 'genres', 2), ('books_tags', 'tagID', 'tags', 4)]:
+        ids = [row[0] for row in conn.execute(f'SELECT id FROM {table}')]
+        for book_id in book_ids:
+            for metadata_id in rng.sample(ids, rng.randint(0, per_book)):
+                conn.execute(f'INSERT INTO {linking_table}(bookID, {column}) VALUES(?, ?)', (book_id, metadata_id))
+    trait_ids = [row[0] for row in conn.execute('SELECT id FROM traits')]
+    for book_id in book_ids:
+        for _ in range(rng.randint(0, 2)):
+            character_id = conn.execute('INSERT INTO characters(bookID) VALUES(?)', (book_id,)).lastrowid
+            for trait_id in rng.sample(trait_ids, rng.randint(1, 3)):
+                conn.execute('INSERT INTO characters_traits(characterID, traitID) VALUES(?, ?)', (character_id, trait_id))
+    conn.commit()
+    if db.index:
+        db.index.build()
+
+
+
+def random_search(rng: random.Random, ids: list[int]):
+    """
+    Args:
+        ids ([int]): the ids to pick from
+
+    Returns:
+        SearchFilters: AND, NOT, and OR lists of up to 2 ids each. most of them are empty so that searches still find something
+    """
+    return SearchFilters(*(rng.sample(ids, rng.randint(1, 2)) if rng.random() < 0.3 else [] for _ in range(3)))
+
+
+
+def random_filters(rng: random.Random, db):
+    """Builds filters the same way SearchPanel.submit() does
+
+    Returns:
+        dict
+    """
+    names = [row[0] for row in db.conn.execute('SELECT name FROM books')]
+    name = rng.choice(names)
+    start = rng.randint(0, max(len(name) - 1, 0))
+    filters = {
+        'basic': {
+            'title': rng.choice(['', '', name[start:start + rng.randint(1, 6)]]),
+            'rating': rng.choice([(-1, 2), (-1, 2), (-1, 2), (-1, 0), (3, 0), (3, 2)]), # (-1, 2) is any rating, (-1, 0) is no rating
+            'pages_low': rng.choice([0, 0, 30]),
+            'pages_high': rng.choice([0, 0, 70]),
+            'date_low': rng.choice([NO_DATE, NO_DATE, datetime(2020, 1, 10)]),
+            'date_high': rng.choice([NO_DATE, NO_DATE, datetime(2020, 1, 20)])
+        }
+    }
+    for field in ['artists', 'genres', 'tags']:
+        if rng.random() < 0.9: # a field that's left out is a null search
+            filters[field] = random_search(rng, [row[0] for row in db.conn.execute(f'SELECT id FROM {field}')])
+    if rng.random() < 0.9:
+        trait_ids = [row[0] for row in db.conn.execute('SELECT id FROM traits')]
+        filters['characters'] = [random_search(rng, trait_ids) for _ in range(rng.randint(0, 2))]
+    return filters
+
+
+
+def sort_keys(books: list[dict], sort_by: int):
+    """What a list of books is ordered by, so orders that only differ in how ties were broken compare equal
+
+    Returns:
+        list
+    """
+    if sort_by == const.Sort.RANDOM:
+        return sorted(book['id'] for book in books)
+    column = {
+        const.Sort.ALPHA_ASC: 'name', const.Sort.ALPHA_DESC: 'name',
+        const.Sort.RATING_ASC: 'rating', const.Sort.RATING_DESC: 'rating',
+        const.Sort.PAGES_ASC: 'pages', const.Sort.PAGES_DESC: 'pages',
+        const.Sort.DATE_ASC: 'date_added', const.Sort.DATE_DESC: 'date_added'
+    }[sort_by]
+    return [book[column].lower() if column == 'name' else book[column] for book in books]
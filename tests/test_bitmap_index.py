@@ -0,0 +1,111 @@
+# standard libraries
+import random
+import threading
+
+# dependencies
+import pytest
+
+# local modules
+from bitmap_index import BitmapIndex
+from bitmap_index import bits_to_ids
+from bitmap_index import ids_to_bits
+from conftest import SORTS
+from conftest import random_filters
+from conftest import sort_keys
+from search_panel import SearchFilters
+
+
+
+def state(index: BitmapIndex):
+    """Everything the index knows, with the empty bitsets that removals leave behind dropped
+    """
+    return (
+        index.all_books,
+        {field: {id_: bits for id_, bits in bitsets.items() if bits} for field, bitsets in index.links.items()},
+        index.linked,
+        {id_: bits for id_, bits in index.traits.items() if bits},
+        index.character_books,
+        index.all_characters,
+        index.books_with_characters
+    )
+
+
+
+def rebuilt(db):
+    index = BitmapIndex(db.conn)
+    index.build()
+    return index
+
+
+
+@pytest.mark.parametrize('ids', [[], [0], [5, 3, 700], list(range(0, 5000, 3)), random.Random(1).sample(range(100000), 2000)])
+def test_bits_round_trip(ids):
+    assert bits_to_ids(ids_to_bits(ids)) == sorted(ids)
+
+
+
+@pytest.mark.parametrize('sort_by', SORTS)
+def test_matches_multipass(library, sort_by):
+    rng = random.Random(sort_by)
+    for _ in range(60):
+        filters = random_filters(rng, library)
+        expected = library.get_books_multipass(filters, sort_by)
+        books = library.get_books(filters, sort_by)
+        assert sort_keys(books, sort_by) == sort_keys(expected, sort_by)
+        assert sorted(book['id'] for book in books) == sorted(book['id'] for book in expected)
+
+
+
+def test_kept_in_sync(library):
+    """Every change DBHandler makes is applied to the index the same way a rebuild would see it
+    """
+    rng = random.Random(2)
+    book_ids = [row[0] for row in library.conn.execute('SELECT id FROM books')]
+    ids = {table: [row[0] for row in library.conn.execute(f'SELECT id FROM {table}')] for table in ['artists', 'genres', 'tags', 'traits']}
+    for book_id in rng.sample(book_ids, 20):
+        library.update_book({
+            'id': book_id, 'title': 'renamed', 'alt_title': None, 'series': None, 'series_order': None, 'rating': 3, 'notes': None,
+            'artists': rng.sample(ids['artists'], 2), 'genres': [], 'tags': rng.sample(ids['tags'], 3),
+            'characters': [rng.sample(ids['traits'], 2) for _ in range(rng.randint(0, 2))]
+        })
+    library.delete_books(rng.sample(book_ids, 10))
+    library.delete_metadata('tags', ids['tags'][0])
+    library.delete_metadata('traits', ids['traits'][0])
+    library.add_books([{'name': 'new book', 'directory': 'new book', 'pages': 10}])
+    assert state(library.index) == state(rebuilt(library))
+
+    for _ in range(30):
+        filters = random_filters(rng, library)
+        assert sorted(book['id'] for book in library.get_books(filters)) == sorted(book['id'] for book in library.get_books_multipass(filters))
+
+
+
+def test_match_while_changing(library):
+    """Searches on the DBWorker's threads can run while the GUI thread changes the index
+    """
+    rng = random.Random(3)
+    trait_ids = [row[0] for row in library.conn.execute('SELECT id FROM traits')]
+    filters = random_filters(rng, library)
+    filters['characters'] = [SearchFilters([], [], trait_ids)]
+    errors = []
+    stop = threading.Event()
+
+    def search():
+        while not stop.is_set():
+            try:
+                library.index.match(filters)
+            except Exception as error:
+                errors.append(error)
+                return
+
+    threads = [threading.Thread(target=search) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for character_id, in library.conn.execute('SELECT id FROM characters').fetchall():
+        library.index.remove_character(character_id)
+        if character_id % 50 == 0:
+            library.index.build_characters()
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert not errors
@@ -0,0 +1,30 @@
+# standard libraries
+from zipfile import ZipFile
+
+# dependencies
+from PyQt5.QtGui import QImage
+
+# local modules
+from book_source import open_source
+
+
+
+def test_deleting_an_archive_leaves_other_readers_alone(tmp_path):
+    """Sources of the same archive share one open ZipFile. Deleting the book through one of them mustn't close it under the others
+    """
+    page = tmp_path / 'page.png'
+    image = QImage(8, 8, QImage.Format_RGB32)
+    image.fill(0)
+    image.save(str(page))
+    path = str(tmp_path / 'book.cbz')
+    with ZipFile(path, 'w') as archive:
+        archive.write(page, '1.png')
+        archive.write(page, '2.png')
+
+    reading = open_source(path)
+    deleting = open_source(path)
+    assert reading.archive is deleting.archive
+    deleting.delete()
+    assert not (tmp_path / 'book.cbz').exists()
+    assert reading.files() == ['1.png', '2.png']
+    assert reading.image_reader('2.png').read().size().width() == 8
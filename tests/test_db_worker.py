@@ -0,0 +1,18 @@
+# local modules
+from db_worker import DBWorker
+
+
+
+def test_failed_query_is_reported(db, app):
+    """A query that raises goes out through the failed signal instead of its callback, without escaping the slot
+    """
+    worker = DBWorker(db, workers=1)
+    results = []
+    failures = []
+    worker.failed.connect(lambda channel, error: failures.append((channel, type(error))))
+    worker.count_books({'basic': None}, results.append)
+    worker.get_metadata([], results.append)
+    worker.executor.shutdown(wait=True)
+    app.processEvents() # deliver() runs on the GUI thread
+    assert failures == [('books_count', TypeError)]
+    assert results == [{}]
@@ -0,0 +1,21 @@
+# local modules
+import signals
+from library_watcher import LibraryWatcher
+
+
+
+def test_set_directory_stops_watching_old_books(db, tmp_path):
+    """Archives are watched as files. Switching directories lets go of them along with the old directory's folders
+    """
+    old, new = tmp_path / 'old', tmp_path / 'new'
+    (old / 'Book').mkdir(parents=True)
+    (old / 'Book.cbz').write_bytes(b'')
+    new.mkdir()
+    watcher = LibraryWatcher(db, signals.Signals(), str(old))
+    watcher.watcher.addPaths([str(old / 'Book'), str(old / 'Book.cbz')]) # as scan_finished() does for books that are still changing
+    watcher.changing = [str(old / 'Book')]
+
+    watcher.set_directory(str(new))
+    assert watcher.watcher.directories() == [str(new)]
+    assert watcher.watcher.files() == []
+    assert watcher.changing == []
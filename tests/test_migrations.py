@@ -0,0 +1,72 @@
+# standard libraries
+import shutil
+import sqlite3
+
+# local modules
+from conftest import ROOT
+import database
+import migrations
+
+
+
+def migrate_to(conn, version: int):
+    """Runs the migrations up to version without the checks migrate() does, to make a db from before a migration
+    """
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    for migration in migrations.MIGRATIONS[:version]:
+        migration(cursor)
+    cursor.execute(f'PRAGMA user_version = {version}')
+
+
+
+def test_shipped_legacy_db(workdir):
+    """The db in the repo predates versioned schemas. Every book and link survives the migrations
+    """
+    shutil.copy(ROOT / 'mangalibrary.db', workdir / 'mangalibrary.db')
+    legacy = sqlite3.connect('mangalibrary.db')
+    assert legacy.execute('PRAGMA user_version').fetchone()[0] == 0
+    books = legacy.execute('SELECT id, name, alt_name, pages, rating, directory FROM books ORDER BY id').fetchall()
+    links = {table: set(legacy.execute(f'SELECT * FROM {table}')) for table in ['books_artists', 'books_genres', 'books_tags']}
+    legacy.close()
+
+    db = database.DBHandler()
+    assert db.conn.execute('PRAGMA user_version').fetchone()[0] == len(migrations.MIGRATIONS)
+    assert db.conn.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    assert not db.conn.execute('PRAGMA foreign_key_check').fetchall()
+    assert db.conn.execute('SELECT id, name, alt_name, pages, rating, directory FROM books ORDER BY id').fetchall() == books
+    for table, rows in links.items():
+        kept = {(book_id, id_) for book_id, id_ in rows if db.conn.execute('SELECT 1 FROM books WHERE id=?', (book_id,)).fetchone()}
+        assert set(db.conn.execute(f'SELECT bookID, {table[6:-1]}ID FROM {table}')) == kept
+    name = books[0][1]
+    assert books[0][0] in db.search_text(name[:3])
+    db.conn.close()
+
+    db = database.DBHandler() # nothing is left to migrate
+    assert db.conn.execute('SELECT id, name, alt_name, pages, rating, directory FROM books ORDER BY id').fetchall() == books
+    db.conn.close()
+
+
+
+def test_link_constraints_drops_broken_rows(workdir):
+    """Rows the old schema allowed but the new keys don't are dropped instead of stopping the app from starting
+    """
+    conn = sqlite3.connect('mangalibrary.db')
+    migrate_to(conn, migrations.MIGRATIONS.index(migrations.link_constraints))
+    conn.execute("INSERT INTO books(id, name, directory) VALUES (1, 'book', 'book')")
+    conn.execute("INSERT INTO tags(id, name) VALUES (1, 'tag')")
+    conn.execute("INSERT INTO traits(id, name) VALUES (1, 'trait')")
+    conn.execute('INSERT INTO books_tags VALUES (1, 1), (1, 1), (2, 1), (1, 2)') # a duplicate, a missing book, and a missing tag
+    conn.execute('INSERT INTO characters(id, bookID) VALUES (1, 1), (2, NULL), (3, 7)') # no book, and a missing book
+    conn.execute('INSERT INTO characters_traits VALUES (1, 1), (2, 1), (3, 1)')
+    conn.close()
+
+    db = database.DBHandler()
+    assert db.conn.execute('SELECT bookID, tagID FROM books_tags').fetchall() == [(1, 1)]
+    assert db.conn.execute('SELECT id, bookID FROM characters').fetchall() == [(1, 1)]
+    assert db.conn.execute('SELECT characterID, traitID FROM characters_traits').fetchall() == [(1, 1)]
+
+    db.delete_book(1) # links and characters go with their book
+    for table in ['books_tags', 'characters', 'characters_traits']:
+        assert not db.conn.execute(f'SELECT * FROM {table}').fetchall()
+    db.conn.close()
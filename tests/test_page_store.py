@@ -0,0 +1,34 @@
+# standard libraries
+from zipfile import ZipFile
+
+# dependencies
+from PyQt5.QtGui import QImage
+
+# local modules
+from book_source import open_source
+from page_store import PageStore
+
+
+
+def load(app, store: PageStore, index: int):
+    loaded = []
+    store.page_loaded.connect(loaded.append)
+    store.set_current(index, 1)
+    store.pool.waitForDone()
+    app.processEvents() # store() runs on the GUI thread
+    return loaded
+
+
+
+def test_unreadable_page_is_stored_blank(app, tmp_path):
+    """A page that's gone from its archive still loads, as a null image, so the reader doesn't keep showing the page before it
+    """
+    image = QImage(8, 8, QImage.Format_RGB32)
+    image.fill(0)
+    image.save(str(tmp_path / '1.png'))
+    with ZipFile(tmp_path / 'book.cbz', 'w') as archive:
+        archive.write(tmp_path / '1.png', '1.png')
+    store = PageStore(open_source(str(tmp_path / 'book.cbz')), ['1.png', '2.png'])
+    assert 1 in load(app, store, 1)
+    assert store.page(1).isNull()
+    assert not store.page(0).isNull()
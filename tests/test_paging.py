@@ -0,0 +1,68 @@
+# standard libraries
+import json
+import random
+
+# dependencies
+import pytest
+
+# local modules
+from conftest import SORTS
+from conftest import const
+from conftest import random_filters
+from query_compiler import KEYSET_COLUMNS
+from query_compiler import keyset_key
+from query_compiler import keyset_order
+
+KEYSET_SORTS = [sort_by for sort_by in SORTS if sort_by != const.Sort.RANDOM]
+
+
+
+def full_order(db, filters, sort_by):
+    """The ids of the books get_books() finds, put in keyset_order() by one ORDER BY
+    """
+    ids = [book['id'] for book in db.get_books(filters, sort_by)]
+    return [row[0] for row in db.conn.execute(f'SELECT id FROM books WHERE id IN (SELECT value FROM json_each(?)) ORDER BY {keyset_order(sort_by)}', (json.dumps(ids),))]
+
+
+
+@pytest.mark.parametrize('sort_by', KEYSET_SORTS)
+def test_pages_match_full_order(library, sort_by):
+    """Walking the pages finds every book once, in order, and get_books_in() with a page's cursor only lets through the books of the pages before it
+    """
+    rng = random.Random(sort_by)
+    all_ids = [row[0] for row in library.conn.execute('SELECT id FROM books')]
+    for filters in [None, *(random_filters(rng, library) for _ in range(20))]:
+        expected = full_order(library, filters, sort_by)
+        assert library.count_books(filters) == len(expected)
+
+        walked = []
+        cursor = None
+        while True:
+            books, cursor = library.get_books_page(filters, sort_by, cursor, limit=rng.choice([1, 7, 25]))
+            walked += [book['id'] for book in books]
+            if cursor is None:
+                break
+            before = library.get_books_in(all_ids, filters, sort_by, until=cursor)
+            assert sorted(book['id'] for book in before) == sorted(walked)
+        assert walked == expected
+
+
+
+@pytest.mark.parametrize('sort_by', KEYSET_SORTS)
+def test_keyset_key_matches_sql(library, sort_by):
+    """The bookshelf re-sorts books that were already fetched with keyset_key(). They have to end up where sqlite would have put them
+    """
+    library.add_books([{'name': name, 'directory': name, 'pages': None} for name in ['élan', 'Élan', 'zeta', 'ZETA', '_under', 'Ábc', '[x]']])
+    expected = library.get_books_page(None, sort_by, limit=-1)[0]
+    books = random.Random(sort_by).sample(expected, len(expected))
+    column = KEYSET_COLUMNS[sort_by]
+    key, reverse = keyset_key(sort_by)
+    books.sort(key=lambda book: key(book[column], book['id']), reverse=reverse)
+    assert [book['id'] for book in books] == [book['id'] for book in expected]
+
+
+
+def test_random_sort_is_one_page(library):
+    books, cursor = library.get_books_page(None, const.Sort.RANDOM, limit=5)
+    assert cursor is None
+    assert len(books) == library.count_books()
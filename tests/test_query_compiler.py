@@ -0,0 +1,29 @@
+# standard libraries
+import random
+
+# dependencies
+import pytest
+
+# local modules
+from conftest import SORTS
+from conftest import random_filters
+from conftest import sort_keys
+
+
+
+@pytest.mark.parametrize('sort_by', SORTS)
+def test_matches_multipass(library, sort_by):
+    """The compiled query finds the same books, in the same order, as the old one query per field search
+    """
+    library.index = None # sqlite answers every filter
+    rng = random.Random(sort_by)
+    for _ in range(60):
+        filters = random_filters(rng, library)
+        expected = library.get_books_multipass(filters, sort_by)
+        assert sort_keys(library.get_books(filters, sort_by), sort_by) == sort_keys(expected, sort_by)
+        assert sorted(book['id'] for book in library.get_books(filters, sort_by)) == sorted(book['id'] for book in expected)
+
+
+
+def test_no_filters(library):
+    assert [book['id'] for book in library.get_books()] == [book['id'] for book in library.get_books_multipass()]
@@ -0,0 +1,31 @@
+# standard libraries
+from itertools import count
+
+# local modules
+import reader as reader_module
+import signals
+from latency import page_turns
+from reader import Reader
+
+
+
+def test_only_page_turns_are_timed(library, app, monkeypatch):
+    """Opening a book moves the page list twice, which isn't a turn. Turns that overtake each other are timed from the latest one
+    """
+    monkeypatch.setattr(page_turns, 'skipped', 0)
+    monkeypatch.setattr(reader_module, 'perf_counter', count().__next__)
+    reader = Reader(signals.Signals(), library)
+    book_id = library.conn.execute('SELECT MIN(id) FROM books').fetchone()[0]
+    library.conn.execute('UPDATE books SET bookmark=1 WHERE id=?', (book_id,))
+    monkeypatch.setattr(reader, 'get_imgs', lambda: ['1.jpg', '2.jpg', '3.jpg', '4.jpg'])
+    reader.open_book(book_id)
+    assert reader.turn_started is None
+    assert page_turns.skipped == 0
+
+    reader.next_page()
+    assert page_turns.skipped == 0
+    reader.next_page()
+    assert page_turns.skipped == 1
+    assert reader.turn_started == 1
+    assert reader.target == 3
+    reader.page_store.clear()
@@ -0,0 +1,49 @@
+# standard libraries
+from os import listdir
+
+# dependencies
+from PyQt5.QtGui import QImage
+
+# local modules
+from thumbnails import ThumbnailCache
+
+
+
+def noise(seed: int):
+    """An image that doesn't compress much, so every thumbnail takes up about the same room
+    """
+    image = QImage(64, 64, QImage.Format_RGB32)
+    for x in range(64):
+        for y in range(64):
+            image.setPixel(x, y, (x * 7919 + y * 104729 + seed * 1299709) % 0xffffff)
+    return image
+
+
+
+def cache_bytes(directory):
+    return sum((directory / name).stat().st_size for name in listdir(directory))
+
+
+
+def test_evicts_while_storing(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), 20 * 1024)
+    for i in range(20):
+        cache.store(f'{tmp_path}/{i}.jpg', noise(i))
+    assert cache_bytes(tmp_path) <= 20 * 1024
+    assert not [name for name in listdir(tmp_path) if name.endswith('.tmp')]
+
+
+
+def test_workers_leave_eviction_to_recount(tmp_path):
+    """The scanner's workers don't evict, since each one only counts its own thumbnails. recount() evicts once they're done
+    """
+    workers = [ThumbnailCache(str(tmp_path), 20 * 1024) for _ in range(2)]
+    for worker in workers:
+        worker.evicts = False
+    for i in range(20):
+        workers[i % 2].store(f'{tmp_path}/{i}.jpg', noise(i))
+    assert len(listdir(tmp_path)) == 20
+
+    scanner = ThumbnailCache(str(tmp_path), 20 * 1024)
+    scanner.recount()
+    assert cache_bytes(tmp_path) == scanner.total_bytes <= 20 * 1024 * 0.9
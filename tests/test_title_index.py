@@ -0,0 +1,89 @@
+# standard libraries
+import random
+
+# dependencies
+import pytest
+
+# local modules
+from conftest import WORDS
+from title_index import TitleIndex
+from title_index import normalize
+
+WORDS = [*WORDS, 'Élan', 'naïve', 'CAFÉ', 'Straße', 'ab', 'x']
+
+
+
+def random_titles(rng: random.Random):
+    title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+    return (title, rng.choice([None, '', ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 2)))]))
+
+
+
+def naive_search(titles: dict, search_term: str):
+    """What TitleIndex.search() should find, by checking every title
+    """
+    term = normalize(search_term)
+    return {book_id for book_id, book_titles in titles.items() if any(term in normalize(title) for title in book_titles if title)}
+
+
+
+@pytest.fixture
+def titles():
+    rng = random.Random(0)
+    return {book_id: random_titles(rng) for book_id in range(300)}
+
+
+
+def test_matches_naive_search(titles):
+    index = TitleIndex()
+    index.set_titles(titles)
+    rng = random.Random(1)
+    for _ in range(300):
+        word = rng.choice(WORDS)
+        start = rng.randint(0, len(word) - 1)
+        term = rng.choice([word[start:start + rng.randint(1, 6)], f'{word} {rng.choice(WORDS)}', 'zzz'])
+        assert index.search(term) == naive_search(titles, term)
+    assert index.search('') is None
+
+
+
+def test_typing(titles):
+    """Each letter narrows down the last search's matches. Deleting letters goes back to a full search
+    """
+    index = TitleIndex()
+    index.set_titles(titles)
+    for word in ['gamma del', 'ELAN', 'strasse', 'cafe', 'naive']:
+        for end in [*range(1, len(word) + 1), *range(len(word) - 1, 0, -1)]:
+            assert index.search(word[:end]) == naive_search(titles, word[:end])
+
+
+
+@pytest.mark.parametrize('term, expected', [('elan', {0}), ('ÉLAN', {0}), ('cafe', {1}), ('strasse', {2}), ('NAIVE', {3})])
+def test_folds_case_and_accents(term, expected):
+    index = TitleIndex()
+    index.set_titles({0: ('Élan Vital', None), 1: ('Café', None), 2: ('Grosse', 'Straße'), 3: ('naïve', None)})
+    assert index.search(term) == expected
+
+
+
+def test_changing_books_between_searches(titles):
+    """Books added, renamed, or removed between two searches are found, or not, as if the index was built from scratch
+    """
+    index = TitleIndex()
+    index.set_titles(titles)
+    rng = random.Random(2)
+    term = ''
+    for step in range(400):
+        action = rng.random()
+        if action < 0.2:
+            titles[rng.randrange(400)] = random_titles(rng) # a new or renamed book
+        elif action < 0.35 and titles:
+            del titles[rng.choice(list(titles))]
+        if action < 0.35:
+            index.set_titles(dict(titles))
+        term = term + rng.choice('aeilot') if len(term) < 4 and rng.random() < 0.7 else term[:-1]
+        assert index.search(term) == (naive_search(titles, term) if term else None)
+    assert index.titles == titles
+    fresh = TitleIndex()
+    fresh.set_titles(titles)
+    assert dict(index.postings) == dict(fresh.postings)
@@ -0,0 +1,94 @@
+# standard libraries
+import random
+
+# dependencies
+import pytest
+
+
+
+def book_data(db, book_id: int):
+    """A book's data in the form the metadata panel hands to update_book()
+
+    Returns:
+        dict
+    """
+    conn = db.conn
+    name, alt_name, series, series_order, rating, notes = conn.execute('SELECT name, alt_name, series, series_order, rating, notes FROM books WHERE id=?', (book_id,)).fetchone()
+    characters = {}
+    for character_id, trait_id in conn.execute('SELECT id, traitID FROM characters JOIN characters_traits ON id=characterID WHERE bookID=?', (book_id,)):
+        characters.setdefault(character_id, []).append(trait_id)
+    return {
+        'id': book_id, 'title': name, 'alt_title': alt_name, 'series': series, 'series_order': series_order, 'rating': rating, 'notes': notes,
+        'artists': [row[0] for row in conn.execute('SELECT artistID FROM books_artists WHERE bookID=?', (book_id,))],
+        'genres': [row[0] for row in conn.execute('SELECT genreID FROM books_genres WHERE bookID=?', (book_id,))],
+        'tags': [row[0] for row in conn.execute('SELECT tagID FROM books_tags WHERE bookID=?', (book_id,))],
+        'characters': list(characters.values())
+    }
+
+
+
+@pytest.fixture
+def writes(library):
+    """The INSERT, UPDATE, and DELETE statements sqlite runs, with their values filled in
+    """
+    statements = []
+    library.conn.set_trace_callback(lambda sql: statements.append(sql) if sql.split()[0] in ('INSERT', 'UPDATE', 'DELETE') else None)
+    yield statements
+    library.conn.set_trace_callback(None)
+
+
+
+@pytest.fixture
+def link_updates(library, monkeypatch):
+    """What update_book() hands to the bitmap index, as {field: (added, removed)}
+    """
+    updates = {}
+    monkeypatch.setattr(library.index, 'update_links', lambda field, book_id, added, removed: updates.__setitem__(field, (set(added), set(removed))))
+    return updates
+
+
+
+def test_unchanged_book_writes_nothing(library, writes, link_updates):
+    book_id = library.conn.execute('SELECT MIN(bookID) FROM characters').fetchone()[0]
+    data = book_data(library, book_id)
+    random.Random(0).shuffle(data['tags'])
+    data['characters'] = [list(reversed(traits)) for traits in reversed(data['characters'])] # order doesn't matter
+    assert library.update_book(data) == set()
+    assert writes == []
+    assert link_updates == {}
+
+
+
+def test_only_diffed_rows_are_written(library, writes, link_updates):
+    book_id = library.conn.execute('SELECT bookID FROM books_tags GROUP BY bookID HAVING COUNT(*) >= 2').fetchone()[0]
+    data = book_data(library, book_id)
+    tag_ids = [row[0] for row in library.conn.execute('SELECT id FROM tags')]
+    kept, removed = data['tags'][1:], data['tags'][0]
+    added = next(id_ for id_ in tag_ids if id_ not in data['tags'])
+    data['tags'] = [*kept, added]
+    data['rating'] = 5 if data['rating'] != 5 else 1
+
+    assert library.update_book(data) == {'rating', 'tags'}
+    assert link_updates == {'tags': ({added}, {removed})}
+    assert sorted(writes) == sorted([
+        f'UPDATE books SET rating={data["rating"]} WHERE id={book_id}',
+        f'INSERT INTO books_tags(bookID, tagID) VALUES({book_id}, {added})',
+        f'DELETE FROM books_tags WHERE bookID={book_id} AND tagID={removed}'
+    ])
+    assert sorted(book_data(library, book_id)['tags']) == sorted(data['tags'])
+
+
+
+def test_characters_compared_by_traits(library, writes):
+    book_id = library.conn.execute('SELECT bookID FROM characters GROUP BY bookID HAVING COUNT(*) = 2').fetchone()[0]
+    data = book_data(library, book_id)
+    old_ids = {row[0] for row in library.conn.execute('SELECT id FROM characters WHERE bookID=?', (book_id,))}
+    trait_ids = [row[0] for row in library.conn.execute('SELECT id FROM traits')]
+    kept = data['characters'][0]
+    data['characters'] = [kept, trait_ids[:2], []] # one kept, one replaced, and one without traits that isn't added
+
+    assert library.update_book(data) == {'characters'}
+    assert not any('books' in sql for sql in writes)
+    new_ids = {row[0] for row in library.conn.execute('SELECT id FROM characters WHERE bookID=?', (book_id,))}
+    assert len(new_ids) == 2 and len(old_ids & new_ids) == 1 # the kept character keeps its id
+    assert sorted(map(sorted, book_data(library, book_id)['characters'])) == sorted([sorted(kept), sorted(trait_ids[:2])])
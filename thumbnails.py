@@ -0,0 +1,228 @@
+# standard libraries
+from hashlib import sha1
+from itertools import count
+from os import getpid
+from os import makedirs
+from os import remove
+from os import replace
+from os import scandir
+from os import stat
+from os import utime
+from threading import Lock
+import threading
+
+# dependencies
+from PyQt5.QtCore import QRect
+from PyQt5.QtCore import QSize
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage
+
+# local modules
+import constants as const
+from book_source import open_source
+import database
+
+
+
+MIP_LEVELS = (0.5, 0.75, 1, 1.5) # sizes covers are kept at on disk, relative to const.Spines.IMG_WIDTH / IMG_HEIGHT
+
+
+
+def mip_sizes():
+    """
+    Returns:
+        [(int, int)]: (width, height) of every mip level of a cover
+    """
+    return [(int(const.Spines.IMG_WIDTH * level), int(const.Spines.IMG_HEIGHT * level)) for level in MIP_LEVELS]
+
+
+
+def mip_size(width: int):
+    """Picks the mip level a cover of some width should be scaled down from
+
+    Returns:
+        (int, int): the smallest mip level that's at least width wide. the biggest one if none are
+    """
+    return next((size for size in mip_sizes() if size[0] >= width), mip_sizes()[-1])
+
+
+
+class ThumbnailCache:
+    """On disk cache of book covers and pages that are already scaled (and cropped) to the size they're shown at
+
+    Each thumbnail is keyed by the book's directory, the image's file name, the image's mtime and size, and the size it was scaled to,
+    so an image that gets replaced or edited simply misses the cache and is re-made. The old thumbnail is left to be evicted.
+    Once the cache grows past its size limit, the least recently used thumbnails are deleted. Every hit touches the file's mtime,
+    so the oldest mtimes are the least recently used.
+
+    Args:
+        directory (str): where to keep the thumbnails
+        max_bytes (int): size limit of the cache
+
+    Attributes:
+        total_bytes (int): size of every thumbnail in the cache. None until the cache directory has been scanned
+        evicts (bool): whether store() keeps the cache within its limit. turned off in the scanner's worker processes (see recount())
+        lock (Lock): thumbnails can be made from more than one thread
+        local (threading.local): holds each thread's read only DBHandler, used to look up covers
+        temp_names (itertools.count): numbers the files thumbnails are written to before they're moved into place
+    """
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = None
+        self.evicts = True
+        self.lock = Lock()
+        self.local = threading.local()
+        self.temp_names = count()
+        makedirs(self.directory, exist_ok=True)
+
+
+
+    def cover(self, folder: str, width: int, height=None):
+        """Gets the cover of a book scaled to width and cropped to height around its center
+
+        Cropped covers are only ever cached at the sizes in MIP_LEVELS. Any other size is scaled down from the nearest one,
+        so resizing the window never has to go back to the book's pages or fill the cache with sizes that are only used once.
+
+        Args:
+            folder (str): the directory of the book, relative to const.directory
+            width (int)
+            height (int, optional): if not given, the cover isn't cropped
+
+        Returns:
+            QImage: null if the book doesn't have any pages
+        """
+        if not (file := self.cover_file(folder)):
+            return QImage()
+        if height is None or (width, height) in mip_sizes():
+            return self.page(folder, file, width, height)
+        if (image := self.page(folder, file, *mip_size(width))).isNull():
+            return image
+        return image.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation) # mip levels have the same aspect ratio as covers
+
+
+
+    def cover_file(self, folder: str):
+        """Looks up the file name of a book's cover in its page manifest
+
+        Books that haven't been given a manifest yet fall back to listing their directory.
+
+        Returns:
+            str: None if the book doesn't have any pages
+        """
+        if not hasattr(self.local, 'db'):
+            self.local.db = database.DBHandler(read_only=True)
+        if (file := self.local.db.get_cover(folder)):
+            return file
+        return next(iter(open_source(f'{const.directory}/{folder}').files()), None)
+
+
+
+    def page(self, folder: str, file: str, width: int, height=None):
+        """Gets a page of a book scaled to width and cropped to height around its center
+
+        Args:
+            folder (str): the directory of the book, relative to const.directory
+            file (str): the page's file name
+            width (int)
+            height (int, optional): if not given, the page isn't cropped
+
+        Returns:
+            QImage: null if the page couldn't be read
+        """
+        source = open_source(f'{const.directory}/{folder}')
+        mtime, size = source.stat(file)
+        key = sha1(f'{folder}/{file}|{mtime}|{size}|{width}x{height}'.encode()).hexdigest()
+        path = f'{self.directory}/{key}.jpg'
+
+        thumbnail = QImage(path)
+        if not thumbnail.isNull():
+            try:
+                utime(path)
+            except OSError: # evicted by another thread in the meantime
+                pass
+            return thumbnail
+
+        thumbnail = self.decode(source.image_reader(file), width, height)
+        if not thumbnail.isNull():
+            self.store(path, thumbnail)
+        return thumbnail
+
+
+
+    def decode(self, reader, width: int, height=None):
+        """Reads an image scaled to width and crops it to height around the center. Same as what spines have always done to their covers
+
+        The image is scaled while it's being decoded, so jpgs never have to be decoded at full size.
+
+        Args:
+            reader (QImageReader): from a book source (see book_source.py)
+            width (int)
+            height (int, optional)
+        """
+        if (size := reader.size()).isValid() and size.width() > 0:
+            reader.setScaledSize(QSize(width, round(size.height() * width / size.width())))
+            reader.setQuality(100) # smooth scaling
+        if (image := reader.read()).isNull():
+            return image
+        if image.width() != width: # formats that can't be scaled while decoding
+            image = image.scaledToWidth(width, Qt.SmoothTransformation)
+        if height is None:
+            return image
+        return image.copy(QRect(int((image.width() - width) / 2), int((image.height() - height) / 2), width, height))
+
+
+
+    def store(self, path: str, thumbnail: QImage):
+        """Saves a new thumbnail and evicts old ones if the cache is over its limit
+        """
+        temp_path = f'{path}.{getpid()}.{next(self.temp_names)}.tmp' # written under a different name first so other threads and processes never read half a file
+        if not thumbnail.save(temp_path, 'JPG', 90):
+            return
+        replace(temp_path, path)
+
+        if not self.evicts:
+            return
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = sum(entry.stat().st_size for entry in scandir(self.directory) if entry.name.endswith('.jpg'))
+            else:
+                self.total_bytes += stat(path).st_size
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+
+
+    def recount(self):
+        """Counts the size of the cache again and evicts old thumbnails if it's over its limit
+
+        Other processes that store thumbnails (the scanner's workers) only know about the ones they stored themselves,
+        so they don't evict. The process that started them calls this once they're done instead.
+        """
+        with self.lock:
+            self.total_bytes = sum(entry.stat().st_size for entry in scandir(self.directory) if entry.name.endswith('.jpg'))
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+
+
+    def evict(self):
+        """Deletes the least recently used thumbnails until the cache is at 90% of its limit
+
+        Note:
+            Must be called while holding self.lock
+        """
+        entries = sorted(((entry.stat(), entry.path) for entry in scandir(self.directory) if entry.name.endswith('.jpg')), key=lambda entry: entry[0].st_mtime)
+        self.total_bytes = sum(entry_stat.st_size for entry_stat, _ in entries)
+        for entry_stat, path in entries:
+            if self.total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                remove(path)
+            except OSError:
+                continue
+            self.total_bytes -= entry_stat.st_size
+
+
+
+thumbnail_cache = ThumbnailCache(const.thumbnail_directory, const.thumbnail_cache_mb * 1024 * 1024)
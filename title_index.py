@@ -0,0 +1,101 @@
+# standard libraries
+from collections import defaultdict
+import unicodedata
+
+
+
+GRAM = 3 # length of the substrings titles are indexed by
+
+
+
+def normalize(text: str) -> str:
+    """Folds case and accents so 'Élan' and 'elan' match each other
+    """
+    return ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char)).casefold()
+
+
+
+def grams(text: str) -> set[str]:
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+
+class TitleIndex:
+    """In memory index of the titles in the bookshelf, for the quick filter in the search bar.
+    Finds the books whose title or alt title contains a search term without going through every title
+
+    Every title is normalized (see normalize()) once, when it's added, and indexed by each run of GRAM characters in it.
+    A search only checks the books that have every run of GRAM characters in the search term.
+    A search that extends the last one (like typing another letter) only checks the books the last one matched.
+
+    Attributes:
+        titles ({int: tuple}): maps book id to its titles, as they were given to set_titles()
+        normalized ({int: str}): maps book id to its normalized titles, one per line
+        postings ({str: set[int]}): maps each run of GRAM characters to the ids of the books that have it
+        last_term (str): the normalized term of the last search. None if the index changed since
+        last_matches (set[int]): what the last search found
+    """
+    def __init__(self):
+        self.titles = {}
+        self.normalized = {}
+        self.postings = defaultdict(set)
+        self.last_term = None
+        self.last_matches = set()
+
+
+
+    def set_titles(self, titles: dict):
+        """Makes the index hold exactly these books. Books whose titles didn't change aren't indexed again
+
+        Args:
+            titles ({int: tuple}): maps book id to its title and alt title. alt titles may be None
+        """
+        for book_id in [book_id for book_id in self.titles if book_id not in titles]:
+            self.remove(book_id)
+        for book_id, book_titles in titles.items():
+            if self.titles.get(book_id) != book_titles:
+                self.add(book_id, book_titles)
+
+
+
+    def add(self, book_id: int, titles: tuple):
+        self.remove(book_id)
+        self.titles[book_id] = titles
+        self.normalized[book_id] = text = '\n'.join(normalize(title) for title in titles if title)
+        for gram in grams(text):
+            self.postings[gram].add(book_id)
+        self.last_term = None # the new book wasn't checked by the last search
+
+
+
+    def remove(self, book_id: int):
+        if (text := self.normalized.pop(book_id, None)) is None:
+            return
+        del self.titles[book_id]
+        for gram in grams(text):
+            self.postings[gram].discard(book_id)
+            if not self.postings[gram]:
+                del self.postings[gram]
+        self.last_matches.discard(book_id)
+
+
+
+    def search(self, search_term: str):
+        """
+        Returns:
+            set[int]: ids of the books with a title that contains search_term. None if search_term is empty
+        """
+        if not (term := normalize(search_term)):
+            self.last_term = None
+            return None
+        if self.last_term is not None and self.last_term in term: # anything that contains term contains the last term too
+            candidates = self.last_matches
+        elif len(term) >= GRAM:
+            postings = sorted((self.postings.get(gram, set()) for gram in grams(term)), key=len)
+            candidates = postings[0].intersection(*postings[1:])
+        else:
+            candidates = self.normalized.keys()
+        matches = {book_id for book_id in candidates if term in self.normalized[book_id]}
+        self.last_term = term
+        self.last_matches = matches
+        return matches
@@ -0,0 +1,527 @@
+# standard libraries
+from collections import OrderedDict
+from functools import partial
+from os import startfile
+from os.path import relpath
+import random
+
+# dependencies
+from PyQt5.QtCore import QAbstractListModel
+from PyQt5.QtCore import QModelIndex
+from PyQt5.QtCore import QRect
+from PyQt5.QtCore import QSize
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QFont
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtWidgets import QAbstractItemView
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWidgets import QFrame
+from PyQt5.QtWidgets import QListView
+from PyQt5.QtWidgets import QMenu
+from PyQt5.QtWidgets import QStyle
+from PyQt5.QtWidgets import QStyledItemDelegate
+
+# local modules
+import constants as const
+from bookshelf_base import BookshelfBase
+from cover_loader import CoverLoader
+from cover_loader import placeholder
+from query_compiler import KEYSET_COLUMNS
+from query_compiler import keyset_key
+import reader
+
+
+
+BookRole = Qt.UserRole # the book's row from the db (dict)
+
+
+
+class BookshelfModel(QAbstractListModel):
+    """List of the books in the bookshelf
+
+    Covers are only loaded when the view asks for them (which it only does for the books on screen),
+    and only the most recently shown ones are kept in memory, up to const.cover_cache_mb. Until a cover has been loaded in the background, a placeholder is shown.
+    While the window is being resized, covers are stretched to the new size and only re-loaded once it stops (see set_cover_scale())
+
+    Args:
+        cover_loader (CoverLoader)
+
+    Attributes:
+        books ([dict]): rows from DBHandler.get_books()
+        rows ({int: int}): maps book id to its row
+        covers (OrderedDict): maps book id to its cover (QPixmap), least recently used first
+        cover_bytes (int): roughly how much memory the covers take up
+        loading (set[int]): ids of the books whose covers have been requested but haven't arrived yet
+        placeholder (QPixmap): also decides the size covers are loaded at
+        scale (float): how much the spines are scaled compared to a 1920 wide window
+    """
+    def __init__(self, cover_loader):
+        super().__init__()
+        self.cover_loader = cover_loader
+        self.books = []
+        self.rows = {}
+        self.covers = OrderedDict()
+        self.cover_bytes = 0
+        self.loading = set()
+        self.scale = 1
+        self.placeholder = placeholder(const.Spines.IMG_WIDTH, const.Spines.IMG_HEIGHT)
+
+
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.books)
+
+
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        book = self.books[index.row()]
+        if role == Qt.DisplayRole:
+            return book['name']
+        if role == Qt.DecorationRole:
+            return self.cover(book)
+        if role == BookRole:
+            return book
+        return None
+
+
+
+    def cover(self, book: dict):
+        """Gets a book's cover at the current scale
+
+        Returns:
+            QPixmap: the placeholder if the cover isn't in memory, or the cover at the size it was before the spines were resized.
+                it's then loaded in the background (or moved up the queue if it's already loading)
+        """
+        if (pixmap := self.covers.get(book['id'])) is not None:
+            self.covers.move_to_end(book['id'])
+            if pixmap.isNull() or pixmap.width() == self.placeholder.width():
+                return pixmap
+        if book['id'] in self.loading:
+            self.cover_loader.prioritize([book['id']])
+        else:
+            self.loading.add(book['id'])
+            self.cover_loader.request(book['id'], book['directory'], self.placeholder.width(), self.placeholder.height(), partial(self.set_cover, book['id']))
+        return self.placeholder if pixmap is None else pixmap
+
+
+
+    def set_cover(self, book_id: int, cover):
+        if not cover.isNull() and cover.width() != self.placeholder.width(): # requested before the spines were resized
+            return
+        self.loading.discard(book_id)
+        self.forget_cover(book_id)
+        self.covers[book_id] = pixmap = QPixmap.fromImage(cover)
+        self.cover_bytes += pixmap.width() * pixmap.height() * pixmap.depth() // 8
+        while self.cover_bytes > const.cover_cache_mb * 1024 * 1024 and len(self.covers) > 1:
+            self.forget_cover(next(iter(self.covers)))
+        if (row := self.row_of(book_id)) >= 0:
+            self.dataChanged.emit(self.index(row), self.index(row), [Qt.DecorationRole])
+
+
+
+    def forget_cover(self, book_id: int):
+        if (pixmap := self.covers.pop(book_id, None)) is not None:
+            self.cover_bytes -= pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+
+    def set_books(self, books: list[dict]):
+        """Replaces every book. Covers that are still loading are cancelled
+        """
+        self.beginResetModel()
+        self.cover_loader.cancel()
+        self.loading.clear()
+        self.books = books
+        self.rows = {book['id']: row for row, book in enumerate(books)}
+        self.endResetModel()
+
+
+
+    def set_scale(self, scale: float):
+        """Changes the size of the spines. Covers keep the size they were loaded at until set_cover_scale() is called
+        """
+        self.scale = scale
+        self.layoutChanged.emit()
+
+
+
+    def set_cover_scale(self, scale: float):
+        """Changes the size covers are loaded at. The ones on screen are re-loaded right away, the rest as they come back on screen
+        """
+        if self.placeholder.width() == int(const.Spines.IMG_WIDTH * scale):
+            return
+        self.cover_loader.cancel()
+        self.loading.clear()
+        self.placeholder = placeholder(int(const.Spines.IMG_WIDTH * scale), int(const.Spines.IMG_HEIGHT * scale))
+        if self.books:
+            self.dataChanged.emit(self.index(0), self.index(len(self.books) - 1), [Qt.DecorationRole])
+
+
+
+    def row_of(self, book_id: int):
+        """
+        Returns:
+            int: the row of the book. -1 if it isn't in the bookshelf
+        """
+        return self.rows.get(book_id, -1)
+
+
+
+    def update_book(self, book: dict):
+        """Replaces a book's data after it was edited
+        """
+        if (row := self.row_of(book['id'])) < 0:
+            return
+        self.books[row] = book
+        self.forget_cover(book['id'])
+        self.dataChanged.emit(self.index(row), self.index(row))
+
+
+
+    def add_books(self, books: list[dict]):
+        """Adds books to the end of the bookshelf
+        """
+        self.beginInsertRows(QModelIndex(), len(self.books), len(self.books) + len(books) - 1)
+        for book in books:
+            self.rows[book['id']] = len(self.books)
+            self.books.append(book)
+        self.endInsertRows()
+
+
+
+    def remove_book(self, book_id: int):
+        if (row := self.row_of(book_id)) < 0:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.books[row]
+        self.rows = {book['id']: row for row, book in enumerate(self.books)}
+        self.forget_cover(book_id)
+        self.endRemoveRows()
+
+
+
+    def sort_books(self, sort: int):
+        """Re-sorts the books in place, in the same order sqlite puts them in (see keyset_key())
+        """
+        self.layoutAboutToBeChanged.emit()
+        persistent = [(index, self.books[index.row()]['id']) for index in self.persistentIndexList()] # the selection has to follow its book
+        if sort == const.Sort.RANDOM:
+            random.shuffle(self.books)
+        else:
+            column = KEYSET_COLUMNS[sort]
+            key, reverse = keyset_key(sort)
+            self.books.sort(key=lambda book: key(book[column], book['id']), reverse=reverse)
+        self.rows = {book['id']: row for row, book in enumerate(self.books)}
+        for index, book_id in persistent:
+            self.changePersistentIndex(index, self.index(self.rows[book_id]))
+        self.layoutChanged.emit()
+
+
+
+class SpineDelegate(QStyledItemDelegate):
+    """Paints a book the same way spines.BookSpine looks: a framed cover with the title underneath
+
+    Hovered and selected books are highlighted.
+    """
+    def __init__(self, model: BookshelfModel):
+        super().__init__()
+        self.model = model
+        self.title_font = QFont()
+        self.title_font.setPointSize(14)
+
+
+
+    def sizeHint(self, option, index):
+        return QSize(int(const.Spines.WIDTH * self.model.scale), int(const.Spines.HEIGHT * self.model.scale))
+
+
+
+    def paint(self, painter, option, index):
+        scale = self.model.scale
+        frame = QRect(option.rect.topLeft(), self.sizeHint(option, index))
+        highlighted = option.state & (QStyle.State_MouseOver | QStyle.State_Selected)
+
+        painter.save()
+        painter.fillRect(frame, const.Colors.HIGHLIGHT if highlighted else const.Colors.PRIMARY)
+        painter.setPen(Qt.black)
+        painter.drawRect(frame.adjusted(0, 0, -1, -1))
+
+        image = QRect(0, 0, int(const.Spines.IMG_WIDTH * scale), int(const.Spines.IMG_HEIGHT * scale))
+        image.moveTopLeft(frame.topLeft())
+        image.translate((frame.width() - image.width()) // 2, 3)
+        if (cover := index.data(Qt.DecorationRole)).isNull():
+            pass
+        elif cover.width() != image.width(): # loaded before the spines were resized. stretched without smoothing until it's re-loaded
+            painter.drawPixmap(image, cover)
+        else:
+            painter.drawPixmap(image.x() + (image.width() - cover.width()) // 2, image.y() + (image.height() - cover.height()) // 2, cover)
+
+        title = QRect(image.left(), image.bottom() + 6, image.width(), min(50, frame.bottom() - image.bottom() - 8))
+        painter.fillRect(title, const.Colors.SECONDARY)
+        painter.setFont(self.title_font)
+        painter.drawText(title, Qt.AlignCenter | Qt.TextWordWrap, index.data(Qt.DisplayRole))
+        painter.restore()
+
+
+
+class BookshelfView(QListView):
+    """Icon mode list that only lays out and paints the books that are on screen
+    """
+    def __init__(self, model: BookshelfModel):
+        super().__init__()
+        self.setModel(model)
+        self.setItemDelegate(SpineDelegate(model))
+        self.setViewMode(QListView.IconMode)
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(True)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setFrameShape(QFrame.Box)
+        self.setFrameShadow(QFrame.Plain)
+        self.setMouseTracking(True)
+        self.viewport().setAttribute(Qt.WA_Hover)
+
+
+
+    def set_scale(self, scale: float):
+        self.model().set_scale(scale)
+        spacing = int(50 * scale) # same as the vertical spacing of the old grid
+        self.setGridSize(QSize(int(const.Spines.WIDTH * scale) + spacing, int(const.Spines.HEIGHT * scale) + spacing))
+
+
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton: # only left clicks select, like spines
+            super().mousePressEvent(event)
+
+
+
+class VirtualBookshelfPanel(BookshelfBase):
+    """Same as bookshelf_panel.BookshelfPanel, but the books are shown with a model / delegate view instead of one spine widget per book.
+    Searching and paging are done by BookshelfBase
+
+    Only the books on screen are painted and only their covers are loaded, so it stays fast with tens of thousands of books.
+    Used instead of BookshelfPanel when "virtual_bookshelf" is true in config.json (the default).
+
+    Attributes:
+        model (BookshelfModel)
+        view (BookshelfView): replaces bookshelf_scroll_area from the .ui file
+        selected (int): id of the selected book. None if nothing is selected
+    """
+    def __init__(self, db, db_worker, signals):
+        super().__init__(db, db_worker, signals)
+        self.model = BookshelfModel(CoverLoader())
+        self.view = BookshelfView(self.model)
+        self.bookshelf_scroll_area.setVisible(False)
+        self.main_area.addWidget(self.view)
+        self.view.set_scale(QApplication.primaryScreen().size().width() / 1920)
+        self.model.set_cover_scale(self.model.scale)
+
+        self.connect_events()
+        self.generate_books()
+
+
+
+    def connect_events(self):
+        """Connects each signal to their respective functions
+        """
+        super().connect_events()
+
+        # bookshelf
+        self.view.selectionModel().selectionChanged.connect(self.selection_changed)
+        self.view.doubleClicked.connect(self.open_book)
+        self.view.contextMenuEvent = self.context_menu
+        self.resize_timer.timeout.connect(lambda: self.model.set_cover_scale(self.model.scale))
+
+
+
+    @property
+    def books(self):
+        return self.model.books
+
+
+
+    def scroll_area(self):
+        return self.view
+
+
+
+    def grid(self):
+        """
+        Returns:
+            (int, int): how many books fit in a row of the view, and how far apart the rows are
+        """
+        grid = self.view.gridSize()
+        return max(self.view.viewport().width() // grid.width(), 1), grid.height()
+
+
+
+    def set_books(self, books: list[dict]):
+        """Replaces every book. Covers that are still loading are cancelled
+        """
+        self.model.set_books(books)
+
+
+
+    def extend_books(self, books: list[dict]):
+        self.model.add_books(books)
+
+
+
+    def titles(self):
+        return {book['id']: (book['name'], book['alt_name']) for book in self.books}
+
+
+
+    def hide_books(self, matches):
+        """Only the rows that are hidden or shown are touched
+
+        Args:
+            matches (set[int]): ids of the books to show. None to show every book
+
+        Returns:
+            bool: whether any book was hidden or shown
+        """
+        changed = False
+        for row, book in enumerate(self.books):
+            if (hide := matches is not None and book['id'] not in matches) != self.view.isRowHidden(row):
+                self.view.setRowHidden(row, hide)
+                changed = True
+        return changed
+
+
+
+    def sort_books(self, sort: int):
+        self.model.sort_books(sort)
+
+
+
+    def populate(self):
+        """The view lays the books out itself. This only keeps the selection on its book, if the book is still in the bookshelf and isn't hidden
+        """
+        if self.selected is not None and (row := self.model.row_of(self.selected)) >= 0 and not self.view.isRowHidden(row):
+            self.select(row)
+        else:
+            self.reset_selected()
+
+
+
+    def update_spine(self, book_id):
+        """Updates a book that was changed in the details panel
+        """
+        if (book := self.db.get_book(book_id)) is None: # deleted since it was changed
+            return
+        self.model.update_book(book)
+
+
+
+    def remove_books(self, book_ids: list[int]):
+        """Removes books that were deleted from the db. See library_watcher.LibraryWatcher
+        """
+        self.update_total()
+        if self.selected in book_ids:
+            self.reset_selected()
+        for book_id in book_ids:
+            self.model.remove_book(book_id)
+
+
+
+    def resizeEvent(self, event):
+        if event.size().width() < 1100: # i don't know why but this is called on startup with a small size
+            return
+        self.view.set_scale(event.size().width() / 1920)
+        self.resize_timer.start()
+
+
+
+    def select(self, row: int):
+        """Selects one of the books
+
+        Args:
+            row (int)
+        """
+        self.view.setCurrentIndex(self.model.index(row))
+
+
+
+    def selection_changed(self):
+        if not (indexes := self.view.selectionModel().selectedIndexes()):
+            self.selected = None
+            self.signals.depopulate_details.emit()
+            return
+        book = indexes[0].data(BookRole)
+        self.selected = book['id']
+        self.signals.populate_details.emit(self.model.cover(book), book['id'])
+
+
+
+    def open_book(self, index):
+        """Opens the reader window to read the book
+
+        Called when a book in the gallery is double clicked
+
+        Args:
+            index (QModelIndex)
+        """
+        reader_window = reader.Reader(self.signals, self.db)
+        reader_window.open_book(index.data(BookRole)['id'])
+        reader_window.show()
+
+
+
+    def reset_selected(self):
+        """Deselects the selected book
+        """
+        if self.view.selectionModel().hasSelection():
+            self.view.clearSelection() # depopulates the details through selection_changed()
+        else:
+            self.selected = None
+            self.signals.depopulate_details.emit()
+
+
+
+    def random_select(self):
+        """Randomly selects a book from the list
+        """
+        if not (rows := [row for row in range(len(self.books)) if not self.view.isRowHidden(row)]):
+            return
+        self.select(row := random.choice(rows))
+        self.view.scrollTo(self.model.index(row), QAbstractItemView.PositionAtTop)
+
+
+
+    def context_menu(self, event):
+        """Opens a context menu for the book under the mouse, or for the bookshelf if there isn't one
+
+        Books: same as spines.BookSpine.context_menu()
+        Bookshelf: see BookshelfBase.context_menu()
+
+        Args:
+            event (QContextMenuEvent)
+        """
+        if not (index := self.view.indexAt(event.pos())).isValid():
+            super().context_menu(event)
+            return
+
+        book = index.data(BookRole)
+        menu = QMenu()
+        edit = menu.addAction('Edit Metadata')
+        open_ = menu.addAction('Open Containing Folder')
+        delete_db = menu.addAction('Delete From DB')
+        delete_disk = menu.addAction('Delete From DB and Disk')
+        if (selection := menu.exec_(event.globalPos())):
+            if selection == edit:
+                self.select(index.row())
+                self.signals.show_details_panel.emit()
+            elif selection == open_:
+                startfile(relpath(f'{const.directory}/{book["directory"]}'))
+            elif selection == delete_db:
+                self.delete_book_db(book['id'], book['name'])
+            elif selection == delete_disk:
+                self.delete_book_disk(book['id'], book['name'], book['directory'])